@@ -14,6 +14,12 @@ window.addEventListener("pywebviewready", async function () {
   const outputSection = document.getElementById("outputSection");
   const resetAppBtn = document.getElementById("resetAppBtn");
   const redactionPatternsSelect = document.getElementById("redactionPatternsSelect");
+  const cancelBtn = document.getElementById("cancelBtn");
+  const showTimingsToggle = document.getElementById("showTimingsToggle");
+  const outputFolderBtn = document.getElementById("outputFolderBtn");
+  const outputFolderLabel = document.getElementById("outputFolderLabel");
+  const outputFolderUnsetText = "Not set: download each file after processing.";
+  let outputFolder = null; // Redacted files are written straight here when set
 
   const initialFileListMessage =
     '<li class="text-slate-400 italic">Upload documents for processing redactions (Max 5).</li>';
@@ -59,6 +65,27 @@ window.addEventListener("pywebviewready", async function () {
 
   await initializeRedactionDropdown();
 
+  // Pandoc is set up in the background after the window opens; report it without blocking the UI
+  const pandocPendingText = "Preparing Pandoc...";
+  async function watchPandocSetup() {
+    try {
+      const status = await window.pywebview.api.get_initial_status();
+      const statusBarIdle = statusBar.textContent === initialStatusBarText || statusBar.textContent === pandocPendingText;
+      if (status.pandoc_pending) {
+        if (statusBarIdle) statusBar.textContent = pandocPendingText;
+        setTimeout(watchPandocSetup, 500);
+      } else if (!status.pandoc_ready) {
+        statusBar.textContent = `Pandoc unavailable: ${status.pandoc_status}`;
+        statusBar.className = "p-2.5 bg-amber-700 text-amber-100 text-sm text-center rounded-md border border-amber-600 min-h-[40px] flex items-center justify-center";
+      } else if (statusBarIdle) {
+        statusBar.textContent = initialStatusBarText;
+      }
+    } catch (error) {
+      console.error("Error checking Pandoc status:", error);
+    }
+  }
+  watchPandocSetup();
+
   function resetApplicationState() {
     selectedFilePaths = [];
     fileListUI.innerHTML = initialFileListMessage;
@@ -68,6 +95,8 @@ window.addEventListener("pywebviewready", async function () {
     }
     customKeywordsInput.value = "";
     outputFormatSelect.value = "md";
+    outputFolder = null;
+    if (outputFolderLabel) outputFolderLabel.textContent = outputFolderUnsetText;
     statusBar.textContent = initialStatusBarText;
     statusBar.className = initialStatusBarClasses;
     outputSection.style.display = "none";
@@ -125,6 +154,156 @@ window.addEventListener("pywebviewready", async function () {
     }
   });
 
+  // One-line summary of where a file's time went, e.g. "0.41s · load 0.01s · redact 0.03s · convert 0.37s"
+  function formatTimingSummary(fileResult) {
+    const profile = fileResult.profile || {};
+    const parts = [];
+    if (typeof fileResult.elapsed_seconds === "number") {
+      parts.push(`${fileResult.elapsed_seconds.toFixed(2)}s`);
+    }
+    for (const [stage, seconds] of Object.entries(profile.stage_seconds || {})) {
+      parts.push(`${stage} ${seconds.toFixed(2)}s`);
+    }
+    const slowestPattern = Object.entries(profile.pattern_seconds || {})[0];
+    if (slowestPattern) {
+      parts.push(`slowest pattern ${slowestPattern[0]} ${slowestPattern[1].toFixed(3)}s`);
+    }
+    if (fileResult.cached) {
+      parts.push("from cache");
+    }
+    return parts.join(" · ");
+  }
+
+  // Builds the results list entry for one processed file
+  function appendProcessedFileItem(fileResult) {
+    const li = document.createElement("li");
+    li.className =
+      "processed-file-item flex justify-between items-center py-1.5 px-2 bg-slate-700 text-slate-200"; 
+    if (fileResult.error) {
+      const errorSpan = document.createElement("span");
+      errorSpan.textContent = `Error: ${fileResult.original_name || "unknown file"} - ${fileResult.error}`;
+      errorSpan.className = "text-red-400 text-xs";
+      li.appendChild(errorSpan);
+    } else {
+      const textWrapper = document.createElement("div");
+      const textSpan = document.createElement("span");
+      textSpan.textContent = `${fileResult.original_name} (redacted to .${fileResult.output_format})`;
+      textSpan.className = "text-slate-200";
+      const timingSummary = formatTimingSummary(fileResult);
+      textSpan.title = timingSummary;
+      textWrapper.appendChild(textSpan);
+      const timingDetail = document.createElement("div");
+      timingDetail.textContent = timingSummary;
+      timingDetail.className = "timing-detail text-xs text-slate-400";
+      textWrapper.appendChild(timingDetail);
+      li.appendChild(textWrapper);
+
+      const downloadBtn = document.createElement("button");
+      // Files written straight to the output folder only need saving if another copy is wanted
+      downloadBtn.textContent = fileResult.saved ? "Save copy" : "Download";
+      downloadBtn.className = 
+        "ml-2 bg-teal-600 hover:bg-teal-700 text-white text-xs font-semibold py-1 px-2.5 rounded-md focus:outline-none focus:ring-1 focus:ring-teal-500 focus:ring-offset-1 focus:ring-offset-slate-800 transition duration-150";
+      downloadBtn.onclick = () => {
+        // The output path stays on the Python side; the handle identifies the result
+        window.pywebview.api
+          .save_processed_file(fileResult.handle)
+          .then((saveResult) => {
+            if (saveResult && saveResult.success) {
+              statusBar.textContent = `File '${fileResult.original_name}' saved.`;
+              statusBar.className =
+                "p-2.5 bg-green-700 text-green-100 text-sm text-center rounded-md border border-green-600 min-h-[40px] flex items-center justify-center";
+            } else if (
+              saveResult &&
+              saveResult.message === "Save cancelled."
+            ) {
+              statusBar.textContent = `Save cancelled for '${fileResult.original_name}'.`;
+              statusBar.className =
+                "p-2.5 bg-amber-700 text-amber-100 text-sm text-center rounded-md border border-amber-600 min-h-[40px] flex items-center justify-center";
+            } else {
+              statusBar.textContent = `Error saving '${fileResult.original_name}': ${saveResult.error || "Unknown save error"}`;
+              statusBar.className =
+                "p-2.5 bg-red-700 text-red-100 text-sm text-center rounded-md border border-red-600 min-h-[40px] flex items-center justify-center";
+            }
+          });
+      };
+      li.appendChild(downloadBtn);
+    }
+    processedFileListUI.appendChild(li);
+  }
+
+  // The batch running in the background, if any, and how many of its results are listed
+  let currentJobId = null;
+  const jobPollIntervalMs = 250;
+
+  function wait(ms) {
+    return new Promise((resolve) => setTimeout(resolve, ms));
+  }
+
+  // Follows a job until it finishes, listing each file as soon as it is done.
+  // Resolves to the last poll plus how many files were listed and how many failed.
+  async function followJob(jobId) {
+    let since = 0;
+    let listed = 0;
+    let failed = 0;
+    for (;;) {
+      const update = await window.pywebview.api.poll_job(jobId, since);
+      if (update.error && !update.status) {
+        throw new Error(update.error);
+      }
+      if (update.results.length > 0) {
+        outputSection.style.display = "block";
+        update.results.forEach(appendProcessedFileItem);
+        listed += update.results.length;
+        failed += update.results.filter((fileResult) => fileResult.error).length;
+      }
+      since = update.next;
+      if (update.finished) {
+        return { ...update, listed, failed };
+      }
+      if (update.status === "running" || update.status === "cancelling") {
+        statusBar.textContent = update.status === "cancelling"
+          ? `Cancelling... ${update.completed}/${update.total} file(s) done.`
+          : `Processing... ${update.completed}/${update.total} file(s) done.`;
+      }
+      await wait(jobPollIntervalMs);
+    }
+  }
+
+  if (outputFolderBtn) {
+    outputFolderBtn.addEventListener("click", async () => {
+      try {
+        const folder = await window.pywebview.api.select_output_folder();
+        if (folder) {
+          outputFolder = folder;
+          outputFolderLabel.textContent = folder;
+          outputFolderLabel.title = folder;
+        }
+      } catch (e) {
+        console.error("Error calling select_output_folder:", e);
+      }
+    });
+  }
+
+  if (showTimingsToggle) {
+    showTimingsToggle.addEventListener("change", () => {
+      processedFileListUI.classList.toggle("show-timings", showTimingsToggle.checked);
+    });
+  }
+
+  if (cancelBtn) {
+    cancelBtn.addEventListener("click", async () => {
+      cancelBtn.disabled = true;
+      statusBar.textContent = "Cancelling... files already converting will finish.";
+      try {
+        if (currentJobId) {
+          await window.pywebview.api.cancel_job(currentJobId);
+        }
+      } catch (e) {
+        console.error("Error calling cancel_job:", e);
+      }
+    });
+  }
+
   processBtn.addEventListener("click", async () => {
     if (selectedFilePaths.length === 0) {
       statusBar.textContent = "Please select files before processing.";
@@ -153,6 +332,10 @@ window.addEventListener("pywebviewready", async function () {
     processBtn.classList.add("opacity-50", "cursor-not-allowed");
     outputSection.style.display = "none";
     processedFileListUI.innerHTML = "";
+    if (cancelBtn) {
+      cancelBtn.disabled = false;
+      cancelBtn.style.display = "block";
+    }
 
     const redactionOptions = {
       selected_patterns: selectedPatternKeys, 
@@ -165,89 +348,47 @@ window.addEventListener("pywebviewready", async function () {
     const outputFormat = outputFormatSelect.value;
 
     try {
-      let results = await window.pywebview.api.process_files_batch({
+      // Returns as soon as the job is queued; the files are redacted in the background
+      const started = await window.pywebview.api.start_batch({
         filepaths: selectedFilePaths,
         redaction_options: redactionOptions, 
         output_format: outputFormat,
+        output_dir: outputFolder,
       });
+      currentJobId = started.job_id;
+      const job = await followJob(currentJobId);
 
-      if (results && results.length > 0) {
-        outputSection.style.display = "block";
-        let allSuccessful = true;
-        results.forEach((fileResult) => {
-          const li = document.createElement("li");
-          li.className =
-            "processed-file-item flex justify-between items-center py-1.5 px-2 bg-slate-700 text-slate-200"; 
-          if (fileResult.error) {
-            allSuccessful = false;
-            const errorSpan = document.createElement("span");
-            errorSpan.textContent = `Error: ${fileResult.original_name || "unknown file"} - ${fileResult.error}`;
-            errorSpan.className = "text-red-400 text-xs";
-            li.appendChild(errorSpan);
-          } else {
-            const textSpan = document.createElement("span");
-            textSpan.textContent = `${fileResult.original_name} (redacted to .${fileResult.output_format})`;
-            textSpan.className = "text-slate-200";
-            li.appendChild(textSpan);
-
-            const downloadBtn = document.createElement("button");
-            downloadBtn.textContent = "Download";
-            downloadBtn.className = 
-              "ml-2 bg-teal-600 hover:bg-teal-700 text-white text-xs font-semibold py-1 px-2.5 rounded-md focus:outline-none focus:ring-1 focus:ring-teal-500 focus:ring-offset-1 focus:ring-offset-slate-800 transition duration-150";
-            downloadBtn.onclick = () => {
-              window.pywebview.api
-                .save_processed_file(
-                  fileResult.output_path,
-                  fileResult.original_name,
-                  fileResult.output_format,
-                )
-                .then((saveResult) => {
-                  if (saveResult && saveResult.success) {
-                    statusBar.textContent = `File '${fileResult.original_name}' saved.`;
-                    statusBar.className =
-                      "p-2.5 bg-green-700 text-green-100 text-sm text-center rounded-md border border-green-600 min-h-[40px] flex items-center justify-center";
-                  } else if (
-                    saveResult &&
-                    saveResult.message === "Save cancelled."
-                  ) {
-                    statusBar.textContent = `Save cancelled for '${fileResult.original_name}'.`;
-                    statusBar.className =
-                      "p-2.5 bg-amber-700 text-amber-100 text-sm text-center rounded-md border border-amber-600 min-h-[40px] flex items-center justify-center";
-                  } else {
-                    statusBar.textContent = `Error saving '${fileResult.original_name}': ${saveResult.error || "Unknown save error"}`;
-                    statusBar.className =
-                      "p-2.5 bg-red-700 text-red-100 text-sm text-center rounded-md border border-red-600 min-h-[40px] flex items-center justify-center";
-                  }
-                });
-            };
-            li.appendChild(downloadBtn);
-          }
-          processedFileListUI.appendChild(li);
-        });
-        if (allSuccessful) {
-          statusBar.textContent =
-            "Processing complete. All files processed successfully.";
-          statusBar.className =
-            "p-2.5 bg-green-700 text-green-100 text-sm text-center rounded-md border border-green-600 min-h-[40px] flex items-center justify-center";
-        } else {
-          statusBar.textContent = "Processing complete. Some files had errors.";
-          statusBar.className =
-            "p-2.5 bg-amber-700 text-amber-100 text-sm text-center rounded-md border border-amber-600 min-h-[40px] flex items-center justify-center";
-        }
-      } else {
-        if (results === null || (Array.isArray(results) && results.length === 0)) {
-             statusBar.textContent = "Processing finished, but no results were returned. Check console for Python errors.";
-        } else { 
-             statusBar.textContent = "An unexpected issue occurred. No results from processing.";
-        }
+      if (job.status === "failed") {
+        statusBar.textContent = `Processing failed: ${job.error}`;
+        statusBar.className = "p-2.5 bg-red-700 text-red-100 text-sm text-center rounded-md border border-red-600 min-h-[40px] flex items-center justify-center";
+      } else if (job.status === "cancelled") {
+        statusBar.textContent = "Processing cancelled. Files finished before cancelling are listed.";
+        statusBar.className =
+          "p-2.5 bg-amber-700 text-amber-100 text-sm text-center rounded-md border border-amber-600 min-h-[40px] flex items-center justify-center";
+      } else if (job.listed === 0) {
+        statusBar.textContent = "Processing finished, but no results were returned. Check console for Python errors.";
         statusBar.className = "p-2.5 bg-red-700 text-red-100 text-sm text-center rounded-md border border-red-600 min-h-[40px] flex items-center justify-center";
+      } else if (job.failed > 0) {
+        statusBar.textContent = "Processing complete. Some files had errors.";
+        statusBar.className =
+          "p-2.5 bg-amber-700 text-amber-100 text-sm text-center rounded-md border border-amber-600 min-h-[40px] flex items-center justify-center";
+      } else {
+        statusBar.textContent = outputFolder
+          ? `Processing complete. All files saved to ${outputFolder}.`
+          : "Processing complete. All files processed successfully.";
+        statusBar.className =
+          "p-2.5 bg-green-700 text-green-100 text-sm text-center rounded-md border border-green-600 min-h-[40px] flex items-center justify-center";
       }
     } catch (e) {
-      console.error("Error calling process_files_batch:", e);
+      console.error("Error running the batch job:", e);
       statusBar.textContent = "Critical error during processing: " + String(e);
       statusBar.className =
         "p-2.5 bg-red-700 text-red-100 text-sm text-center rounded-md border border-red-600 min-h-[40px] flex items-center justify-center";
     } finally {
+      currentJobId = null;
+      if (cancelBtn) {
+        cancelBtn.style.display = "none";
+      }
       processBtn.disabled = false;
       processBtn.classList.remove("opacity-50", "cursor-not-allowed");
       statusBar.classList.remove("animate-pulse");
@@ -0,0 +1,346 @@
+"""
+Headless redaction for scripts and scheduled jobs.
+
+    python -m redax ./share "./exports/**/*.txt" -o ./redacted -w 8 --report report.jsonl
+
+Directories are walked recursively and the input layout is mirrored under the
+output directory. One JSON object per file is written to the report (stdout by
+default). This module never imports pywebview.
+
+    python -m redax --watch ./dropbox -o ./redacted
+
+keeps running and redacts files as they are added to or changed in the
+directories (see redax_watch).
+"""
+import argparse
+import contextlib
+import glob
+import json
+import os
+import sys
+
+from redax_cache import DEFAULT_CACHE_MAX_BYTES, ResultCache
+from redax_convert import BACKEND_ENV_VAR
+from redax_patterns import PatternError, default_registry, load_packs_for_workers
+from redax_pdf import PDF_ENGINES
+from redax_profile import ProfileLog
+from redax_spans import SPAN_REPORT_FORMATS
+from redax_logic import ORIGINAL_OUTPUT_FORMAT, SUPPORTED_EXTENSIONS, compile_redaction_patterns, process_documents_batch
+from redax_watch import DEFAULT_DEBOUNCE_SECONDS, DEFAULT_POLL_INTERVAL_SECONDS, Watcher
+
+OUTPUT_FORMATS = ("md", "pdf", "docx", "xlsx", "pptx", ORIGINAL_OUTPUT_FORMAT)
+CREDENTIAL_LINES_KEY = "redact_credential_lines"
+
+
+def _walk_supported_files(directory):
+    for dirpath, dirnames, filenames in os.walk(directory):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if os.path.splitext(filename)[1].lower() in SUPPORTED_EXTENSIONS:
+                yield os.path.join(dirpath, filename)
+
+
+def expand_input_paths(paths):
+    """
+    Expands files, directories and glob patterns into (filepath, relative_dir) pairs.
+
+    relative_dir is where the file sits relative to the directory or glob root
+    it was found under, so the caller can mirror the input tree.
+    """
+    expanded = []
+    seen = set()
+
+    def add(filepath, root):
+        key = os.path.abspath(filepath)
+        if key in seen:
+            return
+        seen.add(key)
+        relative_dir = os.path.relpath(os.path.dirname(key), os.path.abspath(root)) if root else ""
+        expanded.append((filepath, "" if relative_dir == os.curdir else relative_dir))
+
+    for path in paths:
+        if glob.has_magic(path):
+            # Everything up to the first wildcard is the root that gets mirrored
+            root = path[:min(path.index(c) for c in "*?[" if c in path)]
+            root = os.path.dirname(root) or os.curdir
+            matches = sorted(glob.glob(path, recursive=True))
+        else:
+            root = path if os.path.isdir(path) else None
+            matches = [path]
+        for match in matches:
+            if os.path.isdir(match):
+                for filepath in _walk_supported_files(match):
+                    add(filepath, root or match)
+            elif os.path.isfile(match):
+                add(match, root)
+            else:
+                print(f"WARNING: No such file or directory: {match}", file=sys.stderr)
+    return expanded
+
+
+def _report_record(filepath, result):
+    matches = result.get("matches") or {}
+    return {
+        "path": filepath,
+        "status": "error" if "error" in result else "ok",
+        "output_path": result.get("output_path"),
+        "output_format": result.get("output_format"),
+        "elapsed_seconds": result.get("elapsed_seconds"),
+        "cached": bool(result.get("cached")),
+        "matches": matches,
+        "total_matches": sum(matches.values()),
+        "span_report_path": result.get("span_report_path"),
+        "error": result.get("error"),
+        "profile": result.get("profile"),
+    }
+
+
+def _active_patterns(pattern_keys, redact_credential_lines):
+    """Compiled patterns for pattern_keys (default: every registered pattern) and whether credential lines are redacted."""
+    if pattern_keys is None:
+        pattern_keys = [key for key in default_registry().keys() if key != CREDENTIAL_LINES_KEY]
+    return compile_redaction_patterns(pattern_keys), redact_credential_lines or CREDENTIAL_LINES_KEY in pattern_keys
+
+
+def redact_paths(paths, output_dir, pattern_keys=None, custom_keywords=(), output_format="md",
+                 redact_credential_lines=False, workers=None, use_processes=False, on_record=None, cache=None,
+                 credential_keywords=(), profile_patterns=False, profile_log=None, span_report=None, pseudonymize=False,
+                 pdf_engine=None):
+    """
+    Redacts every supported file under paths into output_dir and returns one report record per file.
+
+    pattern_keys defaults to every registered pattern. on_record(record) is called
+    as each file finishes. cache is an optional redax_cache.ResultCache.
+    credential_keywords adds to the built-in credential line keywords.
+    profile_patterns, profile_log, span_report, pseudonymize and pdf_engine are passed on to
+    process_documents_batch.
+    """
+    active_patterns_compiled, redact_credential_lines = _active_patterns(pattern_keys, redact_credential_lines)
+
+    records = []
+    files = expand_input_paths(paths)
+    output_dirs = [os.path.join(output_dir, relative_dir) for _, relative_dir in files]
+
+    filepaths = [filepath for filepath, _ in files]
+
+    def emit(index, result):
+        record = _report_record(filepaths[index], result)
+        records.append(record)
+        if on_record is not None:
+            on_record(record)
+
+    # Two inputs that would produce the same output file are reported by the batch rather than overwritten
+    process_documents_batch(
+        filepaths,
+        active_patterns_compiled,
+        list(custom_keywords),
+        output_format,
+        redact_credential_lines_enabled=redact_credential_lines,
+        max_workers=workers,
+        executor_kind="process" if use_processes else "thread",
+        on_result=emit,
+        output_dirs=output_dirs,
+        cache=cache,
+        credential_keywords=credential_keywords,
+        profile_patterns=profile_patterns,
+        profile_log=profile_log,
+        span_report=span_report,
+        pseudonymize=pseudonymize,
+        pdf_engine=pdf_engine,
+    )
+    return records
+
+
+def watch_paths(directories, output_dir, pattern_keys=None, custom_keywords=(), output_format="md",
+                redact_credential_lines=False, workers=None, on_record=None, credential_keywords=(), manifest_path=None,
+                debounce_seconds=DEFAULT_DEBOUNCE_SECONDS, use_polling=False, poll_interval=DEFAULT_POLL_INTERVAL_SECONDS,
+                stop_event=None, span_report=None, pseudonymize=False, pdf_engine=None):
+    """
+    Redacts new and changed files in directories into output_dir until stop_event is set.
+
+    Takes the same options as redact_paths; on_record(record) is called as each file
+    finishes. The rest are passed on to redax_watch.Watcher.
+    """
+    active_patterns_compiled, redact_credential_lines = _active_patterns(pattern_keys, redact_credential_lines)
+    watcher = Watcher(
+        directories,
+        output_dir,
+        active_patterns_compiled,
+        list(custom_keywords),
+        output_format,
+        redact_credential_lines=redact_credential_lines,
+        credential_keywords=credential_keywords,
+        manifest_path=manifest_path,
+        debounce_seconds=debounce_seconds,
+        workers=workers,
+        use_polling=use_polling,
+        poll_interval=poll_interval,
+        on_result=lambda filepath, result: on_record(_report_record(filepath, result)) if on_record else None,
+        span_report=span_report,
+        pseudonymize=pseudonymize,
+        pdf_engine=pdf_engine,
+    )
+    watcher.run(stop_event)
+
+
+def _read_keywords_file(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(prog="python -m redax", description="Redact documents without the GUI.")
+    parser.add_argument("paths", nargs="*", help="Files, directories (walked recursively) or glob patterns")
+    parser.add_argument("-o", "--output-dir", default="redacted", help="Destination directory (default: ./redacted)")
+    parser.add_argument("-f", "--format", dest="output_format", choices=OUTPUT_FORMATS, default="md",
+                        help="Output format (default: md). xlsx and pptx only suit files of that type; "
+                             "'original' keeps .docx, .xlsx and .pptx files as they are and writes Markdown for the rest")
+    parser.add_argument("-p", "--pattern", dest="patterns", action="append", metavar="KEY",
+                        help="Pattern key to apply; repeatable. Default: every registered pattern")
+    parser.add_argument("--pattern-pack", dest="pattern_packs", action="append", default=[], metavar="JSON",
+                        help="Load extra patterns from a pattern pack file; repeatable (see redax_patterns)")
+    parser.add_argument("-k", "--keyword", dest="keywords", action="append", default=[], metavar="TEXT",
+                        help="Custom keyword to redact; repeatable")
+    parser.add_argument("--keywords-file", help="File with one custom keyword per line")
+    parser.add_argument("--credential-lines", action="store_true",
+                        help="Replace whole lines that mention passwords, tokens, keys and similar")
+    parser.add_argument("--credential-keyword", dest="credential_keywords", action="append", default=[], metavar="TEXT",
+                        help="Extra keyword that marks a credential line (case-insensitive); repeatable")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Number of parallel workers (default: CPU count)")
+    parser.add_argument("--processes", action="store_true", help="Use worker processes instead of threads")
+    parser.add_argument("--report", default="-", help="JSONL report destination (default: stdout)")
+    parser.add_argument("--profile-log", metavar="PATH",
+                        help="Append per-file stage timings to this JSONL log (default: $REDAX_PROFILE_LOG)")
+    parser.add_argument("--profile-patterns", action="store_true",
+                        help="Also time every pattern on its own (one extra scan per pattern)")
+    parser.add_argument("--pandoc", help="Path to the pandoc executable to use")
+    parser.add_argument("--pandoc-backend", choices=("subprocess", "server"),
+                        help="Run a pandoc process per file, or keep one local pandoc server running")
+    parser.add_argument("--no-cache", action="store_true", help="Always redact, don't use or fill the result cache")
+    parser.add_argument("--cache-dir", help="Result cache directory (default: the per-user cache dir, or $REDAX_CACHE_DIR)")
+    parser.add_argument("--cache-max-mb", type=int, default=DEFAULT_CACHE_MAX_BYTES // (1024 * 1024),
+                        help="Evict least recently used results beyond this size (default: %(default)s)")
+    parser.add_argument("--clear-cache", action="store_true", help="Empty the result cache before running (or on its own)")
+    parser.add_argument("--pdf-engine", choices=PDF_ENGINES,
+                        help="How PDFs are rendered: latex (pandoc's default), weasyprint, typst, or auto (the first "
+                             "of those installed; default, or $REDAX_PDF_ENGINE)")
+    parser.add_argument("--span-report", choices=SPAN_REPORT_FORMATS,
+                        help="Also write what was redacted where (offsets, pattern, keyed value hash) next to each output")
+    parser.add_argument("--pseudonymize", action="store_true",
+                        help="Replace each match with a token derived from its value, the same token for the same value")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running and redact files as they are added to or changed in the given directories")
+    parser.add_argument("--manifest", metavar="PATH",
+                        help="Watch mode: where to remember what has been redacted (default: .redax-watch.json in the output dir)")
+    parser.add_argument("--debounce", type=float, default=DEFAULT_DEBOUNCE_SECONDS, metavar="SECONDS",
+                        help=f"Watch mode: wait until a file has been quiet this long (default: {DEFAULT_DEBOUNCE_SECONDS:g})")
+    parser.add_argument("--poll", action="store_true", help="Watch mode: poll for changes instead of using inotify")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL_SECONDS, metavar="SECONDS",
+                        help=f"Watch mode: seconds between polls (default: {DEFAULT_POLL_INTERVAL_SECONDS:g})")
+    parser.add_argument("--list-patterns", action="store_true", help="List the available pattern keys and exit")
+    return parser
+
+
+def main(argv=None):
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            registry = load_packs_for_workers(args.pattern_packs)
+    except PatternError as e:
+        parser.error(str(e))
+    if args.list_patterns:
+        for key in registry.keys():
+            print(key)
+        return 0
+    cache = None if args.no_cache else ResultCache(args.cache_dir, args.cache_max_mb * 1024 * 1024)
+    if args.clear_cache:
+        ResultCache(args.cache_dir).clear()
+        if not args.paths:
+            return 0
+    if not args.paths:
+        parser.error("at least one path is required")
+    if args.patterns:
+        unknown = [key for key in args.patterns if key not in registry]
+        if unknown:
+            parser.error(f"unknown pattern key(s): {', '.join(unknown)}")
+    if args.watch:
+        not_directories = [path for path in args.paths if not os.path.isdir(path)]
+        if not_directories:
+            parser.error(f"--watch needs directories: {', '.join(not_directories)}")
+    if args.pandoc:
+        os.environ["PYPANDOC_PANDOC"] = args.pandoc
+    if args.pandoc_backend:
+        # Through the environment so worker processes pick the same backend
+        os.environ[BACKEND_ENV_VAR] = args.pandoc_backend
+
+    keywords = list(args.keywords)
+    if args.keywords_file:
+        keywords.extend(_read_keywords_file(args.keywords_file))
+
+    report_file = sys.stdout if args.report == "-" else open(args.report, "w", encoding="utf-8")
+    failures = 0
+    try:
+        def write_record(record):
+            nonlocal failures
+            if record["status"] != "ok":
+                failures += 1
+            report_file.write(json.dumps(record) + "\n")
+            report_file.flush()
+
+        if args.watch:
+            with contextlib.redirect_stdout(sys.stderr):
+                try:
+                    watch_paths(
+                        args.paths,
+                        args.output_dir,
+                        pattern_keys=args.patterns,
+                        custom_keywords=keywords,
+                        output_format=args.output_format,
+                        redact_credential_lines=args.credential_lines or bool(args.credential_keywords),
+                        credential_keywords=args.credential_keywords,
+                        workers=args.workers,
+                        on_record=write_record,
+                        manifest_path=args.manifest,
+                        debounce_seconds=args.debounce,
+                        use_polling=args.poll,
+                        poll_interval=args.poll_interval,
+                        span_report=args.span_report,
+                        pseudonymize=args.pseudonymize,
+                        pdf_engine=args.pdf_engine,
+                    )
+                except KeyboardInterrupt:
+                    print("INFO: Watch stopped.")
+            return 0
+
+        # The logic layer logs with print(); keep stdout clean for the report
+        with contextlib.redirect_stdout(sys.stderr):
+            records = redact_paths(
+                args.paths,
+                args.output_dir,
+                pattern_keys=args.patterns,
+                custom_keywords=keywords,
+                output_format=args.output_format,
+                redact_credential_lines=args.credential_lines or bool(args.credential_keywords),
+                credential_keywords=args.credential_keywords,
+                workers=args.workers,
+                use_processes=args.processes,
+                on_record=write_record,
+                cache=cache,
+                profile_patterns=args.profile_patterns,
+                profile_log=ProfileLog(args.profile_log) if args.profile_log else None,
+                span_report=args.span_report,
+                pseudonymize=args.pseudonymize,
+                pdf_engine=args.pdf_engine,
+            )
+    finally:
+        if report_file is not sys.stdout:
+            report_file.close()
+
+    print(f"INFO: Processed {len(records)} file(s), {failures} failed.", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
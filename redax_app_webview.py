@@ -3,18 +3,19 @@ print("DEBUG: Script starting...")
 import webview
 import os
 import sys
-import re
 import shutil
 import atexit
-import pypandoc
 import platform
-import requests
 import zipfile
 import stat # For setting executable permissions
-# import json # Removed as it's not currently used
+import json
+import threading
 
 try:
-    from redax_logic import process_document_for_redaction, cleanup_temp_dir
+    from redax_logic import process_documents_batch, cleanup_temp_dir, compile_redaction_patterns, REDACTION_PATTERNS_PYTHON
+    from redax_cache import ResultCache, user_cache_dir
+    from redax_jobs import JobError, JobManager
+    from redax_workspace import default_workspaces
     print("DEBUG: Successfully imported from redax_logic.")
 except ImportError as e:
     print(f"DEBUG: ERROR importing from redax_logic: {e}")
@@ -24,8 +25,15 @@ APP_NAME = "Redax"
 PANDOC_VERSION_TAG = "3.1.13" # Specify a recent, known good Pandoc version
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PANDOC_NATIVE_DIR = os.path.join(BASE_DIR, 'pandoc_native')
+# Where the last successful pandoc detection is remembered between launches
+PANDOC_PROBE_CACHE_FILE = os.path.join(user_cache_dir(), "pandoc.json")
+# How long a batch waits for the background pandoc setup before giving up
+PANDOC_SETUP_WAIT_SECONDS = 600
 # Store initial Pandoc status message
-initial_pandoc_status_message = ""
+initial_pandoc_status_message = "Checking for Pandoc..."
+# Pandoc is configured on a background thread once the window is up; set when that is done
+pandoc_setup_done = threading.Event()
+PANDOC_CONFIGURED_SUCCESSFULLY = False
 
 print(f"DEBUG: APP_NAME set to: {APP_NAME}")
 print(f"DEBUG: BASE_DIR: {BASE_DIR}")
@@ -50,6 +58,7 @@ def get_pandoc_arch_details_macos():
     return None, None, None
 
 def download_file_with_progress(url, dest_path):
+    import requests # Only needed on the rare launch that downloads Pandoc
     print(f"INFO: Downloading Pandoc from {url} to {dest_path}")
     # The GUI won't show this progress directly, but it's good for terminal logs
     try:
@@ -132,63 +141,114 @@ def ensure_pandoc_downloaded_macos():
         print(f"DEBUG: {initial_pandoc_status_message}")
         return None
 
-        local_pandoc_dir = os.path.join(PANDOC_NATIVE_DIR, os_subdir)
-        local_pandoc_exe_path = os.path.join(local_pandoc_dir, pandoc_exe_name)
-    
-        os.makedirs(local_pandoc_dir, exist_ok=True)
-        print(f"DEBUG: Ensured local Pandoc directory: {local_pandoc_dir}")
+    local_pandoc_dir = os.path.join(PANDOC_NATIVE_DIR, os_subdir)
+    local_pandoc_exe_path = os.path.join(local_pandoc_dir, pandoc_exe_name)
+
+    os.makedirs(local_pandoc_dir, exist_ok=True)
+    print(f"DEBUG: Ensured local Pandoc directory: {local_pandoc_dir}")
+
+    if os.path.exists(local_pandoc_exe_path):
+        initial_pandoc_status_message = f"Using existing local Pandoc: {os_subdir}"
+        print(f"DEBUG: {initial_pandoc_status_message} at {local_pandoc_exe_path}")
+        return local_pandoc_exe_path
 
-        if os.path.exists(local_pandoc_exe_path):
-            initial_pandoc_status_message = f"Using existing local Pandoc: {os_subdir}"
-            print(f"DEBUG: {initial_pandoc_status_message} at {local_pandoc_exe_path}")
-            return local_pandoc_exe_path
+    initial_pandoc_status_message = f"Pandoc for {os_subdir} not found. Attempting download..."
+    print(f"DEBUG: {initial_pandoc_status_message}")
 
-        initial_pandoc_status_message = f"Pandoc for {os_subdir} not found. Attempting download..."
+    pandoc_download_url = f"https://github.com/jgm/pandoc/releases/download/{PANDOC_VERSION_TAG}/{pandoc_archive_name}"
+
+    temp_dir_for_download = os.path.join(PANDOC_NATIVE_DIR, "temp_download")
+    os.makedirs(temp_dir_for_download, exist_ok=True)
+    downloaded_archive_path = os.path.join(temp_dir_for_download, pandoc_archive_name)
+
+    if not download_file_with_progress(pandoc_download_url, downloaded_archive_path):
+        initial_pandoc_status_message = "Pandoc download failed."
+        shutil.rmtree(temp_dir_for_download, ignore_errors=True)
+        return None
+
+    initial_pandoc_status_message = "Pandoc downloaded. Extracting..."
+    print(f"DEBUG: {initial_pandoc_status_message}")
+
+    extracted_pandoc_path_in_temp = extract_archive_macos(downloaded_archive_path, temp_dir_for_download, pandoc_exe_name)
+
+    final_status_path = None
+    if extracted_pandoc_path_in_temp and os.path.exists(extracted_pandoc_path_in_temp):
+        print(f"DEBUG: Moving {extracted_pandoc_path_in_temp} to {local_pandoc_exe_path}")
+        try:
+            os.makedirs(os.path.dirname(local_pandoc_exe_path), exist_ok=True)
+            shutil.move(extracted_pandoc_path_in_temp, local_pandoc_exe_path)
+        
+            print(f"DEBUG: Setting executable permission for {local_pandoc_exe_path}")
+            current_permissions = os.stat(local_pandoc_exe_path).st_mode
+            os.chmod(local_pandoc_exe_path, current_permissions | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+        
+            initial_pandoc_status_message = f"Pandoc for {os_subdir} installed successfully."
+            print(f"DEBUG: {initial_pandoc_status_message}")
+            final_status_path = local_pandoc_exe_path
+        except Exception as e:
+            initial_pandoc_status_message = f"Error installing Pandoc: {e}"
+            print(f"DEBUG: {initial_pandoc_status_message}")
+    else:
+        initial_pandoc_status_message = "Failed to extract Pandoc from archive."
         print(f"DEBUG: {initial_pandoc_status_message}")
-    
-        pandoc_download_url = f"https://github.com/jgm/pandoc/releases/download/{PANDOC_VERSION_TAG}/{pandoc_archive_name}"
-    
-        temp_dir_for_download = os.path.join(PANDOC_NATIVE_DIR, "temp_download")
-        os.makedirs(temp_dir_for_download, exist_ok=True)
-        downloaded_archive_path = os.path.join(temp_dir_for_download, pandoc_archive_name)
 
-        if not download_file_with_progress(pandoc_download_url, downloaded_archive_path):
-            initial_pandoc_status_message = "Pandoc download failed."
-            shutil.rmtree(temp_dir_for_download, ignore_errors=True)
+    shutil.rmtree(temp_dir_for_download, ignore_errors=True) 
+    return final_status_path
+
+def _load_pandoc_probe_cache():
+    """Returns the pandoc path remembered from an earlier launch, if that binary is unchanged since."""
+    try:
+        with open(PANDOC_PROBE_CACHE_FILE, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        st = os.stat(cached["path"])
+        if st.st_mtime != cached["mtime"] or st.st_size != cached["size"] or not os.access(cached["path"], os.X_OK):
             return None
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    return cached
 
-        initial_pandoc_status_message = "Pandoc downloaded. Extracting..."
-        print(f"DEBUG: {initial_pandoc_status_message}")
 
-        extracted_pandoc_path_in_temp = extract_archive_macos(downloaded_archive_path, temp_dir_for_download, pandoc_exe_name)
+def _save_pandoc_probe_cache(pandoc_path, pandoc_version):
+    try:
+        st = os.stat(pandoc_path)
+        os.makedirs(os.path.dirname(PANDOC_PROBE_CACHE_FILE), exist_ok=True)
+        temp_path = PANDOC_PROBE_CACHE_FILE + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"path": pandoc_path, "version": pandoc_version, "mtime": st.st_mtime, "size": st.st_size}, f)
+        os.replace(temp_path, PANDOC_PROBE_CACHE_FILE)
+    except OSError as e:
+        print(f"DEBUG: Could not save Pandoc probe cache: {e}")
 
-        final_status_path = None
-        if extracted_pandoc_path_in_temp and os.path.exists(extracted_pandoc_path_in_temp):
-            print(f"DEBUG: Moving {extracted_pandoc_path_in_temp} to {local_pandoc_exe_path}")
-            try:
-                os.makedirs(os.path.dirname(local_pandoc_exe_path), exist_ok=True)
-                shutil.move(extracted_pandoc_path_in_temp, local_pandoc_exe_path)
-            
-                print(f"DEBUG: Setting executable permission for {local_pandoc_exe_path}")
-                current_permissions = os.stat(local_pandoc_exe_path).st_mode
-                os.chmod(local_pandoc_exe_path, current_permissions | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
-            
-                initial_pandoc_status_message = f"Pandoc for {os_subdir} installed successfully."
-                print(f"DEBUG: {initial_pandoc_status_message}")
-                final_status_path = local_pandoc_exe_path
-            except Exception as e:
-                initial_pandoc_status_message = f"Error installing Pandoc: {e}"
-                print(f"DEBUG: {initial_pandoc_status_message}")
-        else:
-            initial_pandoc_status_message = "Failed to extract Pandoc from archive."
-            print(f"DEBUG: {initial_pandoc_status_message}")
-    
-        shutil.rmtree(temp_dir_for_download, ignore_errors=True) 
-        return final_status_path
 
 def configure_pandoc_path():
     global initial_pandoc_status_message
     print("DEBUG: Entered configure_pandoc_path()")
+    import pypandoc # Deferred so the window can open before pypandoc is loaded
+
+    cached = _load_pandoc_probe_cache()
+    if cached:
+        # Same binary as last launch: skip pypandoc's `pandoc --version` probe by seeding what it would find
+        os.environ['PYPANDOC_PANDOC'] = cached["path"]
+        if hasattr(pypandoc, "__pandoc_path") and hasattr(pypandoc, "__version"):
+            setattr(pypandoc, "__pandoc_path", cached["path"])
+            setattr(pypandoc, "__version", cached["version"])
+        initial_pandoc_status_message = f"Pandoc ready ({cached['version']})."
+        print(f"DEBUG: Using cached Pandoc probe: {cached['path']} ({cached['version']})")
+        return True
+
+    if not _configure_pandoc_path_uncached(pypandoc):
+        return False
+    pandoc_exe_location = shutil.which(pypandoc.get_pandoc_path()) or shutil.which('pandoc')
+    if pandoc_exe_location:
+        try:
+            _save_pandoc_probe_cache(os.path.abspath(pandoc_exe_location), pypandoc.get_pandoc_version())
+        except OSError as e:
+            print(f"DEBUG: Could not read Pandoc version for the probe cache: {e}")
+    return True
+
+
+def _configure_pandoc_path_uncached(pypandoc):
+    global initial_pandoc_status_message
     
     if platform.system().lower() == "darwin":
         downloaded_pandoc_path = ensure_pandoc_downloaded_macos()
@@ -236,34 +296,33 @@ def configure_pandoc_path():
         return False
 
 
-print("DEBUG: About to call configure_pandoc_path()")
-PANDOC_CONFIGURED_SUCCESSFULLY = configure_pandoc_path()
-print(f"DEBUG: PANDOC_CONFIGURED_SUCCESSFULLY = {PANDOC_CONFIGURED_SUCCESSFULLY}")
-print(f"DEBUG: Initial Pandoc Status for GUI: {initial_pandoc_status_message}")
-
-REDACTION_PATTERNS_PYTHON = {
-    "redact_credit_cards": r"\b(?:(?:\d[ -]*?){13,16}|(?:\d{4}[ ]){3}\d{4}|\d{13,16})\b",
-    "redact_email_address": r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,7}\b",
-    "redact_ips": r"\b(?:[0-9]{1,3}\.){3}[0-9]{1,3}\b",
-    "redact_au_tfn": r"\b\d{3}\s?\d{3}\s?\d{3}\b",
-    "redact_au_medicare": r"\b[2-6]\d{3}\s?\d{5}\s?\d\b",
-    "redact_dob": r"\b(?:(?:\d{1,2}[-/.]\d{1,2}[-/.]\d{2,4})|(?:\d{4}[-/.]\d{1,2}[-/.]\d{1,2}))\b",
-    "redact_au_abn": r"\b\d{2}\s?\d{3}\s?\d{3}\s?\d{3}\b",
-    "redact_au_tel": r"\b(?:(?:\+?61\s?)?\\(?0?[23478]\\\\)?\s?\d{4}\s?\d{4}|1[389]\s?\d{2}\s?\d{2}\s?\d{2}|1300\s?\d{3}\s?\d{3})\b",
-    "redact_au_bsb": r"\b(?:BSB\s*[:\\\\\\\\-]?\s*)?(?:\\\\\\\\d{3}[-\\\\\\\\s]?\\\\\\\\d{3}|\\\\\\\\d{6})\b",
-    "redact_au_account_number": r"\b(?:Acct\s*[:\\\\\\\\-]?\s*|Account\s*No\s*[:\\\\\\\\-]?\s*)?\\\\\\\\d{5,9}\b",
-    "redact_au_mobile": r"\b(?:04|\\\\\\\\+?61\s*4|0011\s*61\s*4)(?:\\\\\\\\d{2}\s?\\\\\\\\d{3}\s?\\\\\\\\d{3}|\\\\\\\\d{8})\b",
-    "redact_credential_lines": "KEYWORD_LINE_REDACTION_PLACEHOLDER"
-}
-print("DEBUG: REDACTION_PATTERNS_PYTHON defined.")
+def _configure_pandoc_in_background():
+    """Runs configure_pandoc_path off the UI thread; the GUI polls get_initial_status until it's done."""
+    global PANDOC_CONFIGURED_SUCCESSFULLY, initial_pandoc_status_message
+    print("DEBUG: About to call configure_pandoc_path()")
+    try:
+        PANDOC_CONFIGURED_SUCCESSFULLY = configure_pandoc_path()
+    except Exception as e:
+        initial_pandoc_status_message = f"Pandoc setup failed: {e}"
+        PANDOC_CONFIGURED_SUCCESSFULLY = False
+    finally:
+        pandoc_setup_done.set()
+    print(f"DEBUG: PANDOC_CONFIGURED_SUCCESSFULLY = {PANDOC_CONFIGURED_SUCCESSFULLY}")
+    print(f"DEBUG: Initial Pandoc Status for GUI: {initial_pandoc_status_message}")
+
 
 class Api:
     print("DEBUG: Api class definition starting.")
 
+    def __init__(self):
+        # Batches run here in the background; only job ids and result handles cross the bridge
+        self._jobs = JobManager()
+
     def get_initial_status(self):
         """Returns the initial Pandoc setup status message for the GUI."""
         print(f"DEBUG: Api.get_initial_status called, returning: {initial_pandoc_status_message}")
-        return {"pandoc_status": initial_pandoc_status_message, "pandoc_ready": PANDOC_CONFIGURED_SUCCESSFULLY}
+        return {"pandoc_status": initial_pandoc_status_message, "pandoc_ready": PANDOC_CONFIGURED_SUCCESSFULLY,
+                "pandoc_pending": not pandoc_setup_done.is_set()}
 
     def _generate_label_from_key(self, key):
         parts = key.split('_')
@@ -307,19 +366,21 @@ class Api:
         print("DEBUG: webview.windows does not exist.")
         return []
 
-    def process_files_batch(self, params):
-        print(f"DEBUG: Api.process_files_batch called with params: {params}")
-        if not PANDOC_CONFIGURED_SUCCESSFULLY:
-            error_message = f"Pandoc setup failed or incomplete ({initial_pandoc_status_message}). Cannot process files."
-            print(f"DEBUG: {error_message}")
-            return [{"error": error_message, "original_name": "Processing Error"}]
+    def start_batch(self, params):
+        """
+        Starts redacting params["filepaths"] in the background and returns {"job_id": ...} right away.
 
+        The GUI follows the job with poll_job; nothing here waits for pandoc or for any file.
+        """
+        print(f"DEBUG: Api.start_batch called with params: {params}")
         filepaths = params.get('filepaths', [])
         redaction_options_js = params.get('redaction_options', {}) 
         output_format = params.get('output_format', 'md')
 
         selected_pattern_keys = redaction_options_js.get('selected_patterns', [])
         custom_keywords = redaction_options_js.get('custom_keywords', [])
+        # Extra words that mark a whole line for redaction, on top of the built-in credential keywords
+        credential_keywords = redaction_options_js.get('credential_keywords', [])
         
         redact_credential_lines_enabled = "redact_credential_lines" in selected_pattern_keys
         
@@ -327,42 +388,100 @@ class Api:
         print(f"DEBUG: Custom keywords from JS: {custom_keywords}")
         print(f"DEBUG: Redact credential lines enabled: {redact_credential_lines_enabled}")
 
-        active_patterns_compiled = []
-        for key in selected_pattern_keys:
-            if key == "redact_credential_lines":
-                continue 
-            
-            if key in REDACTION_PATTERNS_PYTHON:
-                pattern_str = REDACTION_PATTERNS_PYTHON[key]
-                if pattern_str == "KEYWORD_LINE_REDACTION_PLACEHOLDER":
-                    print(f"DEBUG: Warning: Pattern value for '{key}' is placeholder. Skipping.")
-                    continue
-                try:
-                    active_patterns_compiled.append(re.compile(pattern_str))
-                    print(f"DEBUG: Compiled regex for pattern key: {key}")
-                except re.error as e_regex:
-                    print(f"DEBUG: Warning: Invalid regex for {key}: {pattern_str}. Error: {e_regex}")
-            else:
-                print(f"DEBUG: Warning: Unknown pattern key selected from JS: {key}")
-
-        results_for_js = []
-        for path in filepaths:
-            if path:
-                result = process_document_for_redaction(
-                    path,
-                    active_patterns_compiled,
-                    custom_keywords,
-                    output_format,
-                    redact_credential_lines_enabled=redact_credential_lines_enabled
-                )
-                if 'original_name' not in result and 'error' in result:
-                    result['original_name'] = os.path.basename(path)
-                results_for_js.append(result)
-        print(f"DEBUG: Api.process_files_batch results: {results_for_js}")
-        return results_for_js
-
-    def save_processed_file(self, temp_file_path, original_name, output_format):
-        print(f"DEBUG: Api.save_processed_file called with: {temp_file_path}, {original_name}, {output_format}")
+        max_workers = params.get('max_workers')
+        executor_kind = params.get('executor', 'thread')
+        # Each result carries its stage timings; per-pattern timings cost an extra scan per pattern
+        profile_patterns = bool(params.get('profile_patterns', False))
+        # Re-running the same documents with the same options reuses the stored outputs
+        use_cache = params.get('use_cache', True)
+        # "latex", "weasyprint", "typst" or "auto" (see redax_pdf); only used for PDF output
+        pdf_engine = params.get('pdf_engine')
+        # With an output folder the files are written straight there; otherwise to a workspace
+        # of their own, removed once the job is forgotten
+        output_dir = params.get('output_dir')
+        workspace = None if output_dir else default_workspaces().new_workspace()
+        output_dirs = [output_dir] * len(filepaths) if output_dir else None
+
+        def mark_saved(on_result):
+            def on_result_saved(index, result):
+                if "error" not in result:
+                    result["saved"] = True
+                on_result(index, result)
+            return on_result_saved
+
+        def run(on_result, cancel_event):
+            # Runs on the job thread, so waiting for the background pandoc setup blocks nothing
+            if not pandoc_setup_done.wait(PANDOC_SETUP_WAIT_SECONDS):
+                print("DEBUG: Timed out waiting for Pandoc setup.")
+            if not PANDOC_CONFIGURED_SUCCESSFULLY:
+                raise RuntimeError(f"Pandoc setup failed or incomplete ({initial_pandoc_status_message}). Cannot process files.")
+            return process_documents_batch(
+                filepaths,
+                compile_redaction_patterns(selected_pattern_keys),
+                custom_keywords,
+                output_format,
+                redact_credential_lines_enabled=redact_credential_lines_enabled,
+                max_workers=max_workers,
+                executor_kind=executor_kind,
+                on_result=mark_saved(on_result) if output_dir else on_result,
+                cancel_event=cancel_event,
+                output_dirs=output_dirs,
+                workspace=workspace,
+                cache=ResultCache() if use_cache else None,
+                credential_keywords=credential_keywords,
+                profile_patterns=profile_patterns,
+                pdf_engine=pdf_engine
+            )
+
+        job_id = self._jobs.start(run, total=len([path for path in filepaths if path]),
+                                  on_forget=workspace.remove if workspace else None)
+        return {"job_id": job_id}
+
+    def poll_job(self, job_id, since=0):
+        """Progress of a job and summaries of the files finished since the previous poll (see redax_jobs)."""
+        try:
+            return self._jobs.poll(job_id, since)
+        except JobError as e:
+            return {"error": str(e)}
+
+    def cancel_job(self, job_id):
+        """Stops a job; files already being converted still finish."""
+        print(f"DEBUG: Api.cancel_job called for {job_id}")
+        try:
+            if not self._jobs.cancel(job_id):
+                return {"success": False, "message": "The job has already finished."}
+        except JobError as e:
+            return {"error": str(e)}
+        return {"success": True}
+
+    def select_output_folder(self):
+        """Folder dialog for writing redacted files straight to their destination; None if cancelled."""
+        print("DEBUG: Api.select_output_folder called")
+        if webview.windows:
+            result = webview.windows[0].create_file_dialog(webview.FOLDER_DIALOG, directory=os.path.expanduser('~'))
+            print(f"DEBUG: Folder dialog result: {result}")
+            return result[0] if result else None
+        return None
+
+    def clear_result_cache(self):
+        """Forgets every cached result so the next batch redacts from scratch."""
+        print("DEBUG: Api.clear_result_cache called")
+        try:
+            ResultCache().clear()
+            return {"success": True}
+        except Exception as e:
+            print(f"DEBUG: Error clearing result cache: {e}")
+            return {"error": str(e)}
+
+    def save_processed_file(self, result_handle):
+        print(f"DEBUG: Api.save_processed_file called with: {result_handle}")
+        try:
+            result = self._jobs.get_result(result_handle)
+        except JobError as e:
+            return {"error": str(e)}
+        temp_file_path = result.get("output_path")
+        original_name = result.get("original_name", "")
+        output_format = result.get("output_format")
         if not temp_file_path or not os.path.exists(temp_file_path):
             print(f"DEBUG: Error: Temporary file for download '{temp_file_path}' not found.")
             return {"error": "Processed file not found on server."}
@@ -377,9 +496,23 @@ class Api:
                 print(f"DEBUG: Save dialog result: {save_path}")
 
                 if save_path: # save_path will be a string if user selected a file, or None if cancelled
-                    shutil.copy(temp_file_path, str(save_path)) # Ensure save_path is explicitly a string
+                    save_path = str(save_path) # Ensure save_path is explicitly a string
+                    if result.get("saved"):
+                        # Already in the output folder (or saved before): the user wants another copy
+                        shutil.copyfile(temp_file_path, save_path)
+                    else:
+                        try:
+                            # Moved out of the workspace rather than copied, when on the same drive
+                            os.replace(temp_file_path, save_path)
+                            default_workspaces().release(temp_file_path)
+                            result["output_path"] = save_path
+                            result["saved"] = True
+                        except OSError:
+                            shutil.copyfile(temp_file_path, save_path)
+                            # The workspace copy may now be evicted when space runs short
+                            default_workspaces().mark_saved(temp_file_path)
                     print(f"DEBUG: File saved to: {save_path}")
-                    return {"success": True, "path": str(save_path)}
+                    return {"success": True, "path": save_path}
                 else:
                     print("DEBUG: Save dialog cancelled by user.")
                     return {"success": False, "message": "Save cancelled."}
@@ -393,8 +526,8 @@ class Api:
 
 def main():
     print("DEBUG: main() function called.")
-    if not PANDOC_CONFIGURED_SUCCESSFULLY:
-        print(f"DEBUG: CRITICAL: Pandoc setup failed ({initial_pandoc_status_message}). GUI will reflect this.")
+    # Pandoc detection (and the first-run download on macOS) happens while the window loads
+    threading.Thread(target=_configure_pandoc_in_background, name="pandoc-setup", daemon=True).start()
 
     print("DEBUG: Creating Api instance.")
     api = Api()
@@ -419,6 +552,8 @@ def main():
         print("DEBUG: webview window created. Calling webview.start().")
         webview.start(debug=True) 
         print("DEBUG: webview.start() finished (window closed).")
+        # Skip queued files and let the running ones finish before the temp dir is cleaned up
+        api._jobs.shutdown()
     except Exception as e_webview:
         print(f"DEBUG: ERROR during webview create_window or start: {e_webview}")
 
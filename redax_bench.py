@@ -0,0 +1,250 @@
+"""
+Benchmarks for the redaction pipeline.
+
+Times _redact_text_content_logic once per pattern (and with all patterns
+together), and process_document_for_redaction once per input and output
+format, on a synthetic corpus from redax_corpus. Results are written as JSON
+so two runs can be compared:
+
+    python -m redax_bench --sizes 100000 1000000 --out before.json
+    python -m redax_bench --sizes 100000 1000000 --out after.json --compare before.json
+
+PDF output can be timed once per PDF engine (see redax_pdf), each appearing as
+its own output format, e.g. "pdf:latex" and "pdf:weasyprint":
+
+    python -m redax_bench --formats md docx --output-formats pdf --pdf-engines latex weasyprint typst
+
+Runs headless; pandoc is only needed for the document benchmarks.
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from redax_corpus import DEFAULT_KEYWORDS, FORMATS, generate_corpus
+from redax_logic import (REDACTION_PATTERNS_PYTHON, _redact_text_content_logic, compile_redaction_patterns,
+                         process_document_for_redaction)
+from redax_pdf import PDF_ENGINES, available_pdf_engines, warm_pdf_engine
+
+CREDENTIAL_LINES_KEY = "redact_credential_lines"
+ALL_PATTERNS_LABEL = "all"
+
+
+def _time_call(call, repeat):
+    """Returns (timings, result of the last call)."""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = call()
+        timings.append(time.perf_counter() - started)
+    return timings, result
+
+
+def _peak_memory(call):
+    """Peak bytes allocated by Python while running call (measured separately, tracemalloc slows things down)."""
+    tracemalloc.start()
+    try:
+        call()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _summary(timings, size_bytes):
+    best = min(timings)
+    return {
+        "best_seconds": round(best, 6),
+        "median_seconds": round(statistics.median(timings), 6),
+        "mb_per_second": round(size_bytes / best / 1e6, 3) if best else None,
+    }
+
+
+def bench_text(text, pattern_keys, repeat=3, measure_memory=True, keywords=DEFAULT_KEYWORDS):
+    """Times _redact_text_content_logic for each pattern on its own, then for all of them plus keywords."""
+    size_bytes = len(text.encode("utf-8"))
+    cases = [(key, [key], [], key == CREDENTIAL_LINES_KEY) for key in pattern_keys]
+    cases.append((ALL_PATTERNS_LABEL, list(pattern_keys), list(keywords), CREDENTIAL_LINES_KEY in pattern_keys))
+    results = []
+    for label, keys, case_keywords, credential_lines in cases:
+        with contextlib.redirect_stdout(io.StringIO()):
+            active_patterns_compiled = compile_redaction_patterns(keys)
+        if not active_patterns_compiled and not case_keywords and not credential_lines:
+            results.append({"pattern": label, "skipped": "pattern does not compile"})
+            continue
+        call = lambda: _redact_text_content_logic(text, active_patterns_compiled, case_keywords, credential_lines)
+        call()  # warm-up: builds and caches the engine
+        timings, redacted = _time_call(call, repeat)
+        entry = {"pattern": label, "input_bytes": size_bytes, **_summary(timings, size_bytes),
+                 "placeholders": redacted.count("[REDACTED")}
+        if measure_memory:
+            entry["peak_memory_bytes"] = _peak_memory(call)
+        results.append(entry)
+    return results
+
+
+def _output_cases(output_formats, pdf_engines):
+    """(label, output_format, pdf_engine) per document benchmark: PDF once per engine if engines are given."""
+    cases = []
+    for output_format in output_formats:
+        if output_format == "pdf" and pdf_engines:
+            cases.extend((f"pdf:{engine}", "pdf", engine) for engine in pdf_engines)
+        else:
+            cases.append((output_format, output_format, None))
+    return cases
+
+
+def bench_documents(manifest, output_formats=("md",), pattern_keys=None, repeat=1, measure_memory=True,
+                    keywords=DEFAULT_KEYWORDS, pdf_engines=None):
+    """Times process_document_for_redaction for every corpus file and output format (and PDF engine)."""
+    pattern_keys = list(pattern_keys or REDACTION_PATTERNS_PYTHON)
+    with contextlib.redirect_stdout(io.StringIO()):
+        active_patterns_compiled = compile_redaction_patterns(pattern_keys)
+    credential_lines = CREDENTIAL_LINES_KEY in pattern_keys
+    cases = _output_cases(output_formats, pdf_engines)
+    for _, output_format, pdf_engine in cases:
+        if output_format == "pdf":
+            # Engine start-up is paid once per process, not per document: keep it out of the timings
+            with contextlib.redirect_stdout(io.StringIO()):
+                warm_pdf_engine(pdf_engine)
+    results = []
+    with tempfile.TemporaryDirectory(prefix="redax-bench-") as output_dir:
+        for entry in manifest:
+            for label, output_format, pdf_engine in cases:
+                call = lambda: process_document_for_redaction(entry["path"], active_patterns_compiled, list(keywords),
+                                                              output_format, credential_lines, output_dir,
+                                                              pdf_engine=pdf_engine)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    timings, result = _time_call(call, repeat)
+                    peak = _peak_memory(call) if measure_memory and "error" not in result else None
+                record = {"input": os.path.basename(entry["path"]), "input_format": entry["format"],
+                          "output_format": label, "input_bytes": entry["bytes"]}
+                if "error" in result:
+                    record["error"] = result["error"]
+                else:
+                    record.update(_summary(timings, entry["bytes"]))
+                    record["matches"] = result.get("matches", {})
+                    record["planted"] = entry["planted"]
+                    if peak is not None:
+                        record["peak_memory_bytes"] = peak
+                results.append(record)
+                print(f"INFO: {record['input']} -> {label}: "
+                      f"{record.get('best_seconds', record.get('error'))}", file=sys.stderr)
+    return results
+
+
+def _environment():
+    environment = {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+    try:
+        import pypandoc
+        environment["pandoc"] = pypandoc.get_pandoc_version()
+    except Exception:
+        environment["pandoc"] = None
+    environment["pdf_engines"] = available_pdf_engines()
+    try:
+        environment["git_commit"] = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        environment["git_commit"] = None
+    return environment
+
+
+def compare(current, baseline):
+    """Yields (name, baseline_seconds, current_seconds, speedup) for every benchmark present in both runs."""
+    def index(run):
+        timings = {}
+        for entry in run.get("text", []):
+            if "best_seconds" in entry:
+                timings[f"text/{entry['size']}/{entry['pattern']}"] = entry["best_seconds"]
+        for entry in run.get("documents", []):
+            if "best_seconds" in entry:
+                timings[f"document/{entry['input']}->{entry['output_format']}"] = entry["best_seconds"]
+        return timings
+
+    before, after = index(baseline), index(current)
+    for name in sorted(before.keys() & after.keys()):
+        yield name, before[name], after[name], before[name] / after[name] if after[name] else None
+
+
+def run(sizes=(100_000,), formats=FORMATS, output_formats=("md",), pattern_keys=None, repeat=3,
+        measure_memory=True, corpus_dir=None, seed=0, skip_documents=False, pdf_engines=None):
+    pattern_keys = list(pattern_keys or REDACTION_PATTERNS_PYTHON)
+    with contextlib.ExitStack() as stack:
+        if corpus_dir is None:
+            corpus_dir = stack.enter_context(tempfile.TemporaryDirectory(prefix="redax-corpus-"))
+        manifest = generate_corpus(corpus_dir, sizes, formats, seed=seed)
+
+        text_results = []
+        for entry in manifest:
+            if entry["format"] != "txt":
+                continue
+            with open(entry["path"], "r", encoding="utf-8") as f:
+                text = f.read()
+            for result in bench_text(text, pattern_keys, repeat, measure_memory):
+                text_results.append(dict(result, size=entry["target_chars"]))
+            print(f"INFO: text benchmarks done for {entry['target_chars']} chars", file=sys.stderr)
+
+        document_results = [] if skip_documents else bench_documents(
+            manifest, output_formats, pattern_keys, max(1, repeat // 3), measure_memory, pdf_engines=pdf_engines)
+
+    return {"environment": _environment(), "parameters": {"sizes": list(sizes), "formats": list(formats),
+            "output_formats": list(output_formats), "pdf_engines": list(pdf_engines or ()), "patterns": pattern_keys, "repeat": repeat, "seed": seed},
+            "text": text_results, "documents": document_results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m redax_bench", description="Benchmark the redaction pipeline.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000], help="Corpus document sizes in characters")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=list(FORMATS), help="Input formats to generate")
+    parser.add_argument("--output-formats", nargs="+", default=["md"], help="Output formats for the document benchmarks")
+    parser.add_argument("--pdf-engines", nargs="+", choices=PDF_ENGINES, metavar="ENGINE",
+                        help=f"Time PDF output once per engine ({', '.join(PDF_ENGINES)})")
+    parser.add_argument("-p", "--pattern", dest="patterns", action="append", metavar="KEY",
+                        help="Pattern to benchmark; repeatable. Default: all")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per text benchmark (best and median are kept)")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc peak memory runs")
+    parser.add_argument("--text-only", action="store_true", help="Skip the document (pandoc) benchmarks")
+    parser.add_argument("--corpus-dir", help="Keep the generated corpus here instead of a temp dir")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="-", help="Where to write the JSON results (default: stdout)")
+    parser.add_argument("--compare", metavar="BASELINE_JSON", help="Print speedups against an earlier run")
+    args = parser.parse_args(argv)
+
+    unknown = [key for key in args.patterns or () if key not in REDACTION_PATTERNS_PYTHON]
+    if unknown:
+        parser.error(f"unknown pattern key(s): {', '.join(unknown)}")
+
+    results = run(args.sizes, args.formats, args.output_formats, args.patterns, args.repeat,
+                  not args.no_memory, args.corpus_dir, args.seed, args.text_only, args.pdf_engines)
+    output = json.dumps(results, indent=2)
+    if args.out == "-":
+        print(output)
+    else:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        for name, before, after, speedup in compare(results, baseline):
+            print(f"{name}: {before:.4f}s -> {after:.4f}s ({speedup:.2f}x)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
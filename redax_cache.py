@@ -0,0 +1,262 @@
+"""
+Persistent on-disk cache of redaction results.
+
+An entry is keyed on everything that decides the output: a hash of the input
+file's bytes, the active patterns (their regex source and, for registry
+patterns, their checksum validator and min_digits, so editing a pattern or a
+pack entry invalidates old entries), the custom keywords, the credential-line flag and
+the output format. Each entry is the redacted output file plus a small JSON
+file with the result metadata (match counts etc.).
+
+Entries are evicted least recently used first once the cache grows past
+max_bytes; a hit refreshes the entry's mtime, which is what LRU order is based
+on. ResultCache holds no open handles or locks, so it can be handed to worker
+processes.
+
+Walking the whole cache on every store would cost more than the redaction
+being cached, so each process keeps a running estimate of the cache's size per
+directory: one full scan when it first stores, then the sizes it adds. Entries
+are only evicted (with a fresh scan) once the estimate passes max_bytes, or
+every EVICTION_RESCAN_PUTS stores to catch up with other processes' writes.
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+from redax_patterns import default_registry
+from redax_workspace import partial_path_for, remove_quietly
+
+CACHE_DIR_ENV_VAR = "REDAX_CACHE_DIR"
+DEFAULT_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+# Bump when a change in redax itself would change outputs for the same inputs
+CACHE_FORMAT_VERSION = 6
+_HASH_CHUNK_BYTES = 1024 * 1024
+_METADATA_SUFFIX = ".json"
+EVICTION_RESCAN_PUTS = 64
+# Per process: absolute cache directory -> [estimated bytes, stores since the last scan]
+_size_estimates = {}
+_size_estimates_lock = threading.Lock()
+
+
+def user_cache_dir():
+    """The per-user cache directory for redax on this platform."""
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    elif sys.platform == "darwin":
+        base = os.path.join(os.path.expanduser("~"), "Library", "Caches")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "redax")
+
+
+def default_cache_dir():
+    """REDAX_CACHE_DIR if set, otherwise a results directory under user_cache_dir()."""
+    if os.environ.get(CACHE_DIR_ENV_VAR):
+        return os.environ[CACHE_DIR_ENV_VAR]
+    return os.path.join(user_cache_dir(), "results")
+
+
+def file_content_hash(filepath):
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_CHUNK_BYTES), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _pattern_options(active_patterns_compiled):
+    """Sorted (key, regex source, flags, validator, min_digits) for each active pattern."""
+    if not isinstance(active_patterns_compiled, dict):
+        # A plain list has no registry keys, so no detectors either (see redax_logic._get_engine)
+        return sorted((str(key), getattr(pattern, "pattern", pattern), getattr(pattern, "flags", 0), None, 0)
+                      for key, pattern in enumerate(active_patterns_compiled))
+    registry = default_registry()
+    options = []
+    for key, pattern in active_patterns_compiled.items():
+        definition = registry.get(key)
+        options.append((str(key), getattr(pattern, "pattern", pattern), getattr(pattern, "flags", 0),
+                        definition.validator if definition is not None else None,
+                        definition.min_digits if definition is not None else 0))
+    return sorted(options)
+
+
+def redaction_options(active_patterns_compiled, custom_keywords_list, redact_credential_lines_enabled, output_format,
+                      credential_keywords=(), pseudonymize=False, pdf_engine=None, span_report=None):
+    """
+    Everything besides the input that decides a redaction's output, as a JSON-able dict.
+
+    Both the cache key and the watch manifest (redax_watch) are built from it,
+    so an option added here invalidates both.
+    """
+    options = {
+        "version": CACHE_FORMAT_VERSION,
+        "patterns": _pattern_options(active_patterns_compiled),
+        # Order matters: overlapping keywords are matched in the order given
+        "keywords": list(custom_keywords_list or ()),
+        "credential_lines": bool(redact_credential_lines_enabled),
+        "credential_keywords": sorted(k.lower() for k in credential_keywords or ()) if redact_credential_lines_enabled else [],
+        "output_format": output_format,
+    }
+    # The rest only when used, so entries and manifests written before these options existed keep their keys
+    if span_report:
+        options["span_report"] = span_report
+    if pseudonymize:
+        # Imported here: redax_spans keeps its key under user_cache_dir()
+        from redax_spans import span_key_id
+        # Pseudonyms depend on the span key
+        options["pseudonymize"] = span_key_id()
+    if output_format == "pdf" and pdf_engine not in (None, "latex"):
+        # LaTeX PDFs keep the keys they had before there was a choice of engine
+        options["pdf_engine"] = pdf_engine
+    return options
+
+
+def _copy_into(source_path, destination_file):
+    with open(source_path, "rb") as src:
+        shutil.copyfileobj(src, destination_file, _HASH_CHUNK_BYTES)
+
+
+class ResultCache:
+    """Redaction results on disk, keyed by key_for()."""
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+
+    def key_for(self, filepath, active_patterns_compiled, custom_keywords_list, redact_credential_lines_enabled, output_format,
+                credential_keywords=(), pseudonymize=False, pdf_engine=None):
+        """Returns the cache key for redacting filepath with these options."""
+        # Runs that want a span report never use the cache, so there's no span_report here
+        options = redaction_options(active_patterns_compiled, custom_keywords_list, redact_credential_lines_enabled,
+                                    output_format, credential_keywords, pseudonymize, pdf_engine)
+        options["content"] = file_content_hash(filepath)
+        return hashlib.sha256(json.dumps(options, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key, output_path):
+        """
+        Copies the cached output for key to output_path and returns its result metadata, or None on a miss.
+        """
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path + _METADATA_SUFFIX, "r", encoding="utf-8") as f:
+                metadata = json.load(f)
+            output_dir = os.path.dirname(output_path)
+            if output_dir:
+                os.makedirs(output_dir, exist_ok=True)
+            # Copied under a partial name and renamed, like a freshly redacted output
+            partial_path = partial_path_for(output_path)
+            try:
+                shutil.copyfile(entry_path, partial_path)
+                os.replace(partial_path, output_path)
+            finally:
+                remove_quietly(partial_path)
+        except (OSError, ValueError):
+            # Missing, evicted mid-read or corrupt: treat as a miss
+            return None
+        for path in (entry_path, entry_path + _METADATA_SUFFIX):
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        return metadata
+
+    def put(self, key, output_path, metadata):
+        """Stores a copy of output_path and its result metadata under key, then evicts if over budget."""
+        try:
+            size = os.path.getsize(output_path)
+            if size > self.max_bytes:
+                return False
+            entry_path = self._entry_path(key)
+            os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+            # Written under temp names and renamed so readers never see half an entry
+            self._write_atomically(entry_path, lambda f: _copy_into(output_path, f))
+            metadata_bytes = json.dumps(metadata).encode("utf-8")
+            self._write_atomically(entry_path + _METADATA_SUFFIX, lambda f: f.write(metadata_bytes))
+        except OSError as e:
+            print(f"DEBUG: Could not store cache entry for {output_path}: {e}")
+            return False
+        with _size_estimates_lock:
+            estimate = _size_estimates.get(os.path.abspath(self.directory))
+            if estimate is not None:
+                estimate[0] += size + len(metadata_bytes)
+                estimate[1] += 1
+        if estimate is None or estimate[0] > self.max_bytes or estimate[1] >= EVICTION_RESCAN_PUTS:
+            self.evict()
+        return True
+
+    def _write_atomically(self, path, write):
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+
+    def _entries(self):
+        """Yields (mtime, size, entry_path) for every complete entry."""
+        try:
+            shards = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return
+        for shard in shards:
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.startswith(".tmp-") or entry.name.endswith(_METADATA_SUFFIX):
+                    continue
+                try:
+                    stat = entry.stat()
+                    metadata_size = os.path.getsize(entry.path + _METADATA_SUFFIX)
+                except OSError:
+                    continue
+                yield stat.st_mtime, stat.st_size + metadata_size, entry.path
+
+    def size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self, max_bytes=None):
+        """Removes least recently used entries until the cache fits in max_bytes. Returns how many were removed."""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, entry_path in entries:
+            if total <= max_bytes:
+                break
+            for path in (entry_path + _METADATA_SUFFIX, entry_path):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+            removed += 1
+        with _size_estimates_lock:
+            _size_estimates[os.path.abspath(self.directory)] = [total, 0]
+        return removed
+
+    def invalidate(self, key):
+        for path in (self._entry_path(key) + _METADATA_SUFFIX, self._entry_path(key)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        """Drops every cached result."""
+        with _size_estimates_lock:
+            _size_estimates.pop(os.path.abspath(self.directory), None)
+        if os.path.isdir(self.directory):
+            shutil.rmtree(self.directory, ignore_errors=True)
+            print(f"INFO: Cleared result cache: {self.directory}")
@@ -0,0 +1,292 @@
+"""
+Conversion backends used by redax_logic to run pandoc.
+
+SubprocessPandocBackend starts one pandoc process per conversion through
+pypandoc (the original behaviour, always available). PandocServerBackend keeps a
+local `pandoc server` running and sends conversions to it over a small pool of
+keep-alive HTTP connections, which removes process start-up from every call. Any
+conversion the server cannot do (PDF output, unsupported options, server not
+starting) falls through to the subprocess backend.
+
+The backend is chosen with configure_conversion_backend() or the
+REDAX_PANDOC_BACKEND environment variable ("subprocess" or "server").
+"""
+import atexit
+import base64
+import http.client
+import json
+import os
+import queue
+import socket
+import subprocess
+import threading
+import time
+
+BACKEND_ENV_VAR = "REDAX_PANDOC_BACKEND"
+DEFAULT_BACKEND = "subprocess"
+SERVER_HOST = "127.0.0.1"
+SERVER_STARTUP_TIMEOUT_SECONDS = 10
+SERVER_CONVERSION_TIMEOUT_SECONDS = 300
+DEFAULT_SERVER_POOL_SIZE = os.cpu_count() or 1
+
+# Formats pandoc reads or writes as binary; the server exchanges these base64 encoded
+BINARY_FORMATS = {"docx", "odt", "epub", "epub2", "epub3", "pptx", "xlsx", "docx+styles"}
+# Output formats the server can't produce because they need an external program
+SERVER_UNSUPPORTED_OUTPUTS = {"pdf"}
+
+
+def _pypandoc():
+    # Imported on first use: pypandoc pulls in urllib and friends, which slows down app start-up
+    import pypandoc
+    return pypandoc
+
+
+class ConversionError(RuntimeError):
+    """Raised when pandoc rejects a document (as opposed to pandoc being unreachable)."""
+
+
+class SubprocessPandocBackend:
+    """One pandoc process per conversion, via pypandoc."""
+    name = "subprocess"
+
+    def convert_file(self, source_path, to, from_format, outputfile=None, extra_args=()):
+        return _pypandoc().convert_file(source_path, to, format=from_format, outputfile=outputfile, extra_args=list(extra_args))
+
+    def convert_text(self, source, to, from_format, outputfile=None, extra_args=()):
+        return _pypandoc().convert_text(source, to, format=from_format, outputfile=outputfile, extra_args=list(extra_args))
+
+    def close(self):
+        pass
+
+
+def _server_options(extra_args):
+    """Maps the pandoc command line options redax uses to pandoc-server JSON fields, or None if one has no mapping."""
+    options = {}
+    for arg in extra_args:
+        if arg in ("--standalone", "-s"):
+            options["standalone"] = True
+        elif arg in ("--toc", "--table-of-contents"):
+            options["table-of-contents"] = True
+        elif arg.startswith("--wrap="):
+            options["wrap"] = arg.split("=", 1)[1]
+        elif arg.startswith("--columns="):
+            options["columns"] = int(arg.split("=", 1)[1])
+        elif arg.startswith("--variable="):
+            name, _, value = arg.split("=", 1)[1].partition("=")
+            options.setdefault("variables", {})[name] = value or True
+        else:
+            return None
+    return options
+
+
+def _base_format(pandoc_format):
+    # "markdown_strict+pipe_tables" -> "markdown_strict"
+    for separator in "+-":
+        pandoc_format = pandoc_format.split(separator, 1)[0]
+    return pandoc_format
+
+
+def _free_local_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind((SERVER_HOST, 0))
+        return s.getsockname()[1]
+
+
+class PandocServerBackend:
+    """
+    Sends conversions to a long-lived local `pandoc server`.
+
+    The server is started lazily on first use and stopped at exit. Up to
+    pool_size keep-alive connections are shared between threads. If the server
+    can't be started it is not retried and every call uses the fallback.
+    """
+    name = "server"
+
+    def __init__(self, pandoc_path=None, pool_size=DEFAULT_SERVER_POOL_SIZE, fallback=None):
+        self.pandoc_path = pandoc_path
+        self.pool_size = max(1, pool_size)
+        self.fallback = fallback or SubprocessPandocBackend()
+        self.port = None
+        self._process = None
+        self._unavailable = False
+        self._start_lock = threading.Lock()
+        self._connections = queue.LifoQueue()
+        self._connection_slots = threading.BoundedSemaphore(self.pool_size)
+
+    def _start_server(self):
+        with self._start_lock:
+            if self._process is not None or self._unavailable:
+                return not self._unavailable
+            pandoc_path = self.pandoc_path or _pypandoc().get_pandoc_path()
+            port = _free_local_port()
+            try:
+                process = subprocess.Popen(
+                    [pandoc_path, "server", f"--port={port}", f"--timeout={SERVER_CONVERSION_TIMEOUT_SECONDS}"],
+                    stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+                )
+            except OSError as e:
+                print(f"DEBUG: Could not start pandoc server ({e}); using one pandoc process per conversion.")
+                self._unavailable = True
+                return False
+
+            deadline = time.monotonic() + SERVER_STARTUP_TIMEOUT_SECONDS
+            while time.monotonic() < deadline:
+                if process.poll() is not None:
+                    break
+                try:
+                    connection = http.client.HTTPConnection(SERVER_HOST, port, timeout=2)
+                    connection.request("GET", "/version")
+                    response = connection.getresponse()
+                    version = response.read().decode("utf-8", errors="replace").strip()
+                    connection.close()
+                    if response.status == 200:
+                        print(f"INFO: pandoc server {version} listening on {SERVER_HOST}:{port}")
+                        self._process = process
+                        self.port = port
+                        atexit.register(self.close)
+                        return True
+                except ConnectionRefusedError:
+                    # Not listening yet
+                    time.sleep(0.1)
+                    continue
+                except (OSError, http.client.HTTPException) as e:
+                    # Listening but failing requests, e.g. a pandoc build without server support
+                    print(f"DEBUG: pandoc server probe failed: {e}")
+                    break
+                time.sleep(0.1)
+
+            print("DEBUG: pandoc server did not come up; using one pandoc process per conversion.")
+            if process.poll() is None:
+                process.kill()
+            self._unavailable = True
+            return False
+
+    def _post(self, path, payload):
+        body = json.dumps(payload).encode("utf-8")
+        headers = {"Content-Type": "application/json", "Accept": "application/json"}
+        with self._connection_slots:
+            try:
+                connection = self._connections.get_nowait()
+            except queue.Empty:
+                connection = http.client.HTTPConnection(SERVER_HOST, self.port, timeout=SERVER_CONVERSION_TIMEOUT_SECONDS + 5)
+            try:
+                connection.request("POST", path, body=body, headers=headers)
+                response = connection.getresponse()
+                data = response.read()
+            except (OSError, http.client.HTTPException):
+                # A dropped keep-alive connection; one retry on a fresh one
+                connection.close()
+                connection = http.client.HTTPConnection(SERVER_HOST, self.port, timeout=SERVER_CONVERSION_TIMEOUT_SECONDS + 5)
+                connection.request("POST", path, body=body, headers=headers)
+                response = connection.getresponse()
+                data = response.read()
+            self._connections.put(connection)
+
+        if response.status != 200:
+            raise ConversionError(data.decode("utf-8", errors="replace").strip() or f"pandoc server returned HTTP {response.status}")
+        result = json.loads(data)
+        if isinstance(result, dict) and result.get("error"):
+            raise ConversionError(result["error"])
+        return result
+
+    def _convert(self, text, to, from_format, outputfile, options):
+        # Same aliases pypandoc accepts on the subprocess path, e.g. "md"
+        normalize_format = _pypandoc().normalize_format
+        from_format, to = normalize_format(from_format), normalize_format(to)
+        payload = dict(options, text=text, **{"from": from_format, "to": to})
+        result = self._post("/", payload)
+        output = result.get("output", "")
+        if result.get("base64"):
+            output = base64.b64decode(output)
+        if outputfile is None:
+            return output
+        mode = "wb" if isinstance(output, bytes) else "w"
+        with open(outputfile, mode, **({} if mode == "wb" else {"encoding": "utf-8"})) as f:
+            f.write(output)
+        return ""
+
+    def _usable_for(self, to, extra_args):
+        if _base_format(_pypandoc().normalize_format(to)) in SERVER_UNSUPPORTED_OUTPUTS:
+            return None
+        options = _server_options(extra_args)
+        if options is None or not self._start_server():
+            return None
+        return options
+
+    def convert_file(self, source_path, to, from_format, outputfile=None, extra_args=()):
+        options = self._usable_for(to, extra_args)
+        if options is None:
+            return self.fallback.convert_file(source_path, to, from_format, outputfile, extra_args)
+        if _base_format(_pypandoc().normalize_format(from_format)) in BINARY_FORMATS:
+            with open(source_path, "rb") as f:
+                text = base64.b64encode(f.read()).decode("ascii")
+        else:
+            with open(source_path, "r", encoding="utf-8", errors="ignore") as f:
+                text = f.read()
+        return self._convert_or_fallback(text, to, from_format, outputfile, options,
+                                         lambda: self.fallback.convert_file(source_path, to, from_format, outputfile, extra_args))
+
+    def convert_text(self, source, to, from_format, outputfile=None, extra_args=()):
+        options = self._usable_for(to, extra_args)
+        if options is None:
+            return self.fallback.convert_text(source, to, from_format, outputfile, extra_args)
+        # Binary input (a DOCX) travels base64-encoded; the fallback still gets the bytes
+        text = base64.b64encode(source).decode("ascii") if isinstance(source, bytes) else source
+        return self._convert_or_fallback(text, to, from_format, outputfile, options,
+                                         lambda: self.fallback.convert_text(source, to, from_format, outputfile, extra_args))
+
+    def _convert_or_fallback(self, text, to, from_format, outputfile, options, fallback_call):
+        try:
+            return self._convert(text, to, from_format, outputfile, options)
+        except (OSError, http.client.HTTPException) as e:
+            # The server went away; ConversionError (a bad document) is not retried
+            print(f"DEBUG: pandoc server request failed ({e}); falling back to a pandoc process.")
+            return fallback_call()
+
+    def close(self):
+        while True:
+            try:
+                self._connections.get_nowait().close()
+            except queue.Empty:
+                break
+        if self._process is not None and self._process.poll() is None:
+            self._process.terminate()
+            try:
+                self._process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+        self._process = None
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def _create_backend(name, options):
+    if name == "server":
+        return PandocServerBackend(**options)
+    if name == "subprocess":
+        return SubprocessPandocBackend()
+    raise ValueError(f"Unknown pandoc backend: {name}")
+
+
+def configure_conversion_backend(name=None, **options):
+    """Selects the backend returned by get_conversion_backend(): "subprocess" or "server"."""
+    global _backend
+    name = name or os.environ.get(BACKEND_ENV_VAR, DEFAULT_BACKEND)
+    backend = _create_backend(name, options)
+    with _backend_lock:
+        previous, _backend = _backend, backend
+    if previous is not None:
+        previous.close()
+    print(f"DEBUG: Using pandoc conversion backend: {name}")
+    return backend
+
+
+def get_conversion_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = _create_backend(os.environ.get(BACKEND_ENV_VAR, DEFAULT_BACKEND), {})
+    return _backend
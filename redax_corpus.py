@@ -0,0 +1,257 @@
+"""
+Synthetic documents for benchmarking redaction.
+
+Text is built from filler words with sensitive values (emails, TFNs, ABNs,
+phone numbers, ...) planted at a controlled density, given per 1000 words.
+Identifiers that carry a check digit are generated valid, so they still
+count as real hits for checksum-aware patterns. Everything is driven by a
+seed, so the same arguments always give the same corpus.
+
+    python -m redax_corpus ./corpus --sizes 100000 1000000 --formats txt md docx rtf
+"""
+import argparse
+import json
+import os
+import random
+import sys
+
+FILLER_WORDS = (
+    "the", "report", "client", "meeting", "project", "review", "account", "update", "schedule", "team",
+    "quarter", "budget", "approved", "pending", "office", "contract", "delivery", "notes", "follow", "up",
+    "with", "and", "for", "from", "about", "next", "week", "please", "confirm", "details", "summary",
+)
+CREDENTIAL_LINE_TEMPLATES = ("password: {}", "API key = {}", "db_user pwd {}", "Bearer token {}")
+
+# Planted values per 1000 filler words
+DEFAULT_DENSITIES = {
+    "email": 4,
+    "tfn": 2,
+    "abn": 2,
+    "mobile": 3,
+    "landline": 2,
+    "ip": 2,
+    "credit_card": 1,
+    "dob": 2,
+    "medicare": 1,
+    "bsb": 1,
+    "account_number": 1,
+    "keyword": 2,
+    "credential_line": 1,
+}
+DEFAULT_KEYWORDS = ("Project Falcon", "Acme Holdings")
+FORMATS = ("txt", "md", "docx", "rtf")
+
+
+def _digits(rng, count):
+    return [rng.randrange(10) for _ in range(count)]
+
+
+def _luhn_number(rng, length=16):
+    digits = [4] + _digits(rng, length - 2)
+    total = 0
+    for i, digit in enumerate(reversed(digits)):
+        # The check digit will sit to the right, so the rightmost payload digit is doubled
+        if i % 2 == 0:
+            digit *= 2
+            if digit > 9:
+                digit -= 9
+        total += digit
+    digits.append((10 - total % 10) % 10)
+    return "".join(map(str, digits))
+
+
+def _tfn(rng):
+    weights = (1, 4, 3, 7, 5, 8, 6, 9, 10)
+    while True:
+        digits = _digits(rng, 9)
+        if digits[0] and sum(d * w for d, w in zip(digits, weights)) % 11 == 0:
+            break
+    s = "".join(map(str, digits))
+    return f"{s[:3]} {s[3:6]} {s[6:]}"
+
+
+def _abn(rng):
+    weights = (10, 1, 3, 5, 7, 9, 11, 13, 15, 17, 19)
+    while True:
+        digits = [rng.randrange(1, 10)] + _digits(rng, 10)
+        check = [digits[0] - 1] + digits[1:]
+        if sum(d * w for d, w in zip(check, weights)) % 89 == 0:
+            break
+    s = "".join(map(str, digits))
+    return f"{s[:2]} {s[2:5]} {s[5:8]} {s[8:]}"
+
+
+def _medicare(rng):
+    digits = [rng.randrange(2, 7)] + _digits(rng, 7)
+    digits.append(sum(d * w for d, w in zip(digits, (1, 3, 7, 9, 1, 3, 7, 9))) % 10)
+    digits.append(rng.randrange(1, 10))  # issue number
+    s = "".join(map(str, digits))
+    return f"{s[:4]} {s[4:9]} {s[9]}"
+
+
+def _value(kind, rng):
+    if kind == "email":
+        return f"{rng.choice(('jane', 'sam', 'alex', 'lee'))}.{rng.randrange(1000)}@{rng.choice(('example.com', 'corp.com.au', 'mail.net'))}"
+    if kind == "tfn":
+        return _tfn(rng)
+    if kind == "abn":
+        return _abn(rng)
+    if kind == "mobile":
+        return f"04{rng.randrange(10)}{rng.randrange(10)} {rng.randrange(1000):03d} {rng.randrange(1000):03d}"
+    if kind == "landline":
+        return f"(0{rng.choice('2378')}) {rng.randrange(1000, 10000)} {rng.randrange(10000):04d}"
+    if kind == "ip":
+        return ".".join(str(rng.randrange(1, 255)) for _ in range(4))
+    if kind == "credit_card":
+        s = _luhn_number(rng)
+        return " ".join(s[i:i + 4] for i in range(0, 16, 4))
+    if kind == "dob":
+        return f"{rng.randrange(1, 29):02d}/{rng.randrange(1, 13):02d}/{rng.randrange(1940, 2010)}"
+    if kind == "medicare":
+        return _medicare(rng)
+    if kind == "bsb":
+        return f"BSB {rng.randrange(1000):03d}-{rng.randrange(1000):03d}"
+    if kind == "account_number":
+        return f"Acct {rng.randrange(10 ** 7, 10 ** 9)}"
+    if kind == "keyword":
+        return rng.choice(DEFAULT_KEYWORDS)
+    raise ValueError(f"Unknown value kind: {kind}")
+
+
+def generate_paragraphs(target_chars, densities=None, seed=0):
+    """
+    Returns (paragraphs, planted) for about target_chars of text.
+
+    planted counts the values inserted per kind. Credential lines are whole
+    paragraphs of their own; everything else is mixed into filler sentences.
+    """
+    densities = DEFAULT_DENSITIES if densities is None else densities
+    rng = random.Random(seed)
+    kinds = [kind for kind, per_thousand in densities.items() if per_thousand and kind != "credential_line"]
+    weights = [densities[kind] for kind in kinds]
+    value_rate = sum(weights) / 1000
+    credential_rate = densities.get("credential_line", 0) / 1000
+    planted = dict.fromkeys(densities, 0)
+
+    paragraphs = []
+    size = 0
+    while size < target_chars:
+        words = []
+        for _ in range(rng.randrange(20, 80)):
+            if kinds and rng.random() < value_rate:
+                kind = rng.choices(kinds, weights)[0]
+                words.append(_value(kind, rng))
+                planted[kind] += 1
+            words.append(rng.choice(FILLER_WORDS))
+        if credential_rate and rng.random() < credential_rate * len(words):
+            paragraphs.append(rng.choice(CREDENTIAL_LINE_TEMPLATES).format(f"s3cr{rng.randrange(10 ** 6)}"))
+            planted["credential_line"] += 1
+        paragraph = " ".join(words)
+        # Not str.capitalize(), which would lowercase the planted values
+        paragraph = paragraph[:1].upper() + paragraph[1:] + "."
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 2
+    return paragraphs, planted
+
+
+def write_txt(path, paragraphs):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n\n".join(paragraphs) + "\n")
+
+
+def write_md(path, paragraphs):
+    # Headings, lists and a table now and then, so pandoc has real markdown to parse
+    with open(path, "w", encoding="utf-8") as f:
+        for i, paragraph in enumerate(paragraphs):
+            if i % 20 == 0:
+                f.write(f"## Section {i // 20 + 1}\n\n")
+            if i % 7 == 3:
+                f.write("\n".join(f"- {item.strip()}" for item in paragraph.split(",") if item.strip()) + "\n\n")
+            elif i % 29 == 11:
+                cells = paragraph.split(" ")
+                f.write("| Field | Value |\n|---|---|\n")
+                f.write("".join(f"| {cells[j]} | {' '.join(cells[j + 1:j + 4])} |\n" for j in range(0, min(len(cells), 20), 4)))
+                f.write("\n")
+            else:
+                f.write(paragraph + "\n\n")
+
+
+def write_docx(path, paragraphs):
+    from docx import Document  # only needed for .docx corpora
+    document = Document()
+    document.sections[0].header.paragraphs[0].text = paragraphs[0][:80]
+    for i, paragraph in enumerate(paragraphs):
+        if i % 25 == 12:
+            cells = paragraph.split(" ")
+            table = document.add_table(rows=2, cols=2)
+            for j, cell in enumerate(c for row in table.rows for c in row.cells):
+                cell.text = " ".join(cells[j * 3:j * 3 + 3])
+        else:
+            document.add_paragraph(paragraph)
+    document.save(path)
+
+
+def _rtf_escape(text):
+    escaped = text.replace("\\", "\\\\").replace("{", "\\{").replace("}", "\\}")
+    return "".join(ch if ord(ch) < 128 else f"\\u{ord(ch)}?" for ch in escaped)
+
+
+def write_rtf(path, paragraphs):
+    with open(path, "w", encoding="ascii") as f:
+        f.write("{\\rtf1\\ansi\\deff0{\\fonttbl{\\f0 Calibri;}}\n")
+        for paragraph in paragraphs:
+            f.write(f"\\pard {_rtf_escape(paragraph)}\\par\n")
+        f.write("}\n")
+
+
+WRITERS = {"txt": write_txt, "md": write_md, "docx": write_docx, "rtf": write_rtf}
+
+
+def generate_corpus(output_dir, sizes=(100_000,), formats=FORMATS, densities=None, seed=0):
+    """
+    Writes one document per (size, format) to output_dir and returns a manifest entry for each.
+
+    The same paragraphs are used for every format of a given size, so formats
+    can be compared like for like.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = []
+    for size in sizes:
+        paragraphs, planted = generate_paragraphs(size, densities, seed=seed + size)
+        for fmt in formats:
+            path = os.path.join(output_dir, f"synthetic_{size}.{fmt}")
+            WRITERS[fmt](path, paragraphs)
+            manifest.append({"path": path, "format": fmt, "target_chars": size, "seed": seed + size,
+                             "bytes": os.path.getsize(path), "planted": planted})
+    with open(os.path.join(output_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def _parse_densities(pairs):
+    densities = dict(DEFAULT_DENSITIES)
+    for pair in pairs or ():
+        kind, _, value = pair.partition("=")
+        if kind not in densities:
+            raise argparse.ArgumentTypeError(f"unknown value kind: {kind}")
+        densities[kind] = float(value)
+    return densities
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m redax_corpus", description="Generate a synthetic redaction corpus.")
+    parser.add_argument("output_dir")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000], help="Approximate characters per document")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=list(FORMATS))
+    parser.add_argument("--density", action="append", metavar="KIND=PER_1000_WORDS",
+                        help=f"Override a density; kinds: {', '.join(DEFAULT_DENSITIES)}")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    manifest = generate_corpus(args.output_dir, args.sizes, args.formats, _parse_densities(args.density), args.seed)
+    for entry in manifest:
+        print(f"{entry['path']}\t{entry['bytes']} bytes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+"""
+Checksum validators and prefilter settings for numeric patterns.
+
+A regex like redact_au_tfn matches any nine digits. A Detector attached to a
+pattern key lets the engine do two things with such matches:
+
+- validator: checked against each match. A match that fails (a TFN whose
+  weighted sum isn't a multiple of 11, a card number that fails Luhn) is
+  not redacted.
+- min_digits: marks the pattern as digit-anchored. The engine scans such
+  patterns only around runs of digits that are at least this long, instead
+  of over the whole text.
+
+Validators take the matched text, separators and prefixes included, and look
+only at its digits.
+"""
+import re
+from collections import namedtuple
+from operator import mul
+
+Detector = namedtuple("Detector", ("validator", "min_digits"))
+
+_TFN_WEIGHTS = (1, 4, 3, 7, 5, 8, 6, 9, 10)
+_TFN_WEIGHTS_8 = (10, 7, 8, 4, 6, 3, 5, 1)
+_ABN_WEIGHTS = (10, 1, 3, 5, 7, 9, 11, 13, 15, 17, 19)
+_MEDICARE_WEIGHTS = (1, 3, 7, 9, 1, 3, 7, 9)
+# Luhn doubles every second digit from the right, subtracting 9 when that gives two digits
+_LUHN_DOUBLED = (0, 2, 4, 6, 8, 1, 3, 5, 7, 9)
+_NON_DIGIT_RE = re.compile(r"\D")
+
+
+def _digits(text):
+    # \D is the complement of the patterns' \d (isdecimal() checks the same set), so non-ASCII digits
+    # validate the same way
+    return list(map(int, text if text.isdecimal() else _NON_DIGIT_RE.sub("", text)))
+
+
+def luhn_valid(text):
+    """Card numbers: 13 to 19 digits passing the Luhn check."""
+    digits = _digits(text)
+    if not 13 <= len(digits) <= 19:
+        return False
+    return (sum(digits[-1::-2]) + sum(map(_LUHN_DOUBLED.__getitem__, digits[-2::-2]))) % 10 == 0
+
+
+def tfn_valid(text):
+    """Tax file numbers: the ATO weighted sum of the 9 (or older 8) digits is a multiple of 11."""
+    digits = _digits(text)
+    weights = _TFN_WEIGHTS if len(digits) == 9 else _TFN_WEIGHTS_8 if len(digits) == 8 else None
+    if weights is None:
+        return False
+    return sum(map(mul, digits, weights)) % 11 == 0
+
+
+def abn_valid(text):
+    """ABNs: subtract 1 from the first digit; the weighted sum of the 11 digits is a multiple of 89."""
+    digits = _digits(text)
+    if len(digits) != 11 or digits[0] == 0:
+        return False
+    digits[0] -= 1
+    return sum(map(mul, digits, _ABN_WEIGHTS)) % 89 == 0
+
+
+def medicare_valid(text):
+    """Medicare numbers: first digit 2-6, the ninth digit is the weighted sum of the first eight mod 10."""
+    digits = _digits(text)
+    if len(digits) not in (10, 11) or not 2 <= digits[0] <= 6:
+        return False
+    return sum(map(mul, digits, _MEDICARE_WEIGHTS)) % 10 == digits[8]
+
+
+# Names a pattern definition (or a pattern pack entry) can use for its validator
+VALIDATORS = {
+    "luhn": luhn_valid,
+    "au_tfn": tfn_valid,
+    "au_abn": abn_valid,
+    "au_medicare": medicare_valid,
+}
@@ -0,0 +1,437 @@
+import re
+from functools import lru_cache
+
+REDACTION_PLACEHOLDER = "[REDACTED]"
+CUSTOM_KEYWORDS_KEY = "custom_keywords"
+KEYWORD_LINE_PLACEHOLDER = "KEYWORD_LINE_REDACTION_PLACEHOLDER"
+CREDENTIAL_LINES_KEY = "redact_credential_lines"
+CREDENTIAL_LINE_PLACEHOLDER = "[REDACTED LINE]"
+
+# A run of digits and the separators numeric patterns allow between them. Digit-anchored
+# patterns (see redax_detectors) are only scanned around these runs.
+_DIGIT_RUN_RE = re.compile(r"\d(?:[\d\s\-./()+]*\d)?")
+# How far before a digit run a digit-anchored match may start, e.g. "Account No: " or "+"
+DIGIT_RUN_LOOKBACK_CHARS = 24
+_WORD_RUN_RE = re.compile(r"\w+")
+# A pattern starting with one of these can't match from inside a run of word characters
+_WORD_START_PREFIXES = ("\\b", "(?<!\\w)")
+
+# Lookarounds at one character of \w or \d: they see a line break the same way as the edge of the text
+_EDGE_SAFE_LOOKAROUND_RE = re.compile(r"\(\?<?[=!]\\[wd]\)")
+
+# Leading global inline flags, e.g. "(?i)". They are folded into a scoped
+# group when a pattern is merged into the combined alternation.
+_LEADING_INLINE_FLAGS_RE = re.compile(r"^\(\?[aiLmsux]+\)")
+_SCOPED_FLAG_LETTERS = ((re.IGNORECASE, "i"), (re.MULTILINE, "m"), (re.DOTALL, "s"), (re.VERBOSE, "x"), (re.ASCII, "a"))
+
+
+def _iter_keyed_patterns(active_patterns_compiled):
+    """Yields (key, compiled_pattern) from either a {key: pattern} dict or a plain list."""
+    if isinstance(active_patterns_compiled, dict):
+        items = active_patterns_compiled.items()
+    else:
+        items = ((f"pattern_{i}", p) for i, p in enumerate(active_patterns_compiled))
+    for key, pattern in items:
+        if isinstance(pattern, str):
+            pattern = re.compile(pattern)
+        # Credential line redaction is handled line by line, never as a regex
+        if pattern.pattern == KEYWORD_LINE_PLACEHOLDER:
+            continue
+        yield key, pattern
+
+
+def _has_top_level_alternation(source):
+    """True if the regex source contains a '|' outside any group or character class."""
+    depth = 0
+    in_class = False
+    i = 0
+    while i < len(source):
+        ch = source[i]
+        if ch == "\\":
+            i += 2
+            continue
+        if in_class:
+            if ch == "]":
+                in_class = False
+        elif ch == "[":
+            in_class = True
+            # A ']' straight after '[' or '[^' is a literal, not the end of the class
+            if source[i + 1:i + 2] == "^":
+                i += 1
+            if source[i + 1:i + 2] == "]":
+                i += 1
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == "|" and depth == 0:
+            return True
+        i += 1
+    return False
+
+
+def _depends_on_text_edges(source):
+    """
+    True if the regex source has an anchor (^, $, \\A, \\Z) or a lookaround that
+    could match differently at the start or end of a text than next to a line
+    break, i.e. once the text is joined to others.
+    """
+    in_class = False
+    i = 0
+    while i < len(source):
+        ch = source[i]
+        if ch == "\\":
+            if not in_class and source[i + 1:i + 2] in ("A", "Z", "z"):
+                return True
+            i += 2
+            continue
+        if in_class:
+            if ch == "]":
+                in_class = False
+        elif ch == "[":
+            in_class = True
+            if source[i + 1:i + 2] == "^":
+                i += 1
+            if source[i + 1:i + 2] == "]":
+                i += 1
+        elif ch in "^$":
+            return True
+        elif source.startswith(("(?=", "(?!", "(?<=", "(?<!"), i) and not _EDGE_SAFE_LOOKAROUND_RE.match(source, i):
+            return True
+        i += 1
+    return False
+
+
+def _starts_at_word_edge(pattern):
+    """True if every match of pattern starts where the previous character isn't a word character, or at a \\b."""
+    source = _LEADING_INLINE_FLAGS_RE.sub("", pattern.pattern)
+    return (source.startswith(_WORD_START_PREFIXES) and not pattern.flags & re.ASCII
+            and not _has_top_level_alternation(source))
+
+
+def _merge_source(pattern):
+    """
+    Returns (leading_boundary, scoped_source) for merging a pattern into the
+    combined alternation, or None if it has to be scanned on its own.
+
+    When the pattern starts with a word boundary that can be hoisted out,
+    leading_boundary is True and scoped_source no longer includes it, so
+    consecutive such patterns can share a single '\\b' check per offset.
+    """
+    # Own groups would clash with the engine's named groups or shift backreference numbers
+    if pattern.groups:
+        return None
+    source = _LEADING_INLINE_FLAGS_RE.sub("", pattern.pattern)
+    flag_letters = "".join(letter for flag, letter in _SCOPED_FLAG_LETTERS if pattern.flags & flag)
+    leading_boundary = (source.startswith("\\b") and not pattern.flags & (re.VERBOSE | re.ASCII)
+                        and not _has_top_level_alternation(source))
+    if leading_boundary:
+        source = source[2:]
+    scoped = f"(?{flag_letters}:{source})" if flag_letters else f"(?:{source})"
+    try:
+        re.compile(scoped)
+    except re.error:
+        return None
+    return leading_boundary, scoped
+
+
+def _join_alternatives(alternatives):
+    """Joins named groups into one alternation, sharing the leading '\\b' of consecutive boundary patterns."""
+    parts = []
+    run = []
+    for _priority, leading_boundary, group_source in alternatives:
+        if leading_boundary:
+            run.append(group_source)
+            continue
+        if run:
+            parts.append(f"\\b(?:{'|'.join(run)})")
+            run = []
+        parts.append(group_source)
+    if run:
+        parts.append(f"\\b(?:{'|'.join(run)})")
+    return "|".join(parts)
+
+
+def _compile_alternation(alternatives):
+    """Returns (compiled alternation, [priority, ...] in order) for (priority, leading_boundary, source) entries."""
+    if not alternatives:
+        return None, []
+    return re.compile(_join_alternatives(alternatives)), [priority for priority, _, _ in alternatives]
+
+
+class CredentialLineMatcher:
+    """
+    Finds every line that mentions one of a set of keywords, case-insensitively.
+
+    The text is lowercased once and each keyword is located with str.find over
+    the whole text, skipping to the next line after a hit. Lines without a
+    keyword are never split out, lowercased or copied on their own.
+    """
+
+    def __init__(self, keywords):
+        keywords = [k for k in dict.fromkeys(k.lower() for k in keywords) if k]
+        # A line containing "client secret" also contains "secret": only the shortest needs searching
+        self.keywords = [k for k in keywords if not any(other != k and other in k for other in keywords)]
+
+    def __bool__(self):
+        return bool(self.keywords)
+
+    def mentioned_in(self, text):
+        """True if text contains any of the keywords."""
+        lowered = text.lower()
+        return any(keyword in lowered for keyword in self.keywords)
+
+    def line_spans(self, text):
+        """Returns (start, end) of each matching line, excluding its line break, in text order."""
+        if not self.keywords:
+            return []
+        lowered = text.lower()
+        if len(lowered) != len(text):
+            # U+0130 is the one character that lowercases to two; fold it to "i" so offsets line up
+            lowered = text.replace("\u0130", "I").lower()
+        line_ends = {}  # line start -> line end
+        for keyword in self.keywords:
+            position = lowered.find(keyword)
+            while position != -1:
+                line_start = lowered.rfind("\n", 0, position) + 1
+                line_end = lowered.find("\n", position + len(keyword))
+                if line_end == -1:
+                    line_end = len(lowered)
+                line_ends[line_start] = line_end
+                position = lowered.find(keyword, line_end + 1) if line_end < len(lowered) else -1
+        return sorted(line_ends.items())
+
+
+class RedactionEngine:
+    """
+    Single-pass matcher for every active pattern and custom keyword.
+
+    All mergeable patterns and the keyword literals are compiled into one
+    named-group alternation, so the text is scanned and copied once instead of
+    once per pattern and once per keyword. Matches that overlap are merged into
+    one span covering all of them: the old sequential sub/replace pipeline
+    redacted each pattern's match in turn, so between them they covered the
+    whole stretch, and picking just one of the overlapping matches would leave
+    the rest of the others visible. A merged span is reported under the key of
+    its first match; when several alternatives match at the same offset, that
+    is the one selected first (patterns before keywords, keywords in the order
+    given), the order the old pipeline applied them in.
+
+    Where this differs from the old pipeline on purpose (tests/test_engine.py
+    checks the rest against it):
+    - Overlapping matches become one [REDACTED], where the old pipeline wrote
+      one per pattern that still matched around the earlier placeholders.
+    - Patterns are matched against the original text, not text that already
+      has placeholders in it: a "+61 ..." right after a redacted number keeps
+      its "+", because (?<!\\w) sees the digit before it rather than a "]".
+    - Matches that fail their validator (see detectors below) are not redacted.
+
+    credential_keywords, if given, builds .credential_lines, a
+    CredentialLineMatcher for whole-line redaction.
+
+    detectors maps pattern keys to redax_detectors.Detector. A match that fails
+    its key's validator is dropped, along with any other match starting among
+    its digits; only the next validated pattern in priority order that
+    matches at the same offset can still claim it. Patterns with min_digits
+    are merged into a second alternation that only runs around runs of digits
+    long enough to hold a match. Matches from the two alternations (and from
+    standalone patterns) are then merged leftmost-first, priority breaking
+    ties.
+    """
+
+    def __init__(self, active_patterns_compiled, custom_keywords_list=(), placeholder=REDACTION_PLACEHOLDER,
+                 credential_keywords=(), detectors=None):
+        self.placeholder = placeholder
+        self.credential_lines = CredentialLineMatcher(credential_keywords)
+        self.keys = []
+        self._standalone = []  # (priority, key, pattern) for patterns that can't be merged
+        self._matchers = []  # (key, pattern) for each pattern and the keyword alternation, for profiling
+        self._validators = {}  # priority -> validator
+        self._word_edge = set()  # priorities of patterns that can't start inside a word
+        alternatives = []  # (priority, leading_boundary, named_group_source) in priority order
+        digit_alternatives = []
+        self._min_digit_run = None
+        detectors = detectors or {}
+
+        for key, pattern in _iter_keyed_patterns(active_patterns_compiled):
+            priority = len(self.keys)
+            self.keys.append(key)
+            self._matchers.append((key, pattern))
+            detector = detectors.get(key)
+            if detector is not None and detector.validator is not None:
+                self._validators[priority] = detector.validator
+            if _starts_at_word_edge(pattern):
+                self._word_edge.add(priority)
+            merged = _merge_source(pattern)
+            if merged is None:
+                print(f"DEBUG: Pattern '{key}' cannot be merged into the combined matcher, scanning it separately.")
+                self._standalone.append((priority, key, pattern))
+            elif detector is not None and detector.min_digits:
+                leading_boundary, scoped = merged
+                digit_alternatives.append((priority, leading_boundary, f"(?P<g{priority}>{scoped})"))
+                self._min_digit_run = min(self._min_digit_run or detector.min_digits, detector.min_digits)
+            else:
+                leading_boundary, scoped = merged
+                alternatives.append((priority, leading_boundary, f"(?P<g{priority}>{scoped})"))
+
+        # dict.fromkeys drops duplicates while keeping first-seen order
+        keywords = [k for k in dict.fromkeys(custom_keywords_list or ()) if k]
+        if keywords:
+            priority = len(self.keys)
+            self.keys.append(CUSTOM_KEYWORDS_KEY)
+            self._matchers.append((CUSTOM_KEYWORDS_KEY, re.compile("|".join(map(re.escape, keywords)))))
+            alternatives.append((priority, False, f"(?P<g{priority}>{'|'.join(map(re.escape, keywords))})"))
+
+        # For re-matching at an offset after a validator rejects: the validated alternatives after the
+        # rejected one, compiled on first use and kept, keyed by (rejected priority, which alternation)
+        self._alternatives = sorted(alternatives + digit_alternatives)
+        self._rest_alternations = {}
+        self._combined, self._order = _compile_alternation(alternatives)
+        self._digit_combined, self._digit_order = _compile_alternation(digit_alternatives)
+        # Keys whose matches a checksum confirms, e.g. for number cells where a bare digit pattern would hit any amount
+        self.validated_keys = frozenset(self.keys[priority] for priority in self._validators)
+        # Texts can only be joined with line breaks and scanned as one if no pattern looks at where a text starts or ends
+        self.edge_sensitive = any(_depends_on_text_edges(pattern.pattern) for _key, pattern in self._matchers)
+
+    def __bool__(self):
+        return bool(self.keys)
+
+    def iter_matchers(self):
+        """Yields (key, compiled pattern) for each pattern and the keywords as separate regexes, e.g. to time them one by one."""
+        return iter(self._matchers)
+
+    def iter_spans(self, text):
+        """Yields non-overlapping (start, end, key) tuples in text order."""
+        keys = self.keys
+        passes = self._passes(text)
+        if not self._standalone and len(passes) <= 1:
+            # A single alternation's matches already come in order of their start
+            candidates = (candidate for scan in passes for candidate in self._scan(text, *scan))
+        else:
+            candidates = []
+            for scan in passes:
+                candidates.extend(self._scan(text, *scan))
+            for priority, _key, pattern in self._standalone:
+                validator = self._validators.get(priority)
+                # Overlapping matches too, as _scan finds them
+                position = 0
+                while position <= len(text):
+                    m = pattern.search(text, position)
+                    if m is None:
+                        break
+                    start, end = m.span()
+                    if start != end and (validator is None or validator(m.group())):
+                        candidates.append((start, priority, end))
+                    position = start + 1
+            # Earliest start first, then the first selected alternative, so a merged span gets the key _scan would give it
+            candidates.sort()
+
+        span_start = span_end = span_priority = None
+        for start, priority, end in candidates:
+            if span_end is not None and start < span_end:
+                span_end = max(span_end, end)
+                continue
+            if span_end is not None:
+                yield span_start, span_end, keys[span_priority]
+            span_start, span_priority, span_end = start, priority, end
+        if span_end is not None:
+            yield span_start, span_end, keys[span_priority]
+
+    def _passes(self, text):
+        """The (alternation, priority order, pos, endpos) scans that together cover every merged pattern."""
+        passes = [(self._combined, self._order, 0, len(text))] if self._combined is not None else []
+        if self._digit_combined is not None:
+            passes.extend((self._digit_combined, self._digit_order, pos, endpos)
+                          for pos, endpos in self._digit_regions(text))
+        return passes
+
+    def _scan(self, text, combined, order, pos, endpos):
+        """
+        Yields (start, priority, end) for the matches of one alternation within
+        text[pos:endpos], validated, in order of their start. Matches starting
+        inside an earlier one are yielded too if they reach past it, so
+        iter_spans can merge them.
+        """
+        # The named groups are the alternation's only groups, numbered in order
+        validators = [self._validators.get(priority) for priority in order]
+        search = combined.search
+        # If no alternative can start inside a word, the next match can't start before the end of the word a match starts on
+        word_run = _WORD_RUN_RE.match if self._word_edge.issuperset(order) else None
+        covered = pos  # end of the furthest match yielded so far
+        while pos <= endpos:
+            m = search(text, pos, endpos)
+            if m is None:
+                return
+            start, end = m.span()
+            word = word_run(text, start) if word_run is not None else None
+            pos = word.end() if word is not None else start + 1
+            if end <= covered:
+                # Inside a match already yielded: redacted either way
+                continue
+            priority = order[m.lastindex - 1]
+            validator = validators[m.lastindex - 1]
+            if validator is not None and not validator(m.group()):
+                # The alternation stops at the first alternative that matches here; try the ones after it
+                fallback = self._match_after(priority, order, text, start, endpos)
+                if fallback is None:
+                    # Rejected as a whole: don't look for other numbers among its digits
+                    pos = max(pos, end)
+                    continue
+                priority, end = fallback
+            if end > start:
+                yield start, priority, end
+                covered = max(covered, end)
+
+    def _match_after(self, rejected, order, text, start, endpos):
+        """
+        (priority, end) of the first validated alternative after rejected in
+        order that matches and validates at start. Patterns without a
+        validator don't get a second try: they would redact the same digits
+        the checksum just cleared, e.g. a failed TFN as an account number.
+        """
+        while True:
+            key = (rejected, id(order))
+            if key not in self._rest_alternations:
+                later = order[order.index(rejected) + 1:]
+                self._rest_alternations[key] = _compile_alternation([a for a in self._alternatives
+                                                                     if a[0] in later and a[0] in self._validators])[0]
+            rest = self._rest_alternations[key]
+            m = rest.match(text, start, endpos) if rest is not None else None
+            if m is None or m.end() == start:
+                return None
+            priority = int(m.lastgroup[1:])
+            if self._validators[priority](m.group()):
+                return priority, m.end()
+            rejected = priority
+
+    def _digit_regions(self, text):
+        """Yields disjoint (pos, endpos) regions around the digit runs long enough for a digit-anchored match."""
+        min_run = self._min_digit_run
+        region_start = region_end = None
+        for m in _DIGIT_RUN_RE.finditer(text):
+            start, end = m.span()
+            if end - start < min_run:
+                continue
+            # One character past the run, so a trailing \b sees what really follows it
+            start, end = max(0, start - DIGIT_RUN_LOOKBACK_CHARS), min(len(text), end + 1)
+            if region_end is not None and start <= region_end:
+                region_end = end
+                continue
+            if region_end is not None:
+                yield region_start, region_end
+            region_start, region_end = start, end
+        if region_end is not None:
+            yield region_start, region_end
+
+
+@lru_cache(maxsize=32)
+def _cached_engine(keyed_patterns, keywords, credential_keywords, detectors):
+    return RedactionEngine(dict(keyed_patterns), keywords, credential_keywords=credential_keywords,
+                           detectors=dict(detectors))
+
+
+def get_redaction_engine(active_patterns_compiled, custom_keywords_list=(), credential_keywords=(), detectors=None):
+    """Returns a compiled engine for this pattern/keyword selection, reusing one built earlier if possible."""
+    keyed_patterns = tuple(_iter_keyed_patterns(active_patterns_compiled))
+    return _cached_engine(keyed_patterns, tuple(custom_keywords_list or ()), tuple(credential_keywords or ()),
+                          tuple(sorted((detectors or {}).items())))
@@ -0,0 +1,198 @@
+"""
+Background redaction jobs for front ends that must never block.
+
+A front end starts a batch and immediately gets a job id back; the batch runs
+on a background executor. The front end then polls for progress:
+
+    manager = JobManager()
+    job_id = manager.start(run, total=len(filepaths))
+    update = manager.poll(job_id, since=0)   # {"status": ..., "results": [...], "next": 3, ...}
+    update = manager.poll(job_id, since=update["next"])
+
+run(on_result, cancel_event) does the work (normally a
+redax_logic.process_documents_batch call) and calls on_result(index, result)
+as each file finishes. Full results (output paths, stage spans, match counts)
+stay here. Polls only carry a short summary of each new result plus a handle,
+and the front end passes that handle back to get_result() when it needs the
+full result, e.g. to save the file.
+"""
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Batches run one at a time: each batch already uses every core for its files
+DEFAULT_MAX_RUNNING_JOBS = 1
+# Finished jobs kept around so their results can still be downloaded
+FINISHED_JOBS_KEPT = 20
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_CANCELLING = "cancelling"
+JOB_DONE = "done"
+JOB_CANCELLED = "cancelled"
+JOB_FAILED = "failed"
+FINISHED_STATES = (JOB_DONE, JOB_CANCELLED, JOB_FAILED)
+
+# Result fields small enough to send to the front end with every poll
+_SUMMARY_FIELDS = ("original_name", "output_format", "error", "cancelled", "cached", "streamed", "saved", "elapsed_seconds",
+                   "matches")
+
+
+class JobError(LookupError):
+    """Unknown (or already forgotten) job id or result handle."""
+
+
+def summarize_result(result):
+    """The front end's view of one file's result: everything but paths and the full profile."""
+    summary = {field: result[field] for field in _SUMMARY_FIELDS if field in result}
+    profile = result.get("profile") or {}
+    summary["profile"] = {"stage_seconds": profile.get("stage_seconds", {})}
+    pattern_seconds = profile.get("pattern_seconds")
+    if pattern_seconds:
+        # Slowest first, as recorded by redax_profile
+        summary["profile"]["pattern_seconds"] = dict(itertools.islice(pattern_seconds.items(), 1))
+    return summary
+
+
+class _Job:
+    __slots__ = ("job_id", "status", "total", "results", "completed", "cancel_event", "error", "started", "finished",
+                 "on_forget")
+
+    def __init__(self, job_id, total, on_forget=None):
+        self.job_id = job_id
+        self.status = JOB_QUEUED
+        self.total = total
+        self.results = {}  # index -> full result
+        self.completed = []  # indexes in the order they finished; poll cursors index into this
+        self.cancel_event = threading.Event()
+        self.error = None
+        self.started = time.time()
+        self.finished = None
+        self.on_forget = on_forget
+
+
+class JobManager:
+    """Runs batches in the background and answers polls about them; safe to call from any thread."""
+
+    def __init__(self, max_running_jobs=DEFAULT_MAX_RUNNING_JOBS, finished_jobs_kept=FINISHED_JOBS_KEPT):
+        self._executor = ThreadPoolExecutor(max_workers=max_running_jobs, thread_name_prefix="redax-job")
+        self._finished_jobs_kept = finished_jobs_kept
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def start(self, run, total, on_forget=None):
+        """
+        Queues run(on_result, cancel_event) and returns its job id without waiting.
+
+        on_forget() is called once the finished job is dropped from the history,
+        e.g. to remove its outputs.
+        """
+        with self._lock:
+            job = _Job(f"job-{next(self._ids)}", total, on_forget)
+            self._jobs[job.job_id] = job
+            forgotten = self._forget_old_jobs()
+        for old_job in forgotten:
+            if old_job.on_forget is not None:
+                old_job.on_forget()
+        self._executor.submit(self._run, job, run)
+        print(f"DEBUG: Started {job.job_id} with {total} file(s)")
+        return job.job_id
+
+    def _run(self, job, run):
+        with self._lock:
+            if job.cancel_event.is_set():
+                self._finish(job, JOB_CANCELLED)
+                return
+            job.status = JOB_RUNNING
+
+        def on_result(index, result):
+            with self._lock:
+                if index not in job.results:
+                    job.completed.append(index)
+                job.results[index] = result
+
+        try:
+            results = run(on_result, job.cancel_event)
+            # Results the batch didn't report one by one (e.g. an up-front failure)
+            for index, result in enumerate(results or ()):
+                if result is not None and index not in job.results:
+                    on_result(index, result)
+        except Exception as e:
+            print(f"DEBUG: {job.job_id} failed: {e}")
+            with self._lock:
+                job.error = str(e)
+                self._finish(job, JOB_FAILED)
+            return
+        with self._lock:
+            self._finish(job, JOB_CANCELLED if job.cancel_event.is_set() else JOB_DONE)
+
+    def _finish(self, job, status):
+        job.status = status
+        job.finished = time.time()
+        print(f"DEBUG: {job.job_id} {status}: {len(job.completed)}/{job.total} file(s)")
+
+    def _forget_old_jobs(self):
+        finished = [job for job in self._jobs.values() if job.status in FINISHED_STATES]
+        forgotten = sorted(finished, key=lambda job: job.finished)[:max(0, len(finished) - self._finished_jobs_kept)]
+        for job in forgotten:
+            del self._jobs[job.job_id]
+        return forgotten
+
+    def _job(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is None:
+            raise JobError(f"Unknown job: {job_id}")
+        return job
+
+    def poll(self, job_id, since=0):
+        """
+        Status of a job and the summaries of the results finished since the last poll.
+
+        Pass the "next" value of the previous poll as since; each result summary
+        carries its "index" in the batch and a "handle" for get_result().
+        """
+        with self._lock:
+            job = self._job(job_id)
+            new_indexes = job.completed[since:]
+            results = [dict(summarize_result(job.results[index]), index=index, handle=f"{job_id}/{index}")
+                       for index in new_indexes]
+            return {
+                "job_id": job_id,
+                "status": job.status,
+                "finished": job.status in FINISHED_STATES,
+                "completed": len(job.completed),
+                "total": job.total,
+                "results": results,
+                "next": since + len(new_indexes),
+                "error": job.error,
+                "elapsed_seconds": round((job.finished or time.time()) - job.started, 3),
+            }
+
+    def cancel(self, job_id):
+        """Stops a job: files not started yet are skipped, files already running finish."""
+        with self._lock:
+            job = self._job(job_id)
+            if job.status in FINISHED_STATES:
+                return False
+            job.cancel_event.set()
+            if job.status == JOB_RUNNING:
+                job.status = JOB_CANCELLING
+            return True
+
+    def get_result(self, handle):
+        """The full result behind a handle from poll()."""
+        job_id, _, index = handle.rpartition("/")
+        with self._lock:
+            try:
+                return self._job(job_id).results[int(index)]
+            except (KeyError, ValueError):
+                raise JobError(f"Unknown result: {handle}") from None
+
+    def shutdown(self):
+        """Cancels every job and waits for the running one to stop."""
+        with self._lock:
+            for job in self._jobs.values():
+                job.cancel_event.set()
+        self._executor.shutdown(wait=True)
@@ -1,13 +1,36 @@
+import functools
+import io
 import os
+import time
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
-import pypandoc # pypandoc will use the PANDOC_PATH set by the main app
-import shutil
-from docx import Document as DocxDocument
-# from openpyxl import load_workbook # Add back if handling xlsx
-# from pptx import Presentation     # Add back if handling pptx
+try:
+    from striprtf.striprtf import rtf_to_text
+except ImportError:  # RTF then goes through pandoc
+    rtf_to_text = None
 
+from redax_engine import CREDENTIAL_LINE_PLACEHOLDER, CREDENTIAL_LINES_KEY, get_redaction_engine
+from redax_ooxml import pptx_to_markdown, redact_docx, redact_pptx, redact_xlsx, xlsx_to_markdown
+from redax_patterns import default_registry
+from redax_pdf import get_pdf_engine, resolve_pdf_engine_name, warm_pdf_engine
+from redax_profile import DocumentProfile, default_profile_log
+from redax_spans import SpanIndex, apply_spans, span_report_path
+from redax_workspace import default_workspaces, partial_path_for, remove_quietly
+# The converter runs pypandoc, which uses the PANDOC_PATH set by the main app
+from redax_convert import get_conversion_backend
 
-TEMP_DIR_NAME = "redax_processing_temp_webview" # Unique temp dir
+
+# Most of the per-file time is spent waiting on pandoc subprocesses, so threads scale with cores
+DEFAULT_MAX_WORKERS = os.cpu_count() or 1
+CANCEL_POLL_INTERVAL_SECONDS = 0.2
+
+# .md/.txt files at least this big are redacted in chunks instead of being read whole
+STREAMING_THRESHOLD_BYTES = 32 * 1024 * 1024
+STREAM_CHUNK_CHARS = 1024 * 1024
+# Text this close to the end of a chunk is held back and scanned again with the next
+# chunk, so a match straddling the boundary is still seen whole
+STREAM_OVERLAP_CHARS = 4096
 
 CREDENTIAL_KEYWORDS = [
     "password", "pwd", "secret", "username", "user name", "login", "user id",
@@ -15,96 +38,431 @@ CREDENTIAL_KEYWORDS = [
     "client secret", "token", "auth key", "private key", "secret key", "access key"
 ]
 
-def ensure_temp_dir():
-    if not os.path.exists(TEMP_DIR_NAME):
-        os.makedirs(TEMP_DIR_NAME)
+# {key: regex source} for every registered pattern; see redax_patterns for the definitions
+REDACTION_PATTERNS_PYTHON = default_registry().sources()
+
+SUPPORTED_EXTENSIONS = (".docx", ".md", ".txt", ".rtf", ".xlsx", ".pptx")
+# Only a file of the same type can be written in these formats
+SPREADSHEET_PRESENTATION_FORMATS = ("xlsx", "pptx")
+# Output format that keeps each file in its own format where it can be redacted in place
+ORIGINAL_OUTPUT_FORMAT = "original"
+
+def compile_redaction_patterns(selected_pattern_keys):
+    """Compiled {key: pattern} for the selected pattern keys; cached per selection by the pattern registry."""
+    return default_registry().compile(selected_pattern_keys)
 
 def cleanup_temp_dir():
-    if os.path.exists(TEMP_DIR_NAME):
-        try:
-            shutil.rmtree(TEMP_DIR_NAME)
-            print(f"INFO: Cleaned up temp directory: {TEMP_DIR_NAME}")
-        except Exception as e:
-            print(f"ERROR: Could not remove temp directory {TEMP_DIR_NAME}: {e}")
+    """Removes the scratch workspaces of this process (see redax_workspace)."""
+    try:
+        default_workspaces().cleanup()
+    except Exception as e:
+        print(f"ERROR: Could not remove workspaces under {default_workspaces().root}: {e}")
+
 
+def _get_engine(active_patterns_compiled, custom_keywords_list, credential_keywords=()):
+    """
+    The redaction engine, with CREDENTIAL_KEYWORDS plus any user credential_keywords for whole-line
+    redaction, and the registry's checksum validators and digit prefilters for the active patterns.
+    """
+    detectors = default_registry().detectors(active_patterns_compiled) if isinstance(active_patterns_compiled, dict) else None
+    return get_redaction_engine(active_patterns_compiled, custom_keywords_list,
+                                credential_keywords=[*CREDENTIAL_KEYWORDS, *(credential_keywords or ())],
+                                detectors=detectors)
 
-def _redact_text_content_logic(text, active_patterns_compiled, custom_keywords_list, redact_credential_lines_enabled=False):
-    processed_text_intermediate = str(text)
+def _apply_redaction(text, engine, redact_credential_lines_enabled=False, match_counts=None, span_index=None):
+    """Redacts text in one pass over its span index (see redax_spans), recording every span in span_index if given."""
+    text = str(text)
+    # One combined scan for every pattern and keyword, one for every credential keyword; then one rewrite
+    return apply_spans(text, _keyed_redaction_spans(text, engine, redact_credential_lines_enabled), match_counts, span_index)
 
+def _keyed_redaction_spans(text, engine, redact_credential_lines_enabled=False):
+    """Returns the sorted, non-overlapping (start, end, replacement, key) spans to redact in text."""
+    pattern_spans = [(start, end, engine.placeholder, key) for start, end, key in engine.iter_spans(text)]
+    line_spans = []
     if redact_credential_lines_enabled:
-        lines = processed_text_intermediate.splitlines()
-        new_lines = []
-        for line in lines:
-            if any(keyword.lower() in line.lower() for keyword in CREDENTIAL_KEYWORDS):
-                new_lines.append("[REDACTED LINE]")
-            else:
-                new_lines.append(line)
-        processed_text_intermediate = "\n".join(new_lines)
+        line_spans = [(start, end, CREDENTIAL_LINE_PLACEHOLDER, CREDENTIAL_LINES_KEY)
+                      for start, end in engine.credential_lines.line_spans(text)]
+    if not line_spans:
+        return pattern_spans
 
-    redacted_text = processed_text_intermediate
-    for pattern_regex in active_patterns_compiled:
-        # Skip placeholder for credential line redaction if it was somehow compiled (it shouldn't be)
-        if pattern_regex.pattern == "KEYWORD_LINE_REDACTION_PLACEHOLDER":
+    # A redacted line swallows any pattern matches that touch it
+    kept = []
+    line_index = 0
+    for span in pattern_spans:
+        while line_index < len(line_spans) and line_spans[line_index][1] <= span[0]:
+            line_index += 1
+        if line_index < len(line_spans) and line_spans[line_index][0] < span[1]:
             continue
-        redacted_text = pattern_regex.sub("[REDACTED]", redacted_text)
-    for keyword in custom_keywords_list:
-        if keyword:
-            redacted_text = redacted_text.replace(keyword, "[REDACTED]")
-    return redacted_text
-
-def process_document_for_redaction(original_filepath, active_patterns_compiled, custom_keywords_list, output_format="md", redact_credential_lines_enabled=False):
-    ensure_temp_dir()
-    original_filename = os.path.basename(original_filepath)
-    base_name, file_ext = os.path.splitext(original_filename)
-    file_ext = file_ext.lower()
+        kept.append(span)
+    return sorted(kept + line_spans)
+
+def _redaction_spans(text, engine, redact_credential_lines_enabled=False, match_counts=None, span_index=None, keys=None):
+    """
+    Returns the sorted, non-overlapping (start, end, replacement) spans to redact in text, as a new segment of span_index.
+    With keys, only spans of those pattern keys.
+    """
+    spans = []
+    segment = span_index.new_segment() if span_index is not None else 0
+    for start, end, replacement, key in _keyed_redaction_spans(text, engine, redact_credential_lines_enabled):
+        if keys is not None and key not in keys:
+            continue
+        if span_index is not None:
+            replacement = span_index.record(text, start, end, replacement, key, segment)
+        spans.append((start, end, replacement))
+        if match_counts is not None:
+            match_counts[key] = match_counts.get(key, 0) + 1
+    return spans
+
+def _long_line_mentions_credentials(source, line_start, matcher, chunk_chars):
+    """
+    Whether the line that begins with line_start (no line break in it yet)
+    mentions a credential keyword. Reads source on to the end of the line and
+    rewinds it; None if source can't be rewound.
+    """
+    if matcher.mentioned_in(line_start):
+        return True
+    if not source.seekable():
+        return None
+    # Enough of what came before each read to catch a keyword split across two
+    keep = max(map(len, matcher.keywords)) - 1
+    tail = line_start[len(line_start) - keep:]
+    position = source.tell()
+    try:
+        while True:
+            chunk = source.read(chunk_chars)
+            if not chunk:
+                return False
+            line_end = chunk.find("\n")
+            piece = tail + (chunk if line_end == -1 else chunk[:line_end])
+            if matcher.mentioned_in(piece):
+                return True
+            if line_end != -1:
+                return False
+            tail = piece[len(piece) - keep:]
+    finally:
+        source.seek(position)
+
+def redact_text_stream(source, destination, engine, redact_credential_lines_enabled=False, match_counts=None,
+                       chunk_chars=STREAM_CHUNK_CHARS, overlap_chars=STREAM_OVERLAP_CHARS, span_index=None):
+    """
+    Redacts text from one file object into another, holding about chunk_chars + overlap_chars in memory.
+
+    Each round commits text up to the last line break before the overlap
+    window, so credential lines are judged whole. A line too long for that is
+    committed in pieces, cut at a space; with credential lines on it is first
+    read to its end (source is rewound, so it must be seekable, or the line is
+    held in memory whole) and a credential line is dropped to its end, leaving
+    one placeholder. Returns the number of characters written. span_index gets
+    a single segment with offsets into the whole source text.
+    """
+    matcher = engine.credential_lines if redact_credential_lines_enabled and engine.credential_lines else None
+    buffer = ""
+    written = 0
+    consumed = 0  # source characters before the start of buffer
+    segment = span_index.new_segment() if span_index is not None else 0
+    # Inside a line too long for one round: None, "clean" once judged free of credential keywords, or
+    # "credential" while the rest of a credential line is dropped
+    long_line = None
+    line_hash = line_start = None
+    while True:
+        chunk = source.read(chunk_chars)
+        at_end = not chunk
+        buffer += chunk
+        if long_line == "credential":
+            line_end = buffer.find("\n")
+            dropped = len(buffer) if line_end == -1 else line_end
+            if line_hash is not None:
+                line_hash.update(buffer[:dropped])
+            consumed += dropped
+            buffer = buffer[dropped:]
+            if line_end == -1 and not at_end:
+                continue
+            long_line = None
+            if span_index is not None:
+                span_index.record_hashed(line_hash.value(), line_start, consumed, CREDENTIAL_LINE_PLACEHOLDER,
+                                         CREDENTIAL_LINES_KEY, segment)
+        if not buffer:
+            if at_end:
+                break
+            continue
+        if at_end:
+            cut = len(buffer)
+        elif len(buffer) <= overlap_chars:
+            continue
+        else:
+            limit = len(buffer) - overlap_chars
+            cut = buffer.rfind("\n", 0, limit) + 1
+            if cut:
+                long_line = None
+            elif matcher is not None and long_line is None and "\n" in buffer:
+                # The line ends in the overlap window: it is all here, so judge it now
+                cut = buffer.find("\n", limit) + 1
+            else:
+                # One very long line
+                if matcher is not None and long_line is None:
+                    # Not one piece of it can be written before the whole line has been judged
+                    mentions = _long_line_mentions_credentials(source, buffer, matcher, chunk_chars)
+                    if mentions is None:
+                        continue  # can't look ahead: read on until the line ends
+                    if mentions:
+                        destination.write(CREDENTIAL_LINE_PLACEHOLDER)
+                        written += len(CREDENTIAL_LINE_PLACEHOLDER)
+                        if match_counts is not None:
+                            match_counts[CREDENTIAL_LINES_KEY] = match_counts.get(CREDENTIAL_LINES_KEY, 0) + 1
+                        # Dropped from the next round on, up to its line break
+                        long_line, line_start = "credential", consumed
+                        line_hash = span_index.hasher() if span_index is not None else None
+                        continue
+                long_line = "clean"
+                # At least don't split a word
+                cut = max(buffer.rfind(" ", 0, limit), buffer.rfind("\t", 0, limit)) + 1 or limit
+
+        pieces = []
+        position = 0
+        for start, end, replacement, key in _keyed_redaction_spans(buffer, engine, redact_credential_lines_enabled):
+            if start >= cut:
+                # Scanned again, with more context, in the next round
+                break
+            pieces.append(buffer[position:start])
+            if span_index is not None:
+                replacement = span_index.record(buffer, start, end, replacement, key, segment, consumed)
+            pieces.append(replacement)
+            position = end
+            cut = max(cut, end)
+            if match_counts is not None:
+                match_counts[key] = match_counts.get(key, 0) + 1
+        pieces.append(buffer[position:cut])
+        redacted = "".join(pieces)
+        destination.write(redacted)
+        written += len(redacted)
+        consumed += cut
+        buffer = buffer[cut:]
+        if at_end:
+            break
+    return written
+
+def _convert_output(converter, source, from_format, output_format, output_path, profile, pdf_engine=None, source_is_file=False):
+    """Has pandoc write source (a path if source_is_file) as output_format; PDFs go through pdf_engine (see redax_pdf)."""
+    if output_format == "pdf":
+        engine = get_pdf_engine(pdf_engine)
+        with profile.span("convert", backend=converter.name, pdf_engine=engine.name):
+            engine.convert(converter, source, from_format, output_path, source_is_file)
+        return
+    to, extra_args = output_format, ['--standalone']
+    if output_format == "md" and from_format == "docx":
+        to, extra_args = 'markdown_strict', extra_args + ['--wrap=none']
+    convert = converter.convert_file if source_is_file else converter.convert_text
+    # pandoc writes the output file itself, so writing is part of this stage
+    with profile.span("convert", backend=converter.name):
+        convert(source, to, from_format, outputfile=output_path, extra_args=extra_args)
+
+def _redact_large_text_file(original_filepath, final_output_path, output_format, engine, converter,
+                            redact_credential_lines_enabled=False, match_counts=None, profile=None, span_index=None,
+                            pdf_engine=None):
+    """
+    Streams a large .md/.txt file through the engine straight to disk.
+
+    Markdown output is the redacted text itself (there is no point asking pandoc
+    to re-read gigabytes of markdown). Other formats are converted by pandoc from
+    the redacted file, which is then removed.
+    """
+    profile = profile or DocumentProfile()
+    redacted_path = final_output_path if output_format == "md" else f"{final_output_path}.redacted.md"
+    # Reading, redacting and writing are interleaved chunk by chunk, so they share one span
+    with profile.span("redact", streamed=True), \
+            open(original_filepath, "r", encoding="utf-8", errors='ignore') as src, \
+            open(redacted_path, "w", encoding="utf-8") as dst:
+        redact_text_stream(src, dst, engine, redact_credential_lines_enabled, match_counts, span_index=span_index)
+    if output_format == "md":
+        return
+    try:
+        _convert_output(converter, redacted_path, 'markdown', output_format, final_output_path, profile, pdf_engine,
+                        source_is_file=True)
+    finally:
+        os.remove(redacted_path)
+
+def _redact_spreadsheet_or_presentation(original_filepath, final_output_path, file_ext, output_format, converter,
+                                        redact_spans, profile, pdf_engine=None, redact_number_spans=None):
+    """
+    Redacts a .xlsx or .pptx. Into its own format the package is rewritten
+    directly; for anything else the redacted package's text is extracted as
+    Markdown (sheets and slide tables as tables), which pandoc can't do itself.
+    """
+    if file_ext == ".xlsx":
+        redact_package = functools.partial(redact_xlsx, redact_number_spans=redact_number_spans)
+        to_markdown = xlsx_to_markdown
+    else:
+        redact_package, to_markdown = redact_pptx, pptx_to_markdown
+    if output_format == file_ext[1:]:
+        with profile.span("redact", streamed=True):
+            redact_package(original_filepath, final_output_path, redact_spans)
+        return
+    # Redacted on disk rather than in memory: a workbook can be far bigger than its text
+    package_path = f"{final_output_path}.redacted{file_ext}"
+    markdown_path = final_output_path if output_format == "md" else f"{final_output_path}.redacted.md"
+    try:
+        with profile.span("redact", streamed=True):
+            redact_package(original_filepath, package_path, redact_spans)
+        with profile.span("extract"):
+            with open(markdown_path, "w", encoding="utf-8") as markdown_file:
+                to_markdown(package_path, markdown_file.write)
+        if output_format != "md":
+            _convert_output(converter, markdown_path, 'markdown', output_format, final_output_path, profile, pdf_engine,
+                            source_is_file=True)
+    finally:
+        for path in (package_path, markdown_path):
+            if path != final_output_path and os.path.exists(path):
+                os.remove(path)
+
+def _redact_text_content_logic(text, active_patterns_compiled, custom_keywords_list, redact_credential_lines_enabled=False,
+                               credential_keywords=()):
+    engine = _get_engine(active_patterns_compiled, custom_keywords_list, credential_keywords)
+    return _apply_redaction(text, engine, redact_credential_lines_enabled)
+
+def resolve_output_format(original_filepath, output_format):
+    """The concrete format for one file: "original" keeps .docx/.xlsx/.pptx as they are and writes Markdown for the rest."""
+    if output_format != ORIGINAL_OUTPUT_FORMAT:
+        return output_format
+    file_ext = os.path.splitext(original_filepath)[1].lower()[1:]
+    return file_ext if file_ext in ("docx",) + SPREADSHEET_PRESENTATION_FORMATS else "md"
+
+def _output_path_for(original_filepath, output_format, output_dir):
+    base_name = os.path.splitext(os.path.basename(original_filepath))[0]
+    return os.path.join(output_dir, f"{base_name}_redacted.{output_format}")
 
-    output_filename_in_temp = f"{base_name}_redacted.{output_format}"
-    final_output_path_in_temp = os.path.join(TEMP_DIR_NAME, output_filename_in_temp)
+def process_document_for_redaction(original_filepath, active_patterns_compiled, custom_keywords_list, output_format="md", redact_credential_lines_enabled=False, output_dir=None,
+                                   credential_keywords=(), profile=None, span_report=None, pseudonymize=False, pdf_engine=None):
+    """
+    Redacts one document into output_format and returns its result dict.
+
+    result["profile"] holds the time spent per stage (see redax_profile); pass a
+    DocumentProfile with pattern_timing=True to also time each pattern.
+
+    span_report ("json" or "csv") writes the document's span index next to the
+    output (result["span_report_path"]). pseudonymize replaces each match with a
+    token derived from its value instead of [REDACTED] (see redax_spans).
+    pdf_engine picks how PDF output is rendered (see redax_pdf).
+    """
+    profile = profile or DocumentProfile()
+    span_index = SpanIndex(pseudonymize) if span_report or pseudonymize else None
+    output_format = resolve_output_format(original_filepath, output_format)
+    # Straight to the caller's destination if given, otherwise to a fresh scratch directory
+    output_dir = output_dir or default_workspaces().scratch_dir()
+    output_path = _output_path_for(original_filepath, output_format, output_dir)
+    # Everything is written under a partial name and renamed into place once complete
+    partial_path = partial_path_for(output_path)
+    try:
+        os.makedirs(output_dir, exist_ok=True)  # exist_ok: several workers may get here at the same time
+        result = _redact_document(original_filepath, active_patterns_compiled, custom_keywords_list, output_format,
+                                  redact_credential_lines_enabled, partial_path, credential_keywords, profile, span_index,
+                                  pdf_engine)
+        if "error" not in result and span_report:
+            # Before the output is put in place: an output whose requested report is missing counts as failed
+            report_path = span_report_path(output_path, span_report)
+            with profile.span("span_report", spans=len(span_index)):
+                span_index.write(report_path, span_report)
+            result["span_report_path"] = report_path
+        if "error" not in result:
+            os.replace(partial_path, output_path)
+            result["output_path"] = output_path
+    except OSError as e:
+        print(f"Error writing output for {original_filepath}: {e}")
+        result = {"error": f"Could not write output for {os.path.basename(original_filepath)}: {e}"}
+    finally:
+        remove_quietly(partial_path)
+    result["profile"] = profile.to_dict()
+    return result
+
+def _redact_document(original_filepath, active_patterns_compiled, custom_keywords_list, output_format,
+                     redact_credential_lines_enabled, output_path, credential_keywords, profile, span_index=None,
+                     pdf_engine=None):
+    original_filename = os.path.basename(original_filepath)
+    file_ext = os.path.splitext(original_filename)[1].lower()
+    match_counts = {}
 
-    temp_input_for_pandoc = None
+    docx_bytes_for_pandoc = None
     content_for_pandoc = None
 
     try:
+        # Compiled once per document, not once per paragraph
+        engine = _get_engine(active_patterns_compiled, custom_keywords_list, credential_keywords)
+        converter = get_conversion_backend()
+        # Office packages stream every text-bearing XML part and rewrite only the runs a
+        # match touches, so formatting survives
+        def redact_spans(text):
+            profile.time_patterns(text, engine, redact_credential_lines_enabled)
+            return _redaction_spans(text, engine, redact_credential_lines_enabled, match_counts, span_index)
+
+        # Worksheet number cells: dates and amounts are numbers too, so only checksum-confirmed patterns
+        def redact_number_spans(text):
+            profile.time_patterns(text, engine, False)
+            return _redaction_spans(text, engine, False, match_counts, span_index, keys=engine.validated_keys)
+
+        if output_format in SPREADSHEET_PRESENTATION_FORMATS and file_ext != f".{output_format}":
+            return {"error": f"{original_filename} can't be saved as .{output_format}; only .{output_format} files can."}
         if file_ext == ".docx":
-            doc = DocxDocument(original_filepath)
-            for para in doc.paragraphs:
-                para.text = _redact_text_content_logic(para.text, active_patterns_compiled, custom_keywords_list, redact_credential_lines_enabled)
-            # Add table redaction etc. if needed
-            # TODO: Consider tables, headers, footers for DOCX if keyword line redaction is enabled
-            temp_input_for_pandoc = os.path.join(TEMP_DIR_NAME, f"temp_{original_filename}")
-            doc.save(temp_input_for_pandoc)
+            # Body, tables, headers, footers, footnotes and comments
+            if output_format == "docx":
+                # A sanitized Word file is all that's wanted: write it directly, no pandoc round trip
+                with profile.span("redact", streamed=True):
+                    redact_docx(original_filepath, output_path, redact_spans)
+                return {"original_name": original_filename, "output_path": output_path, "output_format": output_format, "matches": match_counts}
+            # Keep the redacted document in memory and pipe it straight to the converter
+            docx_buffer = io.BytesIO()
+            with profile.span("redact", streamed=True):
+                redact_docx(original_filepath, docx_buffer, redact_spans)
+            docx_bytes_for_pandoc = docx_buffer.getvalue()
         elif file_ext in [".md", ".txt"]:
-            with open(original_filepath, "r", encoding="utf-8", errors='ignore') as f:
-                content = f.read()
-            content_for_pandoc = _redact_text_content_logic(content, active_patterns_compiled, custom_keywords_list, redact_credential_lines_enabled)
+            if os.path.getsize(original_filepath) >= STREAMING_THRESHOLD_BYTES:
+                # Too big to hold in memory (several times over, once redacted and joined)
+                _redact_large_text_file(original_filepath, output_path, output_format, engine, converter,
+                                        redact_credential_lines_enabled, match_counts, profile, span_index, pdf_engine)
+                return {"original_name": original_filename, "output_path": output_path, "output_format": output_format, "matches": match_counts, "streamed": True}
+            with profile.span("load"):
+                with open(original_filepath, "r", encoding="utf-8", errors='ignore') as f:
+                    content = f.read()
+            profile.time_patterns(content, engine, redact_credential_lines_enabled)
+            with profile.span("redact", chars=len(content)):
+                content_for_pandoc = _apply_redaction(content, engine, redact_credential_lines_enabled, match_counts, span_index)
         elif file_ext == ".rtf":
             # For RTF, convert to MD first, then redact the MD content
-            md_content = pypandoc.convert_file(original_filepath, 'markdown_strict', format='rtf', extra_args=['--wrap=none'])
-            content_for_pandoc = _redact_text_content_logic(md_content, active_patterns_compiled, custom_keywords_list, redact_credential_lines_enabled)
-        # Add other file types (xlsx, pptx) similarly, preparing either temp_input_for_pandoc or content_for_pandoc
-        # For xlsx/pptx, you might copy to temp_input_for_pandoc and let Pandoc extract text if direct redaction is too complex.
+            md_content = None
+            if output_format == "md" and rtf_to_text is not None:
+                # Nothing else needs pandoc, so take the text out in-process rather than start it for this
+                with profile.span("load", backend="striprtf"):
+                    # RTF is 7-bit; latin-1 reads any stray byte, striprtf decodes the escapes
+                    with open(original_filepath, "r", encoding="latin-1") as f:
+                        rtf_source = f.read()
+                    try:
+                        md_content = rtf_to_text(rtf_source, errors="ignore")
+                    except Exception as e:
+                        print(f"DEBUG: striprtf could not read {original_filename}, using pandoc: {e}")
+            if md_content is None:
+                with profile.span("load", backend=converter.name):
+                    md_content = converter.convert_file(original_filepath, 'markdown_strict', 'rtf', extra_args=['--wrap=none'])
+            profile.time_patterns(md_content, engine, redact_credential_lines_enabled)
+            with profile.span("redact", chars=len(md_content)):
+                content_for_pandoc = _apply_redaction(md_content, engine, redact_credential_lines_enabled, match_counts, span_index)
+        elif file_ext in (".xlsx", ".pptx"):
+            _redact_spreadsheet_or_presentation(original_filepath, output_path, file_ext, output_format,
+                                                converter, redact_spans, profile, pdf_engine, redact_number_spans)
+            return {"original_name": original_filename, "output_path": output_path, "output_format": output_format, "matches": match_counts, "streamed": True}
         else:
             return {"error": f"Unsupported file type: {original_filename}"}
 
-        pandoc_extra_args = ['--standalone']
-        if output_format == 'pdf':
-            pandoc_extra_args.append('--toc')
-
-        if temp_input_for_pandoc:
-            if output_format == "md":
-                pypandoc.convert_file(temp_input_for_pandoc, 'markdown_strict', format=file_ext.lstrip('.'),
-                                      outputfile=final_output_path_in_temp, extra_args=pandoc_extra_args + ['--wrap=none'])
-            elif output_format == "pdf":
-                pypandoc.convert_file(temp_input_for_pandoc, 'pdf', format=file_ext.lstrip('.'),
-                                      outputfile=final_output_path_in_temp, extra_args=pandoc_extra_args)
-            os.remove(temp_input_for_pandoc)
+        if docx_bytes_for_pandoc:
+            _convert_output(converter, docx_bytes_for_pandoc, 'docx', output_format, output_path, profile, pdf_engine)
+        elif content_for_pandoc and output_format == "md":
+            # Already the output: pandoc would only re-read it and reformat the user's Markdown
+            with profile.span("write", chars=len(content_for_pandoc)):
+                with open(output_path, "w", encoding="utf-8") as f:
+                    f.write(content_for_pandoc)
         elif content_for_pandoc:
-            pypandoc.convert_text(content_for_pandoc, output_format, format='markdown',
-                                  outputfile=final_output_path_in_temp, extra_args=pandoc_extra_args)
+            _convert_output(converter, content_for_pandoc, 'markdown', output_format, output_path, profile, pdf_engine)
         else:
             return {"error": f"No content to process for {original_filename}"}
 
-        return {"original_name": original_filename, "output_path": final_output_path_in_temp, "output_format": output_format}
+        return {"original_name": original_filename, "output_path": output_path, "output_format": output_format, "matches": match_counts}
 
     except OSError as e_pandoc_os_error: # MODIFIED to catch OSError for Pandoc issues
         # Check if the error message indicates Pandoc is missing or not executable
@@ -119,3 +477,151 @@ def process_document_for_redaction(original_filepath, active_patterns_compiled,
     except Exception as e: # General catch-all for other errors
         print(f"Error processing {original_filename}: {e}")
         return {"error": f"Error processing {original_filename}: {str(e)}"}
+
+def _process_document_timed(original_filepath, active_patterns_compiled, custom_keywords_list, output_format="md",
+                            redact_credential_lines_enabled=False, output_dir=None, cache=None, credential_keywords=(),
+                            profile_patterns=False, span_report=None, pseudonymize=False, pdf_engine=None):
+    # Module level so process pools can pickle it
+    started = time.perf_counter()
+    profile = DocumentProfile(pattern_timing=profile_patterns)
+    output_format = resolve_output_format(original_filepath, output_format)
+    output_dir = output_dir or default_workspaces().scratch_dir()
+    if output_format == "pdf":
+        # "auto" becomes a concrete engine here so the cache key says which one made the PDF
+        pdf_engine = resolve_pdf_engine_name(pdf_engine)
+    result = None
+    cache_key = None
+    # A cache entry is the output file alone, so runs that also want a span report always redact
+    if cache is not None and not span_report:
+        with profile.span("cache"):
+            try:
+                cache_key = cache.key_for(original_filepath, active_patterns_compiled, custom_keywords_list,
+                                          redact_credential_lines_enabled, output_format, credential_keywords, pseudonymize,
+                                          pdf_engine)
+            except OSError as e:
+                # Unreadable input; processing will report it properly
+                print(f"DEBUG: Could not hash {original_filepath} for the result cache: {e}")
+            if cache_key is not None:
+                output_path = _output_path_for(original_filepath, output_format, output_dir)
+                metadata = cache.get(cache_key, output_path)
+                if metadata is not None:
+                    print(f"DEBUG: Result cache hit for {original_filepath}")
+                    result = dict(metadata, original_name=os.path.basename(original_filepath), output_path=output_path, cached=True)
+        if result is not None:
+            result["profile"] = profile.to_dict()
+    if result is None:
+        result = process_document_for_redaction(original_filepath, active_patterns_compiled, custom_keywords_list,
+                                                output_format, redact_credential_lines_enabled, output_dir, credential_keywords,
+                                                profile, span_report, pseudonymize, pdf_engine)
+        if cache_key is not None and "error" not in result:
+            metadata = {key: value for key, value in result.items()
+                        if key not in ("original_name", "output_path", "profile", "span_report_path")}
+            cache.put(cache_key, result["output_path"], metadata)
+    result["elapsed_seconds"] = round(time.perf_counter() - started, 4)
+    return result
+
+def process_documents_batch(filepaths, active_patterns_compiled, custom_keywords_list, output_format="md",
+                            redact_credential_lines_enabled=False, max_workers=None, executor_kind="thread",
+                            on_result=None, cancel_event=None, output_dirs=None, cache=None, credential_keywords=(),
+                            profile_patterns=False, profile_log=None, workspace=None, span_report=None, pseudonymize=False,
+                            pdf_engine=None):
+    """
+    Redacts several documents concurrently and returns their results in input order.
+
+    output_dirs optionally gives a destination directory per file (same order
+    as filepaths). Otherwise every file gets its own directory in workspace (a
+    redax_workspace.Workspace, by default a new one for this batch), and the
+    outputs count towards the workspace quota. Two files that would produce
+    the same output path get an error instead of overwriting each other. With a
+    redax_cache.ResultCache, unchanged documents are served from the cache
+    (their result has "cached": True) and new results are stored in it.
+    credential_keywords extends CREDENTIAL_KEYWORDS for credential line redaction.
+    span_report, pseudonymize and pdf_engine are as for process_document_for_redaction;
+    the PDF engine is resolved once for the whole batch.
+
+    Every result carries a "profile" (stage timings, peak memory; per-pattern
+    scan times too with profile_patterns). With a redax_profile.ProfileLog, or
+    $REDAX_PROFILE_LOG set, each result is also appended to that JSONL log.
+
+    on_result(index, result) is called from the calling thread as soon as each
+    file finishes. Once cancel_event is set, files that have not started yet
+    are skipped and reported as cancelled; files already running complete.
+    """
+    in_workspace = output_dirs is None
+    if in_workspace:
+        workspace = workspace or default_workspaces().new_workspace()
+        output_dirs = [workspace.output_dir(index) for index in range(len(filepaths))]
+    jobs = [(path, output_dir) for path, output_dir in zip(filepaths, output_dirs) if path]
+    filepaths = [path for path, _ in jobs]
+    results = [None] * len(filepaths)
+    if not filepaths:
+        return results
+
+    # Outputs already claimed by an earlier file of this batch
+    claimed_outputs = {}
+    colliding = {}
+    for index, (path, output_dir) in enumerate(jobs):
+        output_path = _output_path_for(path, resolve_output_format(path, output_format), output_dir)
+        output_key = os.path.normcase(os.path.abspath(output_path))
+        if output_key in claimed_outputs:
+            colliding[index] = {"error": f"Output would overwrite the result of {claimed_outputs[output_key]}"}
+        else:
+            claimed_outputs[output_key] = path
+
+    executor_options = {}
+    if output_format == "pdf":
+        pdf_engine = resolve_pdf_engine_name(pdf_engine)
+        if executor_kind == "process":
+            # Each worker loads the engine while the pool starts, instead of during its first document
+            executor_options = {"initializer": warm_pdf_engine, "initargs": (pdf_engine,)}
+    if profile_log is None:
+        profile_log = default_profile_log()
+    workers = max(1, min(max_workers or DEFAULT_MAX_WORKERS, len(filepaths)))
+    # Looked up here rather than imported at the top: concurrent.futures.process pulls in multiprocessing
+    executor_class = concurrent.futures.ProcessPoolExecutor if executor_kind == "process" else ThreadPoolExecutor
+    print(f"DEBUG: Processing {len(filepaths)} file(s) with {workers} {executor_kind} worker(s)"
+          + (f", PDF engine {pdf_engine}" if output_format == "pdf" else ""))
+
+    with executor_class(max_workers=workers, **executor_options) as executor:
+        future_to_index = {
+            executor.submit(_process_document_timed, path, active_patterns_compiled, custom_keywords_list,
+                            output_format, redact_credential_lines_enabled, output_dir, cache,
+                            tuple(credential_keywords or ()), profile_patterns, span_report, pseudonymize,
+                            pdf_engine): index
+            for index, (path, output_dir) in enumerate(jobs) if index not in colliding
+        }
+        for index, result in colliding.items():
+            result['original_name'] = os.path.basename(filepaths[index])
+            results[index] = result
+            if on_result is not None:
+                on_result(index, result)
+        pending = set(future_to_index)
+        while pending:
+            if cancel_event is not None and cancel_event.is_set():
+                for future in pending:
+                    future.cancel()
+            done, pending = wait(pending, timeout=CANCEL_POLL_INTERVAL_SECONDS, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = future_to_index[future]
+                original_filename = os.path.basename(filepaths[index])
+                if future.cancelled():
+                    result = {"error": "Cancelled before processing.", "cancelled": True}
+                else:
+                    try:
+                        result = future.result()
+                    except Exception as e: # e.g. a worker process died
+                        print(f"Error processing {original_filename}: {e}")
+                        result = {"error": f"Error processing {original_filename}: {str(e)}"}
+                if 'original_name' not in result:
+                    result['original_name'] = original_filename
+                if in_workspace and "error" not in result:
+                    workspace.manager.track(result["output_path"])
+                results[index] = result
+                if profile_log is not None:
+                    try:
+                        profile_log.write(filepaths[index], result)
+                    except OSError as e_log:
+                        print(f"DEBUG: Could not write profile log {profile_log.path}: {e_log}")
+                if on_result is not None:
+                    on_result(index, result)
+    return results
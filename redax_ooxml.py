@@ -0,0 +1,963 @@
+"""
+Streaming, run-aware redaction of Office Open XML packages.
+
+Each text-bearing XML part is streamed through expat and written straight back
+out. Only one paragraph at a time is buffered, never the whole part. Within a
+paragraph the text of every run is joined, matched as a whole (so a match split
+across runs is still found), and only the text elements that overlap a match
+are rewritten. Every other run, its formatting and all other markup are copied
+through unchanged.
+
+Callers pass redact_spans(text) -> [(start, end, replacement), ...], so this
+module knows nothing about patterns or keywords.
+"""
+import functools
+import posixpath
+import re
+import shutil
+import zipfile
+from xml.etree import ElementTree
+from xml.parsers import expat
+
+WORDPROCESSINGML_NAMESPACES = (
+    "http://schemas.openxmlformats.org/wordprocessingml/2006/main",
+    "http://purl.oclc.org/ooxml/wordprocessingml/main",  # Strict OOXML
+)
+SPREADSHEETML_NAMESPACES = (
+    "http://schemas.openxmlformats.org/spreadsheetml/2006/main",
+    "http://purl.oclc.org/ooxml/spreadsheetml/main",
+)
+DRAWINGML_NAMESPACES = (
+    "http://schemas.openxmlformats.org/drawingml/2006/main",
+    "http://purl.oclc.org/ooxml/drawingml/main",
+)
+PRESENTATIONML_NAMESPACES = (
+    "http://schemas.openxmlformats.org/presentationml/2006/main",
+    "http://purl.oclc.org/ooxml/presentationml/main",
+)
+THREADED_COMMENTS_NAMESPACE = "http://schemas.microsoft.com/office/spreadsheetml/2018/threadedcomments"
+RELATIONSHIPS_NAMESPACE = "http://schemas.openxmlformats.org/package/2006/relationships"
+XML_NAMESPACE = "http://www.w3.org/XML/1998/namespace"
+
+# Body, headers, footers, footnotes, endnotes and comments
+DOCX_TEXT_PART_RE = re.compile(r"^word/(?:document|header\d*|footer\d*|footnotes|endnotes|comments)\.xml$")
+DOCX_TEXT_PART_RELS_RE = re.compile(r"^word/_rels/(?:document|header\d*|footer\d*|footnotes|endnotes|comments)\.xml\.rels$")
+
+# Shared strings, worksheets (inline strings and cell values), comments, drawings and charts
+XLSX_SHARED_STRINGS_PART_RE = re.compile(r"^xl/sharedStrings\.xml$")
+XLSX_WORKSHEET_PART_RE = re.compile(r"^xl/worksheets/sheet\d+\.xml$")
+XLSX_COMMENTS_PART_RE = re.compile(r"^xl/comments\d+\.xml$")
+XLSX_THREADED_COMMENTS_PART_RE = re.compile(r"^xl/threadedComments/threadedComment\d+\.xml$")
+XLSX_DRAWING_PART_RE = re.compile(r"^xl/(?:drawings/drawing\d+|charts/chart\d+)\.xml$")
+XLSX_RELS_PART_RE = re.compile(r"^xl/(?:worksheets|drawings)/_rels/[^/]+\.xml\.rels$")
+
+# Slides, notes, layouts and masters, SmartArt, charts and comments
+PPTX_TEXT_PART_RE = re.compile(
+    r"^ppt/(?:slides/slide\d+|notesSlides/notesSlide\d+|slideLayouts/slideLayout\d+|slideMasters/slideMaster\d+"
+    r"|notesMasters/notesMaster\d+|handoutMasters/handoutMaster\d+|diagrams/(?:data|drawing)\d+|charts/chart\d+"
+    r"|comments/modernComment[^/]*)\.xml$")
+PPTX_LEGACY_COMMENTS_PART_RE = re.compile(r"^ppt/comments/comment\d+\.xml$")
+PPTX_RELS_PART_RE = re.compile(r"^ppt/(?:slides|notesSlides)/_rels/[^/]+\.xml\.rels$")
+
+_NAME_SEPARATOR = " "
+_ATTRIBUTE_ESCAPE_RE = re.compile(r'[&<"\n\r\t]')
+_COPY_BUFFER_SIZE = 1024 * 1024
+
+
+def _wml(local_name):
+    return {f"{namespace}{_NAME_SEPARATOR}{local_name}" for namespace in WORDPROCESSINGML_NAMESPACES}
+
+
+def _sml(local_name):
+    return {f"{namespace}{_NAME_SEPARATOR}{local_name}" for namespace in SPREADSHEETML_NAMESPACES}
+
+
+def _dml(local_name):
+    return {f"{namespace}{_NAME_SEPARATOR}{local_name}" for namespace in DRAWINGML_NAMESPACES}
+
+
+def _pml(local_name):
+    return {f"{namespace}{_NAME_SEPARATOR}{local_name}" for namespace in PRESENTATIONML_NAMESPACES}
+
+
+class TextMarkup:
+    """Which elements of a part hold text, and how they group into paragraphs."""
+
+    def __init__(self, paragraph_tags, run_tags, text_tags, separator_tags, side_text_tags=None):
+        self.paragraph_tags = frozenset(paragraph_tags)
+        self.run_tags = frozenset(run_tags)
+        self.text_tags = frozenset(text_tags)
+        # Elements inside a run that stand for a character, e.g. tabs and line breaks
+        self.separator_tags = dict(separator_tags)
+        # Text that is stored in the paragraph but is not part of its visible text
+        # (field codes, tracked deletions); matched on its own per paragraph
+        self.side_text_tags = frozenset(side_text_tags or ())
+
+
+DOCX_MARKUP = TextMarkup(
+    paragraph_tags=_wml("p"),
+    run_tags=_wml("r"),
+    text_tags=_wml("t"),
+    separator_tags={**dict.fromkeys(_wml("tab"), "\t"), **dict.fromkeys(_wml("br"), "\n"), **dict.fromkeys(_wml("cr"), "\n")},
+    side_text_tags=_wml("instrText") | _wml("delText") | _wml("delInstrText"),
+)
+
+# Shared strings (si), inline strings (is) and legacy comments (text); rich text runs are r
+SPREADSHEET_MARKUP = TextMarkup(
+    paragraph_tags=_sml("si") | _sml("is") | _sml("text"),
+    run_tags=_sml("r"),
+    text_tags=_sml("t"),
+    separator_tags={},
+)
+
+THREADED_COMMENTS_MARKUP = TextMarkup(
+    paragraph_tags={f"{THREADED_COMMENTS_NAMESPACE}{_NAME_SEPARATOR}threadedComment"},
+    run_tags=(),
+    text_tags={f"{THREADED_COMMENTS_NAMESPACE}{_NAME_SEPARATOR}text"},
+    separator_tags={},
+)
+
+# Text boxes, shapes, tables and chart titles. Line breaks sit directly in the paragraph.
+DRAWINGML_MARKUP = TextMarkup(
+    paragraph_tags=_dml("p"),
+    run_tags=_dml("r") | _dml("fld") | _dml("p"),
+    text_tags=_dml("t"),
+    separator_tags=dict.fromkeys(_dml("br"), "\n"),
+)
+
+PPTX_LEGACY_COMMENTS_MARKUP = TextMarkup(
+    paragraph_tags=_pml("cm"),
+    run_tags=(),
+    text_tags=_pml("text"),
+    separator_tags={},
+)
+
+
+def _escape_text(text):
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace("\r", "&#13;")
+
+
+def _escape_attribute(value):
+    if not _ATTRIBUTE_ESCAPE_RE.search(value):
+        return value
+    return (value.replace("&", "&amp;").replace("<", "&lt;").replace('"', "&quot;")
+            .replace("\n", "&#10;").replace("\r", "&#13;").replace("\t", "&#9;"))
+
+
+@functools.lru_cache(maxsize=4096)
+def _split_name(name):
+    """'uri local prefix' -> ('uri local', 'prefix:local'), as reported by expat with namespace_prefixes."""
+    parts = name.split(_NAME_SEPARATOR)
+    if len(parts) == 3:
+        return f"{parts[0]}{_NAME_SEPARATOR}{parts[1]}", f"{parts[2]}:{parts[1]}"
+    if len(parts) == 2:
+        return name, parts[1]
+    return name, name
+
+
+class _TextSlot:
+    """One text element of a paragraph, held back until the paragraph is complete."""
+    __slots__ = ("qualified_name", "attributes", "chunks", "group", "text")
+
+    def __init__(self, qualified_name, attributes, group):
+        self.qualified_name = qualified_name
+        self.attributes = attributes
+        self.chunks = []
+        self.group = group
+        self.text = None  # set when the slot is rewritten
+
+    def serialize(self):
+        text = "".join(self.chunks) if self.text is None else self.text
+        attributes = self.attributes
+        if self.text is not None and text != text.strip() and not any(name == "xml:space" for name, _ in attributes):
+            # Word drops leading/trailing spaces from text elements unless told to keep them
+            attributes = attributes + [("xml:space", "preserve")]
+        attribute_markup = "".join(f' {name}="{_escape_attribute(value)}"' for name, value in attributes)
+        if not text:
+            return f"<{self.qualified_name}{attribute_markup}/>"
+        return f"<{self.qualified_name}{attribute_markup}>{_escape_text(text)}</{self.qualified_name}>"
+
+
+class _Separator:
+    """A tab or break element inside a run; dropped when a redaction covers it."""
+    __slots__ = ("qualified_name", "attributes", "group", "text", "removed")
+
+    def __init__(self, qualified_name, attributes, group, text):
+        self.qualified_name = qualified_name
+        self.attributes = attributes
+        self.group = group
+        self.text = text
+        self.removed = False
+
+    def serialize(self):
+        if self.removed:
+            return ""
+        attribute_markup = "".join(f' {name}="{_escape_attribute(value)}"' for name, value in self.attributes)
+        return f"<{self.qualified_name}{attribute_markup}/>"
+
+
+class PartRewriter:
+    """
+    Streams one XML part from a binary file object to a text writer, redacting paragraph text on the way.
+
+    attribute_hook(element_key, attributes) may return a replacement attribute
+    list for any element; it is used for hyperlink targets in .rels parts.
+    """
+
+    def __init__(self, write, redact_spans, markup=None, attribute_hook=None):
+        self._write = write
+        self._redact_spans = redact_spans
+        self._markup = markup
+        self._attribute_hook = attribute_hook
+        self._pending_namespaces = []
+        self._element_stack = []
+        self._start_tag_open = False
+        self._paragraph_depth = 0
+        self._paragraph_ids = []
+        self._next_paragraph_id = 0
+        self._tokens = []  # buffered markup strings, _TextSlot and _Separator objects
+        self._slot = None
+
+        parser = expat.ParserCreate(namespace_separator=_NAME_SEPARATOR)
+        parser.namespace_prefixes = True
+        parser.ordered_attributes = True
+        parser.buffer_text = True
+        parser.buffer_size = _COPY_BUFFER_SIZE
+        parser.XmlDeclHandler = self._xml_declaration
+        parser.StartNamespaceDeclHandler = self._start_namespace
+        parser.StartElementHandler = self._start_element
+        parser.EndElementHandler = self._end_element
+        parser.CharacterDataHandler = self._character_data
+        parser.CommentHandler = self._comment
+        parser.ProcessingInstructionHandler = self._processing_instruction
+        self._parser = parser
+
+    def rewrite(self, binary_file):
+        self._parser.ParseFile(binary_file)
+
+    def _emit(self, markup):
+        if self._paragraph_depth:
+            self._tokens.append(markup)
+        else:
+            self._write(markup)
+
+    def _close_start_tag(self):
+        if self._start_tag_open:
+            self._start_tag_open = False
+            self._emit(">")
+
+    def _xml_declaration(self, version, encoding, standalone):
+        # The part is always written back as UTF-8
+        standalone_markup = "" if standalone == -1 else f' standalone="{"yes" if standalone else "no"}"'
+        self._write(f'<?xml version="{version or "1.0"}" encoding="UTF-8"{standalone_markup}?>\r\n')
+
+    def _start_namespace(self, prefix, uri):
+        name = f"xmlns:{prefix}" if prefix else "xmlns"
+        self._pending_namespaces.append((name, uri or ""))
+
+    def _read_attributes(self, element_key, raw_attributes):
+        """[(qualified_name, value)] for an element, its namespace declarations first."""
+        attributes = self._pending_namespaces
+        self._pending_namespaces = []
+        for i in range(0, len(raw_attributes), 2):
+            attribute_key, attribute_name = _split_name(raw_attributes[i])
+            if attribute_key.startswith(XML_NAMESPACE + _NAME_SEPARATOR):
+                # The xml: prefix is implicit, expat doesn't always report it
+                attribute_name = "xml:" + attribute_key.split(_NAME_SEPARATOR, 1)[1]
+            attributes.append((attribute_name, raw_attributes[i + 1]))
+        if self._attribute_hook is not None:
+            attributes = self._attribute_hook(element_key, attributes, self._redact_spans)
+        return attributes
+
+    def _start_element(self, name, raw_attributes):
+        self._close_start_tag()
+        element_key, qualified_name = _split_name(name)
+        attributes = self._read_attributes(element_key, raw_attributes)
+
+        markup = self._markup
+        parent_key = self._element_stack[-1] if self._element_stack else None
+        self._element_stack.append(element_key)
+        if markup is not None:
+            if element_key in markup.paragraph_tags:
+                self._paragraph_depth += 1
+                self._paragraph_ids.append(self._next_paragraph_id)
+                self._next_paragraph_id += 1
+            elif self._paragraph_depth and self._slot is None:
+                if element_key in markup.text_tags or element_key in markup.side_text_tags:
+                    group = self._paragraph_ids[-1]
+                    if element_key in markup.side_text_tags:
+                        group = (group, "side")
+                    self._slot = _TextSlot(qualified_name, attributes, group)
+                    self._tokens.append(self._slot)
+                    return
+                if element_key in markup.separator_tags and parent_key in markup.run_tags:
+                    self._slot = _Separator(qualified_name, attributes, self._paragraph_ids[-1], markup.separator_tags[element_key])
+                    self._tokens.append(self._slot)
+                    return
+
+        attribute_markup = "".join(f' {attr_name}="{_escape_attribute(value)}"' for attr_name, value in attributes)
+        self._emit(f"<{qualified_name}{attribute_markup}")
+        self._start_tag_open = True
+
+    def _end_element(self, name):
+        element_key, qualified_name = _split_name(name)
+        self._element_stack.pop()
+        if self._slot is not None:
+            self._slot = None
+            return
+        if self._start_tag_open:
+            self._start_tag_open = False
+            self._emit("/>")
+        else:
+            self._emit(f"</{qualified_name}>")
+        if self._markup is not None and element_key in self._markup.paragraph_tags:
+            self._paragraph_ids.pop()
+            self._paragraph_depth -= 1
+            if not self._paragraph_depth:
+                self._flush_paragraph()
+
+    def _character_data(self, data):
+        if self._slot is not None:
+            if isinstance(self._slot, _TextSlot):
+                self._slot.chunks.append(data)
+            return
+        self._close_start_tag()
+        self._emit(_escape_text(data))
+
+    def _comment(self, data):
+        self._close_start_tag()
+        self._emit(f"<!--{data}-->")
+
+    def _processing_instruction(self, target, data):
+        self._close_start_tag()
+        self._emit(f"<?{target} {data}?>" if data else f"<?{target}?>")
+
+    def _flush_paragraph(self):
+        groups = {}
+        for token in self._tokens:
+            if isinstance(token, (_TextSlot, _Separator)):
+                groups.setdefault(token.group, []).append(token)
+        for pieces in groups.values():
+            _redact_group(pieces, self._redact_spans)
+        self._write("".join(token if isinstance(token, str) else token.serialize() for token in self._tokens))
+        self._tokens = []
+
+
+def _redact_group(pieces, redact_spans):
+    """Matches the joined text of one paragraph's pieces and rewrites only the slots a match touches."""
+    offsets = []
+    texts = []
+    position = 0
+    for piece in pieces:
+        text = "".join(piece.chunks) if isinstance(piece, _TextSlot) else piece.text
+        texts.append(text)
+        offsets.append(position)
+        position += len(text)
+    spans = redact_spans("".join(texts))
+    if not spans:
+        return
+
+    edits = {}  # piece index -> [(local_start, local_end, replacement)]
+    first_index = 0
+    for start, end, replacement in spans:
+        # Spans are in order, so earlier pieces never need to be revisited
+        while first_index < len(pieces) and offsets[first_index] + len(texts[first_index]) <= start:
+            first_index += 1
+        replacement_placed = False
+        index = first_index
+        while index < len(pieces) and offsets[index] < end:
+            piece_start = offsets[index]
+            if isinstance(pieces[index], _Separator):
+                pieces[index].removed = start <= piece_start and piece_start + len(texts[index]) <= end
+            elif texts[index]:
+                local_start = max(start, piece_start) - piece_start
+                local_end = min(end, piece_start + len(texts[index])) - piece_start
+                edits.setdefault(index, []).append((local_start, local_end, "" if replacement_placed else replacement))
+                replacement_placed = True
+            index += 1
+
+    for index, piece_edits in edits.items():
+        text = texts[index]
+        rebuilt = []
+        last_end = 0
+        for local_start, local_end, replacement in piece_edits:
+            rebuilt.append(text[last_end:local_start])
+            rebuilt.append(replacement)
+            last_end = local_end
+        rebuilt.append(text[last_end:])
+        pieces[index].text = "".join(rebuilt)
+
+
+class _Cell:
+    """A number or formula-string cell of a worksheet, held back until its end tag."""
+    __slots__ = ("qualified_name", "attributes", "cell_type", "depth", "tokens", "value_name", "value_attributes",
+                 "value_chunks", "in_value", "has_formula")
+
+    def __init__(self, qualified_name, attributes, cell_type, depth):
+        self.qualified_name = qualified_name
+        self.attributes = attributes
+        self.cell_type = cell_type
+        self.depth = depth
+        self.tokens = []  # inner markup strings, None where the <v> element goes
+        self.value_name = None
+        self.value_attributes = []
+        self.value_chunks = []
+        self.in_value = False
+        self.has_formula = False
+
+    def serialize(self, redact_spans):
+        value = "".join(self.value_chunks)
+        spans = redact_spans(value) if value else []
+        cell_type = self.cell_type
+        if spans and cell_type == "n":
+            # A number is one token: only a match covering all of it counts
+            spans = [span for span in spans if span[0] == 0 and span[1] == len(value)]
+            if spans:
+                cell_type = "str" if self.has_formula else "inlineStr"
+        if spans:
+            rebuilt = []
+            last_end = 0
+            for start, end, replacement in spans:
+                rebuilt.append(value[last_end:start])
+                rebuilt.append(replacement)
+                last_end = end
+            rebuilt.append(value[last_end:])
+            value = "".join(rebuilt)
+
+        attributes = self.attributes
+        if cell_type != self.cell_type:
+            attributes = [(name, attr_value) for name, attr_value in attributes if name != "t"] + [("t", cell_type)]
+        attribute_markup = "".join(f' {name}="{_escape_attribute(attr_value)}"' for name, attr_value in attributes)
+        inner = []
+        for token in self.tokens:
+            if token is not None:
+                inner.append(token)
+            elif cell_type == "inlineStr":
+                prefix = self.qualified_name[:-1]  # "c" or "x:c"
+                space = ' xml:space="preserve"' if value != value.strip() else ""
+                inner.append(f"<{prefix}is><{prefix}t{space}>{_escape_text(value)}</{prefix}t></{prefix}is>")
+            else:
+                value_markup = "".join(f' {name}="{_escape_attribute(attr_value)}"' for name, attr_value in self.value_attributes)
+                inner.append(f"<{self.value_name}{value_markup}>{_escape_text(value)}</{self.value_name}>")
+        if not inner:
+            return f"<{self.qualified_name}{attribute_markup}/>"
+        return f"<{self.qualified_name}{attribute_markup}>{''.join(inner)}</{self.qualified_name}>"
+
+
+_CELL_TAGS = frozenset(_sml("c"))
+_CELL_VALUE_TAGS = frozenset(_sml("v"))
+_CELL_FORMULA_TAGS = frozenset(_sml("f"))
+# Formulas outside cells: conditional formatting rules and data validation
+_OTHER_FORMULA_TAGS = frozenset(_sml("formula") | _sml("formula1") | _sml("formula2"))
+# Shared strings are redacted in sharedStrings.xml and inline strings as paragraphs;
+# booleans and errors never hold personal data. Number cells include dates (stored as
+# serials like 45122) and amounts, so they only get redact_number_spans (see redact_xlsx).
+_REDACTED_CELL_TYPES = ("n", "str")
+# A string literal in a formula; a quote inside one is written twice
+_FORMULA_STRING_RE = re.compile(r'"((?:[^"]|"")*)"')
+
+
+def _redact_formula(formula, redact_spans):
+    """Redacts the string literals of a cell formula, e.g. the address in CONCATENATE("x@y.org","")."""
+    def redact_literal(m):
+        literal = m.group(1).replace('""', '"')
+        spans = redact_spans(literal)
+        if not spans:
+            return m.group(0)
+        rebuilt = []
+        last_end = 0
+        for start, end, replacement in spans:
+            rebuilt.append(literal[last_end:start])
+            rebuilt.append(replacement)
+            last_end = end
+        rebuilt.append(literal[last_end:])
+        return '"' + "".join(rebuilt).replace('"', '""') + '"'
+    return _FORMULA_STRING_RE.sub(redact_literal, formula)
+
+
+class _WorksheetRewriter(PartRewriter):
+    """
+    PartRewriter for worksheets: inline strings are redacted as paragraphs, and the
+    cached values of number and formula-string cells one cell at a time.
+
+    Number cells are matched with redact_number_spans instead, or left alone
+    without it. A redacted number can't stay a number, so the cell becomes an
+    inline string, or a formula string if it has a formula (Excel keeps the
+    formula and shows the redacted value until the sheet is recalculated).
+
+    Formulas are kept, in cells of every type and in conditional formatting and
+    data validation, but the string literals in them are redacted; otherwise
+    recalculating would bring back what the cached value no longer shows.
+    Numbers written into a formula are left as they are.
+    """
+
+    def __init__(self, write, redact_spans, redact_number_spans=None):
+        super().__init__(write, redact_spans, SPREADSHEET_MARKUP)
+        self._redact_number_spans = redact_number_spans or (lambda text: [])
+        self._cell = None
+        self._part_write = write
+        self._formula_chunks = None  # the text of the <f> being read, if any
+
+    def _start_element(self, name, raw_attributes):
+        element_key, qualified_name = _split_name(name)
+        cell = self._cell
+        if cell is None and element_key in _CELL_TAGS:
+            cell_type = next((raw_attributes[i + 1] for i in range(0, len(raw_attributes), 2) if raw_attributes[i] == "t"), "n")
+            if cell_type in _REDACTED_CELL_TYPES:
+                self._close_start_tag()
+                self._element_stack.append(element_key)
+                self._cell = _Cell(qualified_name, self._read_attributes(element_key, raw_attributes), cell_type, len(self._element_stack))
+                # Cells hold no paragraphs, so everything emitted until </c> lands in the cell
+                self._write = self._cell.tokens.append
+                return
+        elif cell is not None and element_key in _CELL_VALUE_TAGS and len(self._element_stack) == cell.depth:
+            self._close_start_tag()
+            self._element_stack.append(element_key)
+            cell.value_name = qualified_name
+            cell.value_attributes = self._read_attributes(element_key, raw_attributes)
+            cell.in_value = True
+            cell.tokens.append(None)
+            return
+        elif element_key in _CELL_FORMULA_TAGS or element_key in _OTHER_FORMULA_TAGS:
+            if cell is not None and element_key in _CELL_FORMULA_TAGS:
+                cell.has_formula = True
+            super()._start_element(name, raw_attributes)
+            self._formula_chunks = []
+            return
+        super()._start_element(name, raw_attributes)
+
+    def _end_element(self, name):
+        if self._formula_chunks is not None:
+            formula = "".join(self._formula_chunks)
+            self._formula_chunks = None
+            if formula:
+                super()._character_data(_redact_formula(formula, self._redact_spans))
+            super()._end_element(name)
+            return
+        cell = self._cell
+        if cell is not None:
+            if cell.in_value:
+                self._element_stack.pop()
+                cell.in_value = False
+                return
+            if len(self._element_stack) == cell.depth:
+                self._element_stack.pop()
+                self._cell = None
+                self._write = self._part_write
+                self._write(cell.serialize(self._redact_number_spans if cell.cell_type == "n" else self._redact_spans))
+                return
+        super()._end_element(name)
+
+    def _character_data(self, data):
+        if self._formula_chunks is not None:
+            self._formula_chunks.append(data)
+            return
+        cell = self._cell
+        if cell is not None and cell.in_value:
+            cell.value_chunks.append(data)
+        else:
+            super()._character_data(data)
+
+
+def _hyperlink_target_hook(element_key, attributes, redact_spans):
+    """Redacts external link targets (e.g. mailto: addresses) in .rels parts."""
+    if element_key != f"{RELATIONSHIPS_NAMESPACE}{_NAME_SEPARATOR}Relationship":
+        return attributes
+    values = dict(attributes)
+    if values.get("TargetMode") != "External" or "Target" not in values:
+        return attributes
+    target = values["Target"]
+    spans = redact_spans(target)
+    if not spans:
+        return attributes
+    rebuilt = []
+    last_end = 0
+    for start, end, replacement in spans:
+        rebuilt.append(target[last_end:start])
+        rebuilt.append(replacement)
+        last_end = end
+    rebuilt.append(target[last_end:])
+    return [(name, "".join(rebuilt) if name == "Target" else value) for name, value in attributes]
+
+
+def rewrite_package(source, destination, part_handlers):
+    """
+    Copies a zip package, streaming each member through the first matching handler.
+
+    part_handlers is a list of (compiled_name_regex, make_rewriter) where
+    make_rewriter(write) returns a PartRewriter. Members without a handler are
+    copied byte for byte. source and destination are paths or file objects.
+    """
+    with zipfile.ZipFile(source) as zin, zipfile.ZipFile(destination, "w", zipfile.ZIP_DEFLATED) as zout:
+        for info in zin.infolist():
+            handler = next((make for name_re, make in part_handlers if name_re.match(info.filename)), None)
+            out_info = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+            out_info.external_attr = info.external_attr
+            out_info.compress_type = zipfile.ZIP_DEFLATED if handler else info.compress_type
+            with zin.open(info) as src, zout.open(out_info, "w", force_zip64=info.file_size > 0x7FFFFFFF) as dst:
+                if handler is None:
+                    shutil.copyfileobj(src, dst, _COPY_BUFFER_SIZE)
+                    continue
+                pending = []
+                pending_size = 0
+
+                def write(markup):
+                    nonlocal pending_size
+                    pending.append(markup)
+                    pending_size += len(markup)
+                    if pending_size >= _COPY_BUFFER_SIZE:
+                        flush()
+
+                def flush():
+                    nonlocal pending_size
+                    dst.write("".join(pending).encode("utf-8"))
+                    pending.clear()
+                    pending_size = 0
+
+                handler(write).rewrite(src)
+                flush()
+
+
+def redact_docx(source, destination, redact_spans):
+    """Writes a redacted copy of a .docx: body, tables, headers, footers, footnotes, endnotes, comments and link targets."""
+    rewrite_package(source, destination, [
+        (DOCX_TEXT_PART_RE, lambda write: PartRewriter(write, redact_spans, DOCX_MARKUP)),
+        (DOCX_TEXT_PART_RELS_RE, lambda write: PartRewriter(write, redact_spans, attribute_hook=_hyperlink_target_hook)),
+    ])
+
+
+def redact_xlsx(source, destination, redact_spans, redact_number_spans=None):
+    """
+    Writes a redacted copy of a .xlsx: shared and inline strings, cell values, comments, drawings, charts and link targets.
+
+    Number cells (dates among them) are matched with redact_number_spans, which
+    should only find numbers a checksum confirms; without it they are kept.
+    """
+    rewrite_package(source, destination, [
+        (XLSX_SHARED_STRINGS_PART_RE, lambda write: PartRewriter(write, redact_spans, SPREADSHEET_MARKUP)),
+        (XLSX_WORKSHEET_PART_RE, lambda write: _WorksheetRewriter(write, redact_spans, redact_number_spans)),
+        (XLSX_COMMENTS_PART_RE, lambda write: PartRewriter(write, redact_spans, SPREADSHEET_MARKUP)),
+        (XLSX_THREADED_COMMENTS_PART_RE, lambda write: PartRewriter(write, redact_spans, THREADED_COMMENTS_MARKUP)),
+        (XLSX_DRAWING_PART_RE, lambda write: PartRewriter(write, redact_spans, DRAWINGML_MARKUP)),
+        (XLSX_RELS_PART_RE, lambda write: PartRewriter(write, redact_spans, attribute_hook=_hyperlink_target_hook)),
+    ])
+
+
+def redact_pptx(source, destination, redact_spans):
+    """Writes a redacted copy of a .pptx: slides, notes, layouts, masters, SmartArt, charts, comments and link targets."""
+    rewrite_package(source, destination, [
+        (PPTX_TEXT_PART_RE, lambda write: PartRewriter(write, redact_spans, DRAWINGML_MARKUP)),
+        (PPTX_LEGACY_COMMENTS_PART_RE, lambda write: PartRewriter(write, redact_spans, PPTX_LEGACY_COMMENTS_MARKUP)),
+        (PPTX_RELS_PART_RE, lambda write: PartRewriter(write, redact_spans, attribute_hook=_hyperlink_target_hook)),
+    ])
+
+
+# --- Markdown extraction -------------------------------------------------------
+#
+# Pandoc can't read spreadsheets or presentations, so for other output formats
+# the redacted package is turned into Markdown here (sheets and slide tables as
+# pipe tables) and that is what gets converted.
+
+def _local_name(name):
+    return name.rsplit(_NAME_SEPARATOR, 1)[-1]
+
+
+def _markdown_cell(text):
+    return " ".join(text.split()).replace("\\", "\\\\").replace("|", "\\|")
+
+
+def _write_markdown_table(rows, write, width=0):
+    width = max([width] + [len(row) for row in rows])
+    if not rows or not width:
+        return
+    for index, row in enumerate(rows):
+        cells = [_markdown_cell(cell) for cell in row] + [""] * (width - len(row))
+        write("| " + " | ".join(cells) + " |\n")
+        if index == 0:
+            write("|" + "---|" * width + "\n")
+    write("\n")
+
+
+def _part_relationships(package, part_name):
+    """{relationship id: (type, part name)} for the internal relationships of one part."""
+    directory, base_name = posixpath.split(part_name)
+    rels_name = posixpath.join(directory, "_rels", base_name + ".rels")
+    try:
+        with package.open(rels_name) as rels_file:
+            root = ElementTree.parse(rels_file).getroot()
+    except KeyError:
+        return {}
+    relationships = {}
+    for element in root:
+        if element.get("TargetMode") == "External" or not element.get("Target"):
+            continue
+        target = element.get("Target")
+        target = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join(directory, target))
+        relationships[element.get("Id")] = (element.get("Type", ""), target)
+    return relationships
+
+
+def _relationship_id(element):
+    return next((value for name, value in element.attrib.items() if name.endswith("}id")), None)
+
+
+def _column_index(cell_reference):
+    """'C12' -> 2"""
+    index = 0
+    for character in cell_reference:
+        if not character.isalpha():
+            break
+        index = index * 26 + ord(character.upper()) - 64
+    return index - 1
+
+
+class _SheetReader:
+    """Streams one worksheet's rows out as a Markdown table."""
+
+    def __init__(self, shared_strings, write):
+        self._shared_strings = shared_strings
+        self._write = write
+        self._width = 0
+        self._row = None
+        self._cell_type = None
+        self._cell_column = 0
+        self._chunks = None
+        self._cell_text = None
+        self._phonetic_saved_text = None
+        self._rows_written = 0
+
+    def read(self, binary_file):
+        parser = expat.ParserCreate(namespace_separator=_NAME_SEPARATOR)
+        parser.buffer_text = True
+        parser.buffer_size = _COPY_BUFFER_SIZE
+        parser.StartElementHandler = self._start_element
+        parser.EndElementHandler = self._end_element
+        parser.CharacterDataHandler = self._character_data
+        parser.ParseFile(binary_file)
+        return self._rows_written
+
+    def _start_element(self, name, attributes):
+        local = _local_name(name)
+        if local == "dimension":
+            last = attributes.get("ref", "").split(":")[-1]
+            self._width = _column_index(last) + 1 if last else 0
+        elif local == "row":
+            self._row = []
+        elif local == "c" and self._row is not None:
+            self._cell_type = attributes.get("t", "n")
+            reference = attributes.get("r")
+            self._cell_column = _column_index(reference) if reference else len(self._row)
+            self._cell_text = []
+        elif local in ("v", "t") and self._cell_text is not None:
+            self._chunks = []
+        elif local == "rPh":
+            # Phonetic guide text isn't part of the cell's value
+            self._cell_text, self._phonetic_saved_text = None, self._cell_text
+
+    def _end_element(self, name):
+        local = _local_name(name)
+        if local == "rPh":
+            self._cell_text = self._phonetic_saved_text
+        elif local in ("v", "t") and self._chunks is not None:
+            self._cell_text.append("".join(self._chunks) if local == "t" or self._cell_type != "s" else self._shared_string())
+            self._chunks = None
+        elif local == "c" and self._row is not None and self._cell_text is not None:
+            value = "".join(self._cell_text)
+            if self._cell_type == "b":
+                value = "TRUE" if value == "1" else "FALSE" if value == "0" else value
+            if value:
+                self._row.extend([""] * (self._cell_column + 1 - len(self._row)))
+                self._row[self._cell_column] = value
+            self._cell_text = None
+        elif local == "row" and self._row is not None:
+            if any(self._row):
+                self._write_row(self._row)
+            self._row = None
+
+    def _shared_string(self):
+        try:
+            return self._shared_strings[int("".join(self._chunks))]
+        except (ValueError, IndexError):
+            return ""
+
+    def _character_data(self, data):
+        if self._chunks is not None:
+            self._chunks.append(data)
+
+    def _write_row(self, row):
+        if not self._rows_written:
+            self._width = max(self._width, len(row))
+        cells = [_markdown_cell(cell) for cell in row[:self._width]] + [""] * (self._width - len(row))
+        self._write("| " + " | ".join(cells) + " |\n")
+        if not self._rows_written:
+            self._write("|" + "---|" * self._width + "\n")
+        self._rows_written += 1
+
+
+def _read_shared_strings(package):
+    """The shared string table as a list; rich text runs are joined and phonetic text dropped."""
+    strings = []
+    chunks = None
+    skip_depth = 0
+
+    def start_element(name, attributes):
+        nonlocal chunks, skip_depth
+        local = _local_name(name)
+        if local == "si":
+            chunks = []
+        elif local == "rPh":
+            skip_depth += 1
+
+    def end_element(name):
+        nonlocal chunks, skip_depth
+        local = _local_name(name)
+        if local == "si":
+            strings.append("".join(chunks))
+            chunks = None
+        elif local == "rPh":
+            skip_depth -= 1
+
+    def character_data(data):
+        if chunks is not None and not skip_depth:
+            chunks.append(data)
+
+    parser = expat.ParserCreate(namespace_separator=_NAME_SEPARATOR)
+    parser.buffer_text = True
+    parser.StartElementHandler = start_element
+    parser.EndElementHandler = end_element
+    parser.CharacterDataHandler = character_data
+    try:
+        with package.open("xl/sharedStrings.xml") as shared_strings_file:
+            parser.ParseFile(shared_strings_file)
+    except KeyError:
+        pass
+    return strings
+
+
+def xlsx_to_markdown(source, write):
+    """Writes each sheet of a .xlsx as a heading and a Markdown table, streaming the rows."""
+    with zipfile.ZipFile(source) as package:
+        with package.open("xl/workbook.xml") as workbook_file:
+            workbook = ElementTree.parse(workbook_file).getroot()
+        relationships = _part_relationships(package, "xl/workbook.xml")
+        shared_strings = _read_shared_strings(package)
+        for sheet in workbook.iter():
+            if not sheet.tag.endswith("}sheet"):
+                continue
+            part_name = relationships.get(_relationship_id(sheet), ("", None))[1]
+            if part_name is None or part_name not in package.NameToInfo:
+                continue  # chart sheets and dangling references
+            write(f"## {sheet.get('name', '')}\n\n")
+            with package.open(part_name) as sheet_file:
+                rows_written = _SheetReader(shared_strings, write).read(sheet_file)
+            write("\n" if rows_written else "*(empty sheet)*\n\n")
+
+
+class _SlideTextReader:
+    """Collects the paragraphs and tables of one slide (or notes page) in document order."""
+
+    def __init__(self, skip_placeholders=()):
+        self.blocks = []  # paragraph strings and table row lists
+        self._skip_placeholders = frozenset(skip_placeholders)
+        self._paragraph = None
+        self._text_depth = 0
+        self._skip_depth = 0
+        self._shape_skipped = []
+        self._tables = []  # nested tables: [rows]
+        self._cell = None
+
+    def read(self, binary_file):
+        parser = expat.ParserCreate(namespace_separator=_NAME_SEPARATOR)
+        parser.buffer_text = True
+        parser.StartElementHandler = self._start_element
+        parser.EndElementHandler = self._end_element
+        parser.CharacterDataHandler = self._character_data
+        parser.ParseFile(binary_file)
+        return self.blocks
+
+    def _start_element(self, name, attributes):
+        local = _local_name(name)
+        if local == "sp":
+            self._shape_skipped.append(False)
+        elif local == "ph" and self._shape_skipped and attributes.get("type") in self._skip_placeholders:
+            self._shape_skipped[-1] = True
+        elif local == "tbl":
+            self._tables.append([])
+        elif local == "tr" and self._tables:
+            self._tables[-1].append([])
+        elif local == "tc" and self._tables:
+            self._cell = []
+        elif local == "p" and name.startswith(DRAWINGML_NAMESPACES):
+            self._paragraph = []
+        elif local == "t" and self._paragraph is not None:
+            self._text_depth += 1
+        elif local == "br" and self._paragraph is not None:
+            self._paragraph.append(" ")
+        elif local == "fld" and attributes.get("type") == "slidenum":
+            self._skip_depth += 1
+
+    def _end_element(self, name):
+        local = _local_name(name)
+        if local == "sp" and self._shape_skipped:
+            self._shape_skipped.pop()
+        elif local == "t" and self._text_depth:
+            self._text_depth -= 1
+        elif local == "fld" and self._skip_depth:
+            self._skip_depth -= 1
+        elif local == "p" and self._paragraph is not None and name.startswith(DRAWINGML_NAMESPACES):
+            text = " ".join("".join(self._paragraph).split())
+            self._paragraph = None
+            if not text or any(self._shape_skipped):
+                return
+            if self._cell is not None:
+                self._cell.append(text)
+            else:
+                self.blocks.append(text)
+        elif local == "tc" and self._cell is not None:
+            self._tables[-1][-1].append(" ".join(self._cell))
+            self._cell = None
+        elif local == "tbl" and self._tables:
+            rows = self._tables.pop()
+            if rows:
+                self.blocks.append(rows)
+
+    def _character_data(self, data):
+        if self._text_depth and not self._skip_depth and self._paragraph is not None:
+            self._paragraph.append(data)
+
+
+def _write_slide_blocks(blocks, write):
+    for block in blocks:
+        if isinstance(block, list):
+            _write_markdown_table(block, write)
+        else:
+            block = block.replace("\\", "\\\\")
+            write(("\\" + block if block.startswith("#") else block) + "\n\n")
+
+
+def pptx_to_markdown(source, write):
+    """Writes each slide of a .pptx, in presentation order, as a heading, its text and tables, and its speaker notes."""
+    with zipfile.ZipFile(source) as package:
+        with package.open("ppt/presentation.xml") as presentation_file:
+            presentation = ElementTree.parse(presentation_file).getroot()
+        relationships = _part_relationships(package, "ppt/presentation.xml")
+        slide_number = 0
+        for slide_id in presentation.iter():
+            if not slide_id.tag.endswith("}sldId"):
+                continue
+            part_name = relationships.get(_relationship_id(slide_id), ("", None))[1]
+            if part_name is None or part_name not in package.NameToInfo:
+                continue
+            slide_number += 1
+            write(f"## Slide {slide_number}\n\n")
+            with package.open(part_name) as slide_file:
+                _write_slide_blocks(_SlideTextReader().read(slide_file), write)
+            notes_part = next((target for rel_type, target in _part_relationships(package, part_name).values()
+                               if rel_type.endswith("/notesSlide")), None)
+            if notes_part and notes_part in package.NameToInfo:
+                with package.open(notes_part) as notes_file:
+                    # The notes page repeats the slide image and number; only the notes body is wanted
+                    notes = _SlideTextReader(skip_placeholders=("sldImg", "sldNum", "hdr", "ftr", "dt")).read(notes_file)
+                if notes:
+                    write("### Notes\n\n")
+                    _write_slide_blocks(notes, write)
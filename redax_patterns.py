@@ -0,0 +1,375 @@
+"""
+The redaction pattern registry.
+
+Every pattern is a PatternDefinition: a key, its regex, and example strings
+it must match in full (examples) or must not match at all
+(counter_examples). These examples are a self-test. A pattern is compiled
+and self-tested when it is registered, so a typo in a regex is reported
+instead of the pattern silently matching nothing.
+
+Numeric patterns can also name a checksum validator and a min_digits
+prefilter (see redax_detectors). Examples must then pass the validator too,
+and a counter-example that matches but fails the validator is fine, since
+it wouldn't be redacted.
+
+The built-in patterns are registered in default_registry(). Users can add
+their own from JSON pattern packs, either named in $REDAX_PATTERN_PACKS
+(os.pathsep separated) or loaded with load_pack():
+
+    {
+      "format_version": 1,
+      "name": "acme",
+      "patterns": [
+        {"key": "redact_staff_id", "regex": "\\bSTF-\\d{6}\\b", "flags": ["IGNORECASE"],
+         "description": "Acme staff IDs", "examples": ["STF-123456"], "counter_examples": ["STF-12"],
+         "min_digits": 6}
+      ]
+    }
+
+A pack entry can also set "validator" (one of redax_detectors.VALIDATORS)
+and "min_digits".
+
+PatternRegistry.compile() caches the compiled selection by the set of keys
+chosen. Repeated batches with the same options reuse the same pattern
+objects, which also keeps the engine cache in redax_engine warm.
+
+    python -m redax_patterns                 # list patterns and run the self-tests
+    python -m redax_patterns --check pack.json
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+
+from redax_detectors import VALIDATORS, Detector
+from redax_engine import CREDENTIAL_LINES_KEY, KEYWORD_LINE_PLACEHOLDER
+
+PATTERN_PACKS_ENV_VAR = "REDAX_PATTERN_PACKS"
+PATTERN_PACK_FORMAT_VERSION = 1
+_KEY_RE = re.compile(r"^[a-z][a-z0-9_]*$")
+_FLAG_NAMES = {"IGNORECASE": re.IGNORECASE, "MULTILINE": re.MULTILINE, "DOTALL": re.DOTALL,
+               "VERBOSE": re.VERBOSE, "ASCII": re.ASCII}
+
+
+class PatternError(ValueError):
+    """A pattern that doesn't compile, fails its self-test, or is malformed in a pack."""
+
+
+class PatternDefinition:
+    """One redaction pattern and the examples it is checked against."""
+
+    def __init__(self, key, regex, description="", examples=(), counter_examples=(), flags=0, version=1,
+                 source="builtin", validator=None, min_digits=0):
+        self.key = key
+        self.regex = regex
+        self.description = description
+        self.examples = tuple(examples)
+        self.counter_examples = tuple(counter_examples)
+        self.flags = flags
+        self.version = version
+        self.source = source
+        # A name from redax_detectors.VALIDATORS
+        self.validator = validator
+        # Matches hold at least this many digits, in one run of digits and separators; 0 if not digit-anchored
+        self.min_digits = min_digits
+
+    def detector(self):
+        """The redax_detectors.Detector for this pattern, or None if it has neither a validator nor min_digits."""
+        if not self.validator and not self.min_digits:
+            return None
+        return Detector(VALIDATORS[self.validator] if self.validator else None, self.min_digits)
+
+    def compile(self):
+        """Returns the compiled pattern, raising PatternError if it is invalid or fails its self-test."""
+        if not _KEY_RE.match(self.key or ""):
+            raise PatternError(f"invalid pattern key {self.key!r}: use lowercase letters, digits and underscores")
+        if self.validator is not None and self.validator not in VALIDATORS:
+            raise PatternError(f"{self.key}: unknown validator {self.validator!r} (use {', '.join(VALIDATORS)})")
+        if not isinstance(self.min_digits, int) or self.min_digits < 0:
+            raise PatternError(f"{self.key}: min_digits must be a non-negative integer")
+        try:
+            pattern = re.compile(self.regex, self.flags)
+        except (re.error, TypeError) as e:
+            raise PatternError(f"{self.key}: invalid regex: {e}") from e
+        validate = VALIDATORS[self.validator] if self.validator else None
+        for example in self.examples:
+            m = pattern.search(example)
+            if m is None or m.span() != (0, len(example)):
+                found = f"matched only {m.group()!r}" if m else "no match"
+                raise PatternError(f"{self.key}: self-test failed, {example!r} should match in full ({found})")
+            if validate is not None and not validate(example):
+                raise PatternError(f"{self.key}: self-test failed, {example!r} fails the {self.validator} check")
+        for counter_example in self.counter_examples:
+            m = pattern.search(counter_example)
+            if m is not None and (validate is None or validate(m.group())):
+                raise PatternError(f"{self.key}: self-test failed, {counter_example!r} should not match "
+                                   f"(matched {m.group()!r})")
+        return pattern
+
+    def to_dict(self):
+        flags = [name for name, flag in _FLAG_NAMES.items() if self.flags & flag]
+        return {"key": self.key, "regex": self.regex, "flags": flags, "description": self.description,
+                "version": self.version, "source": self.source, "validator": self.validator,
+                "min_digits": self.min_digits, "examples": list(self.examples),
+                "counter_examples": list(self.counter_examples)}
+
+
+BUILTIN_PATTERNS = (
+    PatternDefinition(
+        # One optional separator between digits: the old (?:\d[ -]*?){13,16} backtracked heavily on long digit runs
+        "redact_credit_cards", r"\b\d(?:[ -]?\d){12,15}\b",
+        "Card numbers of 13 to 16 digits passing the Luhn check, optionally grouped with spaces or dashes",
+        version=2, validator="luhn", min_digits=13,
+        examples=("4111 1111 1111 1111", "4111-1111-1111-1111", "4111111111111111", "378282246310005"),
+        counter_examples=("1234 5678", "4111 1111 1111 1112")),
+    PatternDefinition(
+        # [A-Za-z] for the TLD: the old [A-Z|a-z] also let a '|' through
+        "redact_email_address", r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,7}\b",
+        "Email addresses", version=2,
+        examples=("jane.doe@example.com", "sam+tag@corp.com.au"),
+        counter_examples=("jane@localhost", "@example.com")),
+    PatternDefinition(
+        "redact_ips", r"\b(?:[0-9]{1,3}\.){3}[0-9]{1,3}\b",
+        "IPv4 addresses", min_digits=4,
+        examples=("192.168.0.1", "10.0.0.254"),
+        counter_examples=("1.2.3",)),
+    PatternDefinition(
+        "redact_au_tfn", r"\b\d{3}\s?\d{3}\s?\d{3}\b",
+        "Australian tax file numbers (nine digits) passing the ATO check",
+        version=2, validator="au_tfn", min_digits=9,
+        examples=("123 456 782", "123456782"),
+        counter_examples=("12 345 678", "123 456 789")),
+    PatternDefinition(
+        "redact_au_medicare", r"\b[2-6]\d{3}\s?\d{5}\s?\d\b",
+        "Medicare card numbers (ten digits, starting 2 to 6) with a valid check digit",
+        version=2, validator="au_medicare", min_digits=10,
+        examples=("2123 45670 1", "2123456701"),
+        counter_examples=("7123 45670 1", "2123 45671 1")),
+    PatternDefinition(
+        "redact_dob", r"\b(?:(?:\d{1,2}[-/.]\d{1,2}[-/.]\d{2,4})|(?:\d{4}[-/.]\d{1,2}[-/.]\d{1,2}))\b",
+        "Dates such as dates of birth, day/month/year or year-month-day", min_digits=4,
+        examples=("01/02/1980", "1980-02-01", "1.2.80"),
+        counter_examples=("2024",)),
+    PatternDefinition(
+        "redact_au_abn", r"\b\d{2}\s?\d{3}\s?\d{3}\s?\d{3}\b",
+        "Australian business numbers (eleven digits) passing the ABR check",
+        version=2, validator="au_abn", min_digits=11,
+        examples=("51 824 753 556", "51824753556"),
+        counter_examples=("51 824 753", "51 824 753 557")),
+    PatternDefinition(
+        # (?<!\w) rather than \b at the start: \b before '(' or '+' needs a word character in front of it
+        "redact_au_tel",
+        r"(?<!\w)(?:(?:\+?61\s?)?\(?0?[23478]\)?\s?\d{4}\s?\d{4}|1[38]00\s?\d{3}\s?\d{3}|13\s?\d{2}\s?\d{2})\b",
+        "Australian landline, 1300/1800 and 13 numbers", version=2, min_digits=6,
+        examples=("(02) 9876 5432", "02 9876 5432", "+61 2 9876 5432", "1300 123 456", "1800123456", "13 12 34"),
+        counter_examples=("12 9876",)),
+    PatternDefinition(
+        "redact_au_bsb", r"\b(?:BSB\s*[:\-]?\s*)?(?:\d{3}[-\s]?\d{3}|\d{6})\b",
+        "Bank-State-Branch numbers, with or without a leading 'BSB'", version=2, min_digits=6,
+        examples=("BSB 062-000", "BSB: 062000", "062-000"),
+        counter_examples=("06-2000",)),
+    PatternDefinition(
+        "redact_au_account_number", r"\b(?:Acct\s*[:\-]?\s*|Account\s*No\s*[:\-]?\s*)?\d{5,9}\b",
+        "Bank account numbers of 5 to 9 digits, with or without 'Acct' / 'Account No'", version=2, min_digits=5,
+        examples=("Acct 12345678", "Account No: 123456789", "12345"),
+        counter_examples=("1234",)),
+    PatternDefinition(
+        "redact_au_mobile", r"(?<!\w)(?:04|\+?61\s*4|0011\s*61\s*4)(?:\d{2}\s?\d{3}\s?\d{3}|\d{8})\b",
+        "Australian mobile numbers, local or international form", version=2, min_digits=10,
+        examples=("0412 345 678", "0412345678", "+61 412 345 678", "0011 61 412 345 678"),
+        counter_examples=("0312 345 678",)),
+)
+
+
+class PatternRegistry:
+    """Known redaction patterns by key, plus a cache of compiled selections."""
+
+    def __init__(self, definitions=()):
+        self._definitions = {}
+        self._compiled = {}
+        # Compiled selections, keyed by the selected keys in registry order
+        self._selection_cache = {}
+        self._lock = threading.Lock()
+        self.errors = []
+        for definition in definitions:
+            self.register(definition)
+
+    def register(self, definition, replace=False):
+        """Compiles and self-tests definition and adds it. Raises PatternError if it fails."""
+        if definition.key == CREDENTIAL_LINES_KEY:
+            raise PatternError(f"{CREDENTIAL_LINES_KEY} is reserved for credential line redaction")
+        pattern = definition.compile()
+        with self._lock:
+            if definition.key in self._definitions and not replace:
+                raise PatternError(f"pattern {definition.key!r} is already registered "
+                                   f"(from {self._definitions[definition.key].source})")
+            self._definitions[definition.key] = definition
+            self._compiled[definition.key] = pattern
+            self._selection_cache.clear()
+
+    def load_pack(self, path, replace=False):
+        """
+        Registers every pattern in the JSON pack at path and returns their keys.
+
+        The pack is checked as a whole first, so a bad pattern means nothing
+        from it is registered.
+        """
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                pack = json.load(f)
+        except (OSError, ValueError) as e:
+            raise PatternError(f"could not read pattern pack {path}: {e}") from e
+        if not isinstance(pack, dict) or not isinstance(pack.get("patterns"), list):
+            raise PatternError(f"{path}: a pattern pack is an object with a 'patterns' list")
+        if pack.get("format_version", PATTERN_PACK_FORMAT_VERSION) != PATTERN_PACK_FORMAT_VERSION:
+            raise PatternError(f"{path}: unsupported format_version {pack.get('format_version')!r}")
+        source = f"{pack.get('name') or os.path.basename(path)} ({path})"
+        definitions = [_definition_from_pack_entry(entry, source, path) for entry in pack["patterns"]]
+        problems = []
+        for definition in definitions:
+            try:
+                definition.compile()
+            except PatternError as e:
+                problems.append(str(e))
+            if definition.key in self._definitions and not replace:
+                problems.append(f"pattern {definition.key!r} is already registered")
+        if problems:
+            raise PatternError(f"{path}: " + "; ".join(problems))
+        for definition in definitions:
+            self.register(definition, replace=replace)
+        print(f"INFO: Loaded {len(definitions)} pattern(s) from {path}")
+        return [definition.key for definition in definitions]
+
+    def __contains__(self, key):
+        return key in self._definitions or key == CREDENTIAL_LINES_KEY
+
+    def keys(self):
+        """Every selectable key, including the credential line option, in registry order."""
+        return [*self._definitions, CREDENTIAL_LINES_KEY]
+
+    def definitions(self):
+        return list(self._definitions.values())
+
+    def get(self, key):
+        return self._definitions.get(key)
+
+    def detectors(self, keys):
+        """{key: redax_detectors.Detector} for the given keys that have a validator or a digit prefilter."""
+        detectors = {}
+        for key in keys:
+            definition = self._definitions.get(key)
+            detector = definition.detector() if definition is not None else None
+            if detector is not None:
+                detectors[key] = detector
+        return detectors
+
+    def sources(self):
+        """{key: regex source} with the credential line placeholder, the shape of REDACTION_PATTERNS_PYTHON."""
+        return {**{key: d.regex for key, d in self._definitions.items()}, CREDENTIAL_LINES_KEY: KEYWORD_LINE_PLACEHOLDER}
+
+    def compile(self, selected_pattern_keys):
+        """
+        Returns {key: compiled pattern} for the selected keys, in registry order.
+
+        The credential line option is not a regex and is left out, and unknown
+        keys are skipped with a warning. Selections are cached, so the same
+        selection always gets the same pattern objects back. Treat the
+        returned dict as read-only.
+        """
+        selected = set(selected_pattern_keys or ())
+        for key in selected - self._definitions.keys() - {CREDENTIAL_LINES_KEY}:
+            print(f"DEBUG: Warning: Unknown pattern key selected: {key}")
+        with self._lock:
+            # Registry order, not selection order, so the combined matcher's priorities don't depend on click order
+            cache_key = tuple(key for key in self._definitions if key in selected)
+            compiled = self._selection_cache.get(cache_key)
+            if compiled is None:
+                compiled = {key: self._compiled[key] for key in cache_key}
+                self._selection_cache[cache_key] = compiled
+        return compiled
+
+
+def _definition_from_pack_entry(entry, source, path):
+    if not isinstance(entry, dict) or not isinstance(entry.get("key"), str) or not isinstance(entry.get("regex"), str):
+        raise PatternError(f"{path}: every pattern needs a string 'key' and 'regex': {entry!r}")
+    flags = 0
+    for name in entry.get("flags", ()):
+        if name not in _FLAG_NAMES:
+            raise PatternError(f"{path}: {entry['key']}: unknown flag {name!r} (use {', '.join(_FLAG_NAMES)})")
+        flags |= _FLAG_NAMES[name]
+    return PatternDefinition(entry["key"], entry["regex"], entry.get("description", ""),
+                             entry.get("examples", ()), entry.get("counter_examples", ()), flags,
+                             entry.get("version", 1), source, entry.get("validator"), entry.get("min_digits", 0))
+
+
+_default_registry = None
+_default_registry_lock = threading.Lock()
+
+
+def default_registry():
+    """The shared registry: the built-in patterns plus any packs named in $REDAX_PATTERN_PACKS."""
+    global _default_registry
+    with _default_registry_lock:
+        if _default_registry is None:
+            registry = PatternRegistry()
+            for definition in BUILTIN_PATTERNS:
+                try:
+                    registry.register(definition)
+                except PatternError as e:
+                    # Leave the broken pattern out but say so; don't take the whole app down
+                    print(f"WARNING: Built-in pattern disabled: {e}")
+                    registry.errors.append(str(e))
+            for path in filter(None, os.environ.get(PATTERN_PACKS_ENV_VAR, "").split(os.pathsep)):
+                try:
+                    registry.load_pack(path)
+                except PatternError as e:
+                    print(f"WARNING: Pattern pack not loaded: {e}")
+                    registry.errors.append(str(e))
+            _default_registry = registry
+        return _default_registry
+
+
+def load_packs_for_workers(paths):
+    """
+    Loads pattern packs into default_registry() and adds them to $REDAX_PATTERN_PACKS,
+    so worker processes started afterwards load them too. Returns the registry;
+    raises PatternError for the first pack that can't be loaded.
+    """
+    registry = default_registry()
+    for path in paths:
+        registry.load_pack(path)
+    if paths:
+        # The registry here is already built, so it doesn't load them a second time from the environment
+        os.environ[PATTERN_PACKS_ENV_VAR] = os.pathsep.join(
+            filter(None, [os.environ.get(PATTERN_PACKS_ENV_VAR, "")] + [os.path.abspath(path) for path in paths]))
+    return registry
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m redax_patterns",
+                                     description="List redaction patterns and run their self-tests.")
+    parser.add_argument("--check", metavar="PACK_JSON", action="append", default=[],
+                        help="Validate a pattern pack and include it in the listing; repeatable")
+    parser.add_argument("--json", action="store_true", help="Print the patterns as JSON")
+    args = parser.parse_args(argv)
+
+    registry = default_registry()
+    failed = bool(registry.errors)
+    for path in args.check:
+        try:
+            registry.load_pack(path)
+        except PatternError as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+            failed = True
+    if args.json:
+        print(json.dumps([d.to_dict() for d in registry.definitions()], indent=2))
+    else:
+        for definition in registry.definitions():
+            print(f"{definition.key}\tv{definition.version}\t{definition.source}\t{definition.description}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+"""
+PDF engines for redacted output.
+
+pandoc's own PDF route goes through LaTeX: several seconds per document, and
+no PDF at all on machines without a TeX install. The other engines skip it:
+
+    latex       pandoc -> LaTeX -> PDF (the original route)
+    weasyprint  pandoc -> HTML, rendered in-process by WeasyPrint
+    typst       pandoc -> typst markup, compiled in-process by the typst
+                package, or by pandoc --pdf-engine=typst with the typst CLI
+    auto        the first of weasyprint, typst and latex that is installed
+
+weasyprint and typst only ask pandoc for HTML or typst text, which the pandoc
+server backend (redax_convert) can produce without starting a process. Engines
+are created once per process and keep what is expensive to load (the
+WeasyPrint import, its font configuration and stylesheet), so a worker pool
+pays for that once per worker, not once per document; warm_pdf_engine() is the
+process pool initializer that does it up front.
+
+The engine is chosen per batch (process_documents_batch(pdf_engine=...)), or
+with the REDAX_PDF_ENGINE environment variable.
+"""
+import importlib.util
+import os
+import shutil
+import threading
+
+from redax_workspace import partial_path_for, remove_quietly
+
+PDF_ENGINE_ENV_VAR = "REDAX_PDF_ENGINE"
+AUTO_PDF_ENGINE = "auto"
+DEFAULT_PDF_ENGINE = AUTO_PDF_ENGINE
+PDF_ENGINES = (AUTO_PDF_ENGINE, "latex", "weasyprint", "typst")
+# Tried in this order by "auto"
+_AUTO_ORDER = ("weasyprint", "typst", "latex")
+_LATEX_PROGRAMS = ("pdflatex", "xelatex", "lualatex", "tectonic")
+# Title of the HTML page WeasyPrint renders; ends up in the PDF metadata
+PDF_DOCUMENT_TITLE = "Redacted document"
+# pandoc's standalone HTML is styled for screens: a narrow centred column with wide padding
+_WEASYPRINT_CSS = """
+@page { size: A4; margin: 2cm; }
+html { font-size: 11pt; }
+body { max-width: none; margin: 0; padding: 0; }
+nav#TOC { page-break-after: always; }
+"""
+
+
+class PdfEngineError(RuntimeError):
+    """The requested PDF engine is not installed."""
+
+
+def _has_module(name):
+    return importlib.util.find_spec(name) is not None
+
+
+class LatexPdfEngine:
+    """pandoc's default PDF output, through a LaTeX engine."""
+    name = "latex"
+
+    @staticmethod
+    def available():
+        return any(shutil.which(program) for program in _LATEX_PROGRAMS)
+
+    def warm(self):
+        pass
+
+    def convert(self, converter, source, from_format, outputfile, source_is_file=False):
+        convert = converter.convert_file if source_is_file else converter.convert_text
+        convert(source, "pdf", from_format, outputfile=outputfile, extra_args=["--standalone", "--toc"])
+
+
+class WeasyPrintPdfEngine:
+    """pandoc writes standalone HTML, WeasyPrint renders it to PDF in this process."""
+    name = "weasyprint"
+
+    def __init__(self):
+        self._weasyprint = None
+        self._stylesheet = None
+        self._font_config = None
+        self._load_lock = threading.Lock()
+        # WeasyPrint makes no thread-safety promises; process pools render in parallel
+        self._render_lock = threading.Lock()
+
+    @staticmethod
+    def available():
+        return _has_module("weasyprint")
+
+    def warm(self):
+        """Imports WeasyPrint and parses the stylesheet, once per process (most of WeasyPrint's start-up cost)."""
+        with self._load_lock:
+            if self._weasyprint is None:
+                import weasyprint
+                from weasyprint.text.fonts import FontConfiguration
+                self._font_config = FontConfiguration()
+                self._stylesheet = weasyprint.CSS(string=_WEASYPRINT_CSS, font_config=self._font_config)
+                self._weasyprint = weasyprint
+
+    def convert(self, converter, source, from_format, outputfile, source_is_file=False):
+        self.warm()
+        extra_args = ["--standalone", "--toc", f"--variable=pagetitle={PDF_DOCUMENT_TITLE}"]
+        if from_format == "docx":
+            # Images only exist inside the package; inline them, there is no directory to point at
+            extra_args.append("--embed-resources")
+        convert = converter.convert_file if source_is_file else converter.convert_text
+        html = convert(source, "html5", from_format, extra_args=extra_args)
+        with self._render_lock:
+            self._weasyprint.HTML(string=html, base_url=os.path.dirname(os.path.abspath(outputfile))).write_pdf(
+                outputfile, stylesheets=[self._stylesheet], font_config=self._font_config)
+
+
+class TypstPdfEngine:
+    """
+    pandoc writes typst markup; the typst Python package compiles it in this
+    process, or without it pandoc runs the typst CLI (one short-lived process).
+    """
+    name = "typst"
+
+    def __init__(self):
+        self._typst = None
+        self._load_lock = threading.Lock()
+
+    @staticmethod
+    def available():
+        return _has_module("typst") or shutil.which("typst") is not None
+
+    def warm(self):
+        with self._load_lock:
+            if self._typst is None and _has_module("typst"):
+                import typst
+                self._typst = typst
+
+    def convert(self, converter, source, from_format, outputfile, source_is_file=False):
+        self.warm()
+        convert = converter.convert_file if source_is_file else converter.convert_text
+        if self._typst is None:
+            convert(source, "pdf", from_format, outputfile=outputfile,
+                    extra_args=["--standalone", "--toc", "--pdf-engine=typst"])
+            return
+        markup = convert(source, "typst", from_format, extra_args=["--standalone", "--toc"])
+        markup_path = partial_path_for(os.path.splitext(outputfile)[0] + ".typ")
+        try:
+            with open(markup_path, "w", encoding="utf-8") as f:
+                f.write(markup)
+            self._typst.compile(markup_path, output=outputfile)
+        finally:
+            remove_quietly(markup_path)
+
+
+_ENGINE_CLASSES = {engine.name: engine for engine in (LatexPdfEngine, WeasyPrintPdfEngine, TypstPdfEngine)}
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def resolve_pdf_engine_name(name=None):
+    """The concrete engine for name (default: $REDAX_PDF_ENGINE or auto), "auto" resolved to what is installed."""
+    name = name or os.environ.get(PDF_ENGINE_ENV_VAR) or DEFAULT_PDF_ENGINE
+    if name == AUTO_PDF_ENGINE:
+        # LaTeX is the last resort even when no TeX program is found: its error says what is missing
+        return next((candidate for candidate in _AUTO_ORDER[:-1] if _ENGINE_CLASSES[candidate].available()), "latex")
+    if name not in _ENGINE_CLASSES:
+        raise ValueError(f"Unknown PDF engine: {name}")
+    return name
+
+
+def available_pdf_engines():
+    """Names of the engines that are installed here."""
+    return [name for name in _AUTO_ORDER if _ENGINE_CLASSES[name].available()]
+
+
+def get_pdf_engine(name=None):
+    """This process's engine for name (see resolve_pdf_engine_name); raises PdfEngineError if it isn't installed."""
+    name = resolve_pdf_engine_name(name)
+    with _engines_lock:
+        engine = _engines.get(name)
+        if engine is None:
+            engine_class = _ENGINE_CLASSES[name]
+            if name != "latex" and not engine_class.available():
+                raise PdfEngineError(f"PDF engine '{name}' is not installed; installed: "
+                                     f"{', '.join(available_pdf_engines()) or 'none'}")
+            engine = _engines[name] = engine_class()
+    return engine
+
+
+def warm_pdf_engine(name=None):
+    """Loads the engine ahead of the first document, e.g. as a ProcessPoolExecutor initializer."""
+    try:
+        get_pdf_engine(name).warm()
+    except (PdfEngineError, ImportError, OSError) as e:
+        # Reported properly, per document, when a PDF is actually written
+        print(f"DEBUG: Could not load PDF engine {name or ''}: {e}")
@@ -0,0 +1,147 @@
+"""
+Per-document profiling for the redaction pipeline.
+
+process_document_for_redaction records a span for each stage it goes
+through (load, redact, convert, cache, ...) in a DocumentProfile. The
+profile travels back with the result as result["profile"], and
+process_documents_batch can append it to a JSONL log so slow documents and
+slow patterns can be found after the fact.
+
+Timing each pattern on its own costs an extra pass per pattern, so it is
+only done when asked for (pattern_timing=True).
+
+Memory: rss_growth_bytes is how far the process's resident memory rose above
+where it was when the document started, sampled at the end of every stage
+(Linux only; None elsewhere). Documents redacted at the same time in one
+process (a thread pool, the GUI, the server) share that memory, so their
+figures overlap; with a process pool each worker only counts its own.
+process_peak_rss_bytes is the process-wide high-water mark, which only
+grows over the life of a process.
+"""
+import contextlib
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PROFILE_LOG_ENV_VAR = "REDAX_PROFILE_LOG"
+_STATM_PATH = "/proc/self/statm"
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else None
+
+
+def current_rss_bytes():
+    """The process's resident memory right now, or None where it can't be read cheaply (anywhere but Linux)."""
+    try:
+        with open(_STATM_PATH, "rb") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError, TypeError):
+        return None
+
+
+def peak_rss_bytes():
+    """The process's resident memory high-water mark so far, or None where it isn't available."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class DocumentProfile:
+    """Timing spans, per-pattern scan times and memory for one document."""
+
+    def __init__(self, pattern_timing=False):
+        self.pattern_timing = pattern_timing
+        self.spans = []
+        self.pattern_seconds = {}
+        self._started = time.perf_counter()
+        self._rss_start = self._rss_high = current_rss_bytes()
+
+    @contextlib.contextmanager
+    def span(self, stage, **details):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans.append({"stage": stage, "offset_seconds": round(started - self._started, 6),
+                               "seconds": round(time.perf_counter() - started, 6), **details})
+            self._sample_rss()
+
+    def _sample_rss(self):
+        if self._rss_start is not None:
+            self._rss_high = max(self._rss_high, current_rss_bytes() or 0)
+
+    def time_patterns(self, text, engine, redact_credential_lines_enabled=False):
+        """With pattern_timing on, scans text once per pattern and adds up how long each one takes."""
+        if not self.pattern_timing:
+            return
+        matchers = list(engine.iter_matchers())
+        for key, pattern in matchers:
+            started = time.perf_counter()
+            for _ in pattern.finditer(text):
+                pass
+            self._add_pattern_time(key, time.perf_counter() - started)
+        if redact_credential_lines_enabled:
+            started = time.perf_counter()
+            engine.credential_lines.line_spans(text)
+            self._add_pattern_time("redact_credential_lines", time.perf_counter() - started)
+
+    def _add_pattern_time(self, key, seconds):
+        self.pattern_seconds[key] = self.pattern_seconds.get(key, 0.0) + seconds
+
+    def to_dict(self):
+        self._sample_rss()
+        stage_seconds = {}
+        for span in self.spans:
+            stage_seconds[span["stage"]] = round(stage_seconds.get(span["stage"], 0.0) + span["seconds"], 6)
+        profile = {
+            "total_seconds": round(time.perf_counter() - self._started, 6),
+            "stage_seconds": stage_seconds,
+            "spans": self.spans,
+            "rss_growth_bytes": self._rss_high - self._rss_start if self._rss_start is not None else None,
+            "process_peak_rss_bytes": peak_rss_bytes(),
+        }
+        if self.pattern_timing:
+            profile["pattern_seconds"] = {key: round(seconds, 6) for key, seconds in
+                                          sorted(self.pattern_seconds.items(), key=lambda item: -item[1])}
+        return profile
+
+
+class ProfileLog:
+    """Appends one JSON line per processed document; safe to share between threads."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, filepath, result):
+        record = {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="milliseconds"),
+            "path": filepath,
+            "status": "error" if "error" in result else "ok",
+            "output_format": result.get("output_format"),
+            "elapsed_seconds": result.get("elapsed_seconds"),
+            "cached": bool(result.get("cached")),
+            "matches": result.get("matches") or {},
+            "profile": result.get("profile"),
+            "error": result.get("error"),
+        }
+        line = json.dumps(record) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+
+def default_profile_log():
+    """A ProfileLog at $REDAX_PROFILE_LOG, or None if it isn't set."""
+    path = os.environ.get(PROFILE_LOG_ENV_VAR)
+    return ProfileLog(path) if path else None
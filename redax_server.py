@@ -0,0 +1,671 @@
+"""
+Local HTTP redaction service for scripts and other tools.
+
+    python -m redax_server --port 8765 --root /srv/shared
+
+Standard library only (http.server); binds to 127.0.0.1 unless told otherwise.
+
+    POST /redact/text   {"text": "...", "patterns": [...], "keywords": [...], "credential_lines": false,
+                         "credential_keywords": [...], "pseudonymize": false, "spans": false}
+                        -> {"text": "...", "matches": {...}, "spans": [[start, end, key, value_hash], ...]}
+    POST /redact/file   {"path": "/srv/shared/in/a.docx", "output_dir": "/srv/shared/out", "output_format": "md",
+                         ...same options} -> {"status": "ok", "output_path": ..., "matches": {...}, ...}
+                        Paths must be under one of the --root directories; without any, only uploads work.
+                        Without output_dir the output goes to the service's workspace in the temp dir, where
+                        the oldest outputs are removed once over $REDAX_WORKSPACE_MAX_BYTES: copy them out.
+    POST /redact/file?filename=a.docx&output_format=md&pattern=redact_email_address&keyword=Falcon
+                        with the document as the body -> the redacted document
+    GET  /patterns      the pattern keys
+    GET  /health
+    GET  /metrics       Prometheus text format; ?format=json for JSON
+
+Compiled patterns and engines are cached across requests (redax_patterns,
+redax_engine), files go to a worker pool that lives as long as the service, and
+small text requests arriving together are scanned as one text: one engine pass
+per batch instead of one per request. Each endpoint admits a bounded number of
+requests at a time; beyond that it answers 503 with Retry-After instead of
+queueing without limit.
+"""
+import argparse
+import collections
+import concurrent.futures
+import contextlib
+import json
+import mimetypes
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from redax_cache import ResultCache
+from redax_convert import BACKEND_ENV_VAR
+from redax_engine import CREDENTIAL_LINES_KEY
+from redax_logic import (DEFAULT_MAX_WORKERS, ORIGINAL_OUTPUT_FORMAT, SUPPORTED_EXTENSIONS, _get_engine,
+                         _keyed_redaction_spans, _process_document_timed, compile_redaction_patterns)
+from redax_patterns import PatternError, default_registry, load_packs_for_workers
+from redax_pdf import PDF_ENGINES
+from redax_spans import SPAN_REPORT_FORMATS, SpanIndex, apply_spans
+from redax_workspace import default_workspaces
+
+OUTPUT_FORMATS = ("md", "pdf", "docx", "xlsx", "pptx", ORIGINAL_OUTPUT_FORMAT)
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_MAX_BODY_BYTES = 64 * 1024 * 1024
+# Text requests up to this size wait briefly to be scanned together with others
+SMALL_TEXT_CHARS = 64 * 1024
+BATCH_WINDOW_SECONDS = 0.002
+BATCH_MAX_REQUESTS = 64
+BATCH_MAX_CHARS = 1024 * 1024
+# Between texts of one batch: no pattern matches a NUL, credential lines end at the line breaks, and
+# \b or (?<!\w) see a line break as they would the edge of the text (see RedactionEngine.edge_sensitive)
+_BATCH_SEPARATOR = "\n\x00\n"
+DEFAULT_MAX_PENDING_TEXT = 256
+DEFAULT_MAX_PENDING_FILES_PER_WORKER = 4
+RETRY_AFTER_SECONDS = 1
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Recent latencies kept per endpoint for the percentiles in the JSON metrics
+_LATENCY_SAMPLES = 1024
+_TRUE_VALUES = ("1", "true", "yes", "on")
+
+
+class RequestError(ValueError):
+    """A malformed request; answered with 400."""
+
+
+class _TooLarge(RequestError):
+    """A request body over the limit; answered with 413."""
+
+
+class ServiceBusy(RuntimeError):
+    """Too many requests in flight for an endpoint; answered with 503."""
+
+
+class _EndpointMetrics:
+    __slots__ = ("requests", "errors", "rejected", "in_flight", "input_bytes", "output_bytes", "latency_sum",
+                 "buckets", "recent")
+
+    def __init__(self):
+        self.requests = self.errors = self.rejected = self.in_flight = 0
+        self.input_bytes = self.output_bytes = 0
+        self.latency_sum = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.recent = collections.deque(maxlen=_LATENCY_SAMPLES)
+
+
+class Metrics:
+    """Request, latency and throughput counters per endpoint; safe to update from any thread."""
+
+    def __init__(self):
+        self.started = time.time()
+        self._endpoints = collections.defaultdict(_EndpointMetrics)
+        self._lock = threading.Lock()
+        self.text_batches = 0
+        self.text_batched_requests = 0
+
+    def observe(self, endpoint, seconds, error=False, input_bytes=0, output_bytes=0):
+        with self._lock:
+            metrics = self._endpoints[endpoint]
+            metrics.requests += 1
+            metrics.errors += bool(error)
+            metrics.input_bytes += input_bytes
+            metrics.output_bytes += output_bytes
+            metrics.latency_sum += seconds
+            metrics.recent.append(seconds)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    metrics.buckets[i] += 1
+                    break
+
+    def rejected(self, endpoint):
+        with self._lock:
+            self._endpoints[endpoint].rejected += 1
+
+    def in_flight(self, endpoint, delta):
+        with self._lock:
+            self._endpoints[endpoint].in_flight += delta
+
+    def batch(self, size):
+        with self._lock:
+            self.text_batches += 1
+            self.text_batched_requests += size
+
+    def to_dict(self):
+        with self._lock:
+            uptime = time.time() - self.started
+            endpoints = {}
+            for name, metrics in self._endpoints.items():
+                recent = sorted(metrics.recent)
+                percentile = lambda p: round(recent[min(len(recent) - 1, int(p * len(recent)))], 6) if recent else None
+                endpoints[name] = {
+                    "requests": metrics.requests,
+                    "errors": metrics.errors,
+                    "rejected": metrics.rejected,
+                    "in_flight": metrics.in_flight,
+                    "input_bytes": metrics.input_bytes,
+                    "output_bytes": metrics.output_bytes,
+                    "requests_per_second": round(metrics.requests / uptime, 3) if uptime else None,
+                    "latency_seconds": {
+                        "mean": round(metrics.latency_sum / metrics.requests, 6) if metrics.requests else None,
+                        "p50": percentile(0.5), "p95": percentile(0.95), "p99": percentile(0.99),
+                    },
+                }
+            return {
+                "uptime_seconds": round(uptime, 3),
+                "endpoints": endpoints,
+                "text_batches": self.text_batches,
+                "text_batched_requests": self.text_batched_requests,
+            }
+
+    def to_prometheus(self):
+        lines = []
+        with self._lock:
+            lines.append(f"redax_uptime_seconds {time.time() - self.started:.3f}")
+            counters = (("requests_total", "requests"), ("errors_total", "errors"), ("rejected_total", "rejected"),
+                        ("input_bytes_total", "input_bytes"), ("output_bytes_total", "output_bytes"))
+            for metric, field in counters:
+                lines.append(f"# TYPE redax_{metric} counter")
+                lines.extend(f'redax_{metric}{{endpoint="{name}"}} {getattr(metrics, field)}'
+                             for name, metrics in self._endpoints.items())
+            lines.append("# TYPE redax_in_flight gauge")
+            lines.extend(f'redax_in_flight{{endpoint="{name}"}} {metrics.in_flight}'
+                         for name, metrics in self._endpoints.items())
+            lines.append("# TYPE redax_request_seconds histogram")
+            for name, metrics in self._endpoints.items():
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, metrics.buckets):
+                    cumulative += count
+                    lines.append(f'redax_request_seconds_bucket{{endpoint="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'redax_request_seconds_bucket{{endpoint="{name}",le="+Inf"}} {metrics.requests}')
+                lines.append(f'redax_request_seconds_sum{{endpoint="{name}"}} {metrics.latency_sum:.6f}')
+                lines.append(f'redax_request_seconds_count{{endpoint="{name}"}} {metrics.requests}')
+            lines.append("# TYPE redax_text_batches_total counter")
+            lines.append(f"redax_text_batches_total {self.text_batches}")
+            lines.append("# TYPE redax_text_batched_requests_total counter")
+            lines.append(f"redax_text_batched_requests_total {self.text_batched_requests}")
+        return "\n".join(lines) + "\n"
+
+
+class _Admission:
+    """At most limit requests in flight; the rest are turned away rather than queued."""
+
+    def __init__(self, name, limit, metrics):
+        self.name = name
+        self._slots = threading.BoundedSemaphore(limit)
+        self._metrics = metrics
+
+    @contextlib.contextmanager
+    def admit(self):
+        if not self._slots.acquire(blocking=False):
+            self._metrics.rejected(self.name)
+            raise ServiceBusy(f"Too many {self.name} requests in flight; retry shortly")
+        self._metrics.in_flight(self.name, 1)
+        try:
+            yield
+        finally:
+            self._metrics.in_flight(self.name, -1)
+            self._slots.release()
+
+
+class _TextRequest:
+    __slots__ = ("text", "engine", "credential_lines", "span_index", "future")
+
+    def __init__(self, text, engine, credential_lines, span_index):
+        self.text = text
+        self.engine = engine
+        self.credential_lines = credential_lines
+        self.span_index = span_index
+        self.future = Future()
+
+
+class TextBatcher:
+    """
+    Collects small text requests for up to window seconds and scans each group
+    that shares an engine as one text, then splits the spans back per request.
+
+    An engine with anchored patterns (^CASE-\\d+) or lookarounds that could see
+    past a text's edge gets each of its texts scanned on its own instead, since
+    joined they would match differently.
+    """
+
+    def __init__(self, metrics, window=BATCH_WINDOW_SECONDS, max_requests=BATCH_MAX_REQUESTS, max_chars=BATCH_MAX_CHARS):
+        self._metrics = metrics
+        self._window = window
+        self._max_requests = max_requests
+        self._max_chars = max_chars
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="redax-text-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, text, engine, credential_lines=False, span_index=None):
+        """A Future for (redacted text, match counts)."""
+        request = _TextRequest(text, engine, credential_lines, span_index)
+        self._queue.put(request)
+        return request.future
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            request = self._queue.get()
+            if request is None:
+                return
+            batch = [request]
+            chars = len(request.text)
+            deadline = time.monotonic() + self._window
+            while len(batch) < self._max_requests and chars < self._max_chars:
+                remaining = deadline - time.monotonic()
+                try:
+                    request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    self._queue.put(None)  # finish this batch, then stop
+                    break
+                batch.append(request)
+                chars += len(request.text)
+            self._metrics.batch(len(batch))
+            groups = collections.defaultdict(list)
+            for request in batch:
+                groups[(id(request.engine), request.credential_lines)].append(request)
+            for group in groups.values():
+                try:
+                    self._redact_group(group)
+                except Exception as e:
+                    for request in group:
+                        if not request.future.done():
+                            request.future.set_exception(e)
+
+    @staticmethod
+    def _finish(request, spans):
+        match_counts = {}
+        redacted = apply_spans(request.text, spans, match_counts, request.span_index)
+        request.future.set_result((redacted, match_counts))
+
+    def _redact_group(self, group):
+        engine, credential_lines = group[0].engine, group[0].credential_lines
+        if len(group) == 1 or engine.edge_sensitive:
+            for request in group:
+                self._finish(request, _keyed_redaction_spans(request.text, engine, credential_lines))
+            return
+        joined = _BATCH_SEPARATOR.join(request.text for request in group)
+        per_request = [[] for _ in group]
+        index = 0
+        start_of = 0  # where group[index]'s text starts in joined
+        for start, end, replacement, key in _keyed_redaction_spans(joined, engine, credential_lines):
+            while start >= start_of + len(group[index].text):
+                start_of += len(group[index].text) + len(_BATCH_SEPARATOR)
+                index += 1
+            if start < start_of or end > start_of + len(group[index].text):
+                # A match reaching across texts (a user pattern that matches NUL): scan each one on its own
+                for request in group:
+                    self._finish(request, _keyed_redaction_spans(request.text, engine, credential_lines))
+                return
+            per_request[index].append((start - start_of, end - start_of, replacement, key))
+        for request, spans in zip(group, per_request):
+            self._finish(request, spans)
+
+
+def _file_response(result):
+    matches = result.get("matches") or {}
+    return {
+        "status": "error" if "error" in result else "ok",
+        "output_path": result.get("output_path"),
+        "output_format": result.get("output_format"),
+        "matches": matches,
+        "total_matches": sum(matches.values()),
+        "cached": bool(result.get("cached")),
+        "span_report_path": result.get("span_report_path"),
+        "elapsed_seconds": result.get("elapsed_seconds"),
+        "error": result.get("error"),
+    }
+
+
+class RedactionService:
+    """The redaction side of the server: options, engines, batching, the worker pool and the metrics."""
+
+    def __init__(self, roots=(), workers=None, use_processes=False, cache=None, max_pending_text=DEFAULT_MAX_PENDING_TEXT,
+                 max_pending_files=None, batch_window=BATCH_WINDOW_SECONDS):
+        self.roots = [os.path.realpath(root) for root in roots]
+        self.metrics = Metrics()
+        self.cache = cache
+        workers = max(1, workers or DEFAULT_MAX_WORKERS)
+        executor_class = concurrent.futures.ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        self._executor = executor_class(max_workers=workers)
+        self._batcher = TextBatcher(self.metrics, batch_window)
+        self._workspace = None  # for path requests without an output_dir, created on first use
+        self._workspace_lock = threading.Lock()
+        self.text_admission = _Admission("text", max_pending_text, self.metrics)
+        self.file_admission = _Admission("file", max_pending_files or workers * DEFAULT_MAX_PENDING_FILES_PER_WORKER,
+                                         self.metrics)
+        # Compiles the default selection and builds its engine before the first request needs them
+        self._engine(self.options({}))
+
+    def close(self):
+        self._batcher.close()
+        self._executor.shutdown(wait=True)
+
+    @staticmethod
+    def options(fields):
+        """Redaction options from a JSON body or a query string (where every value is a list)."""
+        def value(name, default=None, choices=None):
+            found = fields.get(name, default)
+            # Query strings give every parameter as a list; the last one wins
+            if isinstance(found, list):
+                found = found[-1] if found else default
+            if choices is not None and found is not None and found not in choices:
+                raise RequestError(f"{name} must be one of: {', '.join(choices)}")
+            return found
+
+        def flag(name):
+            found = value(name, False)
+            return found.lower() in _TRUE_VALUES if isinstance(found, str) else bool(found)
+
+        registry = default_registry()
+        patterns = fields.get("patterns", fields.get("pattern"))
+        if patterns is None:
+            patterns = [key for key in registry.keys() if key != CREDENTIAL_LINES_KEY]
+        if not isinstance(patterns, list) or not all(isinstance(key, str) for key in patterns):
+            raise RequestError("patterns must be a list of pattern keys")
+        unknown = [key for key in patterns if key not in registry]
+        if unknown:
+            raise RequestError(f"Unknown pattern key(s): {', '.join(unknown)}")
+        keywords = fields.get("keywords", fields.get("keyword", []))
+        credential_keywords = fields.get("credential_keywords", fields.get("credential_keyword", []))
+        for name, found in (("keywords", keywords), ("credential_keywords", credential_keywords)):
+            if not isinstance(found, list) or not all(isinstance(item, str) for item in found):
+                raise RequestError(f"{name} must be a list of strings")
+        return {
+            "patterns": patterns,
+            "keywords": keywords,
+            "credential_lines": flag("credential_lines") or bool(credential_keywords) or CREDENTIAL_LINES_KEY in patterns,
+            "credential_keywords": credential_keywords,
+            "pseudonymize": flag("pseudonymize"),
+            "spans": flag("spans"),
+            "span_report": value("span_report", choices=SPAN_REPORT_FORMATS),
+            "output_format": value("output_format", "md", choices=OUTPUT_FORMATS),
+            "pdf_engine": value("pdf_engine", choices=PDF_ENGINES),
+        }
+
+    @staticmethod
+    def _engine(options):
+        return _get_engine(compile_redaction_patterns(options["patterns"]), options["keywords"], options["credential_keywords"])
+
+    def redact_text(self, text, options):
+        if not isinstance(text, str):
+            raise RequestError("text must be a string")
+        engine = self._engine(options)
+        span_index = SpanIndex(options["pseudonymize"]) if options["spans"] or options["pseudonymize"] else None
+        if len(text) <= SMALL_TEXT_CHARS:
+            redacted, match_counts = self._batcher.submit(text, engine, options["credential_lines"], span_index).result()
+        else:
+            match_counts = {}
+            redacted = apply_spans(text, _keyed_redaction_spans(text, engine, options["credential_lines"]), match_counts,
+                                   span_index)
+        response = {"text": redacted, "matches": match_counts}
+        if options["spans"]:
+            response["spans"] = [[start, end, key, f"{hashed:016x}"] for _, start, end, key, hashed in span_index]
+        return response
+
+    def _check_under_root(self, path, what):
+        real = os.path.realpath(path)
+        if not any(real == root or real.startswith(root + os.sep) for root in self.roots):
+            raise RequestError(f"{what} is not under a directory this service may use (see --root)")
+        return real
+
+    def redact_file(self, filepath, output_dir, options):
+        """Redacts a file by path into output_dir (or a workspace); returns the result dict."""
+        if not self.roots:
+            raise RequestError("Redacting by path is disabled; start the service with --root, or upload the file")
+        filepath = self._check_under_root(filepath, "path")
+        if output_dir:
+            return self.process_file(filepath, self._check_under_root(output_dir, "output_dir"), options)
+        with self._workspace_lock:
+            if self._workspace is None:
+                self._workspace = default_workspaces().new_workspace()
+            workspace = self._workspace
+        result = self.process_file(filepath, workspace.output_dir(), options)
+        if "error" not in result:
+            for path in (result.get("output_path"), result.get("span_report_path")):
+                if path:
+                    workspace.manager.track(path)
+                    # Handed over by path, so nothing else will mark it saved: evictable once over the quota
+                    workspace.manager.mark_saved(path)
+        return result
+
+    def process_file(self, filepath, output_dir, options):
+        """Redacts filepath on the worker pool and waits for its result dict; no --root check."""
+        if os.path.splitext(filepath)[1].lower() not in SUPPORTED_EXTENSIONS:
+            raise RequestError(f"Unsupported file type; supported: {', '.join(SUPPORTED_EXTENSIONS)}")
+        future = self._executor.submit(
+            _process_document_timed, filepath, compile_redaction_patterns(options["patterns"]), options["keywords"],
+            options["output_format"], options["credential_lines"], output_dir, self.cache,
+            tuple(options["credential_keywords"]), False, options["span_report"], options["pseudonymize"],
+            options["pdf_engine"])
+        return future.result()
+
+    @contextlib.contextmanager
+    def uploaded(self, filename, body_file, length):
+        """Saves an upload in a workspace of its own and yields (input path, output dir); removed afterwards."""
+        name = os.path.basename(filename or "")
+        if not name:
+            raise RequestError("filename is required for uploads")
+        workspace = default_workspaces().new_workspace()
+        try:
+            input_dir = workspace.output_dir()
+            os.makedirs(input_dir)
+            input_path = os.path.join(input_dir, name)
+            with open(input_path, "wb") as f:
+                remaining = length
+                while remaining:
+                    block = body_file.read(min(remaining, 1024 * 1024))
+                    if not block:
+                        raise RequestError("Request body ended early")
+                    f.write(block)
+                    remaining -= len(block)
+            yield input_path, workspace.output_dir()
+        finally:
+            workspace.remove()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "redax"
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            print(f"DEBUG: {self.address_string()} {format % args}")
+
+    def _send(self, status, body, content_type="application/json; charset=utf-8", headers=()):
+        if not isinstance(body, bytes):
+            body = (json.dumps(body) if content_type.startswith("application/json") else body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        return len(body)
+
+    def _content_length(self):
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            raise RequestError("Invalid Content-Length") from None
+        if length > self.server.max_body_bytes:
+            # The body stays unread, so the connection can't be reused
+            self.close_connection = True
+            raise _TooLarge(f"Request body over {self.server.max_body_bytes} bytes")
+        return length
+
+    def _json_body(self, length):
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError as e:
+            raise RequestError(f"Invalid JSON: {e}") from None
+        if not isinstance(body, dict):
+            raise RequestError("Expected a JSON object")
+        return body
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/health":
+            self._send(HTTPStatus.OK, {"status": "ok"})
+        elif url.path == "/patterns":
+            self._send(HTTPStatus.OK, {"patterns": default_registry().keys()})
+        elif url.path == "/metrics":
+            if parse_qs(url.query).get("format") == ["json"]:
+                self._send(HTTPStatus.OK, self.service.metrics.to_dict())
+            else:
+                self._send(HTTPStatus.OK, self.service.metrics.to_prometheus(), "text/plain; version=0.0.4")
+        else:
+            self._send(HTTPStatus.NOT_FOUND, {"error": f"No such endpoint: {url.path}"})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        endpoint = {"/redact/text": "text", "/redact/file": "file"}.get(url.path)
+        if endpoint is None:
+            self.close_connection = True
+            self._send(HTTPStatus.NOT_FOUND, {"error": f"No such endpoint: {url.path}"})
+            return
+        admission = self.service.text_admission if endpoint == "text" else self.service.file_admission
+        started = time.perf_counter()
+        length = sent = 0
+        error = True
+        try:
+            length = self._content_length()
+            with admission.admit():
+                if endpoint == "text":
+                    body = self._json_body(length)
+                    sent = self._send(HTTPStatus.OK, self.service.redact_text(body.get("text"), self.service.options(body)))
+                    error = False
+                elif self.headers.get("Content-Type", "").split(";")[0].strip() == "application/json":
+                    body = self._json_body(length)
+                    if not isinstance(body.get("path"), str):
+                        raise RequestError("path is required")
+                    result = self.service.redact_file(body["path"], body.get("output_dir"), self.service.options(body))
+                    error = "error" in result
+                    sent = self._send(HTTPStatus.UNPROCESSABLE_ENTITY if error else HTTPStatus.OK, _file_response(result))
+                else:
+                    error, sent = self._upload(url, length)
+        except _TooLarge as e:
+            sent = self._send(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": str(e)})
+        except ServiceBusy as e:
+            # Nothing was read; drop the connection rather than the unread body
+            self.close_connection = True
+            sent = self._send(HTTPStatus.SERVICE_UNAVAILABLE, {"error": str(e)},
+                              headers=[("Retry-After", str(RETRY_AFTER_SECONDS))])
+        except (RequestError, PatternError) as e:
+            # The body may not have been read (e.g. bad upload options)
+            self.close_connection = True
+            sent = self._send(HTTPStatus.BAD_REQUEST, {"error": str(e)})
+        except Exception as e:
+            print(f"ERROR: {endpoint} request failed: {e}")
+            self.close_connection = True
+            sent = self._send(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)})
+        finally:
+            self.service.metrics.observe(endpoint, time.perf_counter() - started, error, length, sent)
+
+    def _upload(self, url, length):
+        """Redacts the uploaded document and sends the output back; returns (error, bytes sent)."""
+        query = parse_qs(url.query)
+        options = self.service.options(query)
+        with self.service.uploaded(query.get("filename", [None])[-1], self.rfile, length) as (input_path, output_dir):
+            result = self.service.process_file(input_path, output_dir, options)
+            if "error" in result:
+                return True, self._send(HTTPStatus.UNPROCESSABLE_ENTITY, _file_response(result))
+            output_path = result["output_path"]
+            size = os.path.getsize(output_path)
+            self.send_response(HTTPStatus.OK)
+            self.send_header("Content-Type", mimetypes.guess_type(output_path)[0] or "application/octet-stream")
+            self.send_header("Content-Length", str(size))
+            self.send_header("Content-Disposition", f'attachment; filename="{os.path.basename(output_path)}"')
+            self.send_header("X-Redax-Matches", json.dumps(result.get("matches") or {}))
+            self.end_headers()
+            with open(output_path, "rb") as f:
+                shutil.copyfileobj(f, self.wfile, 1024 * 1024)
+            return False, size
+
+
+class RedactionServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # socketserver's default backlog of 5 resets connections from clients that fan out requests
+    request_queue_size = 128
+
+    def __init__(self, address, service, max_body_bytes=DEFAULT_MAX_BODY_BYTES, verbose=False):
+        self.service = service
+        self.max_body_bytes = max_body_bytes
+        self.verbose = verbose
+        super().__init__(address, _Handler)
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(prog="python -m redax_server", description="Serve redaction over local HTTP.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"Address to bind (default: {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port (default: {DEFAULT_PORT})")
+    parser.add_argument("--root", dest="roots", action="append", default=[], metavar="DIR",
+                        help="Directory whose files may be redacted by path (repeatable); without one only uploads work")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="File workers (default: CPU count)")
+    parser.add_argument("--processes", action="store_true", help="Use worker processes for files instead of threads")
+    parser.add_argument("--max-pending-text", type=int, default=DEFAULT_MAX_PENDING_TEXT,
+                        help=f"Text requests in flight before answering 503 (default: {DEFAULT_MAX_PENDING_TEXT})")
+    parser.add_argument("--max-pending-files", type=int, default=None,
+                        help=f"File requests in flight before answering 503 (default: {DEFAULT_MAX_PENDING_FILES_PER_WORKER} per worker)")
+    parser.add_argument("--max-body-mb", type=int, default=DEFAULT_MAX_BODY_BYTES // (1024 * 1024),
+                        help="Largest request body accepted")
+    parser.add_argument("--batch-window-ms", type=float, default=BATCH_WINDOW_SECONDS * 1000,
+                        help="How long a small text request waits for others to be scanned with it")
+    parser.add_argument("--pattern-pack", dest="pattern_packs", action="append", default=[], metavar="JSON",
+                        help="Load extra patterns from a JSON pattern pack (repeatable)")
+    parser.add_argument("--pandoc", help="Path to the pandoc executable to use")
+    parser.add_argument("--pandoc-backend", choices=("subprocess", "server"),
+                        help="How pandoc is run: one process per conversion, or a long-lived pandoc server")
+    parser.add_argument("--no-cache", action="store_true", help="Don't use the result cache for files")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    return parser
+
+
+def main(argv=None):
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    try:
+        load_packs_for_workers(args.pattern_packs)
+    except PatternError as e:
+        parser.error(str(e))
+    for root in args.roots:
+        if not os.path.isdir(root):
+            parser.error(f"--root is not a directory: {root}")
+    if args.pandoc:
+        os.environ["PYPANDOC_PANDOC"] = args.pandoc
+    if args.pandoc_backend:
+        os.environ[BACKEND_ENV_VAR] = args.pandoc_backend
+
+    service = RedactionService(args.roots, args.workers, args.processes, None if args.no_cache else ResultCache(),
+                               args.max_pending_text, args.max_pending_files, args.batch_window_ms / 1000)
+    server = RedactionServer((args.host, args.port), service, args.max_body_mb * 1024 * 1024, args.verbose)
+    print(f"INFO: Redaction service listening on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("INFO: Stopping.")
+    finally:
+        server.server_close()
+        service.close()
+        default_workspaces().cleanup()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
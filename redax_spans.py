@@ -0,0 +1,248 @@
+"""
+Span index: what was redacted where, without keeping what was redacted.
+
+Every redaction becomes one row of parallel arrays: the text segment it was
+found in, its start and end offsets, its pattern key (an index into a small
+key table) and a keyed 64-bit hash of the original value. A document with a
+hundred thousand matches costs a few megabytes, not a hundred thousand dicts.
+
+Segments: a .md/.txt file is a single segment 0 and offsets are into the
+whole file (.rtf: into its plain text for Markdown output, otherwise into its
+Markdown conversion). Office documents are redacted a paragraph (docx, pptx)
+or a cell (xlsx) at a time; segment n is the n-th such block in the order the
+package is read, with offsets within it.
+
+Hashes are keyed (BLAKE2b), so a report can be handed to a reviewer without
+letting them confirm a guessed phone number by hashing it. The key comes from
+$REDAX_SPAN_KEY, or is generated once and kept in the user cache directory, so
+hashes agree across runs and worker processes on one machine.
+
+With pseudonymize, each match is replaced by a token derived from its hash,
+e.g. [EMAIL_ADDRESS-3f9a2c1b] instead of [REDACTED]: the same value gets the
+same token in every document, with no extra scan and no lookup table.
+"""
+import csv
+import hashlib
+import json
+import os
+import threading
+from array import array
+
+from redax_cache import user_cache_dir
+from redax_engine import CREDENTIAL_LINES_KEY
+from redax_workspace import partial_path_for, remove_quietly
+
+SPAN_KEY_ENV_VAR = "REDAX_SPAN_KEY"
+SPAN_KEY_FILE_NAME = "span-key"
+SPAN_REPORT_FORMATS = ("json", "csv")
+SPAN_REPORT_VERSION = 1
+_SPAN_KEY_BYTES = 32
+_CSV_FIELDS = ("segment", "start", "end", "key", "value_hash")
+_PATTERN_KEY_PREFIX = "redact_"
+# Whole redacted lines keep their placeholder: a line is not a value worth tracking across documents
+_UNPSEUDONYMIZED_KEYS = (CREDENTIAL_LINES_KEY,)
+
+_span_key = None
+_span_key_lock = threading.Lock()
+
+
+def _load_span_key():
+    configured = os.environ.get(SPAN_KEY_ENV_VAR)
+    if configured:
+        return hashlib.blake2b(configured.encode("utf-8"), digest_size=_SPAN_KEY_BYTES).digest()
+    path = os.path.join(user_cache_dir(), SPAN_KEY_FILE_NAME)
+    try:
+        with open(path, "rb") as f:
+            key = f.read()
+        if len(key) == _SPAN_KEY_BYTES:
+            return key
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"WARNING: Could not read span key {path}: {e}")
+    key = os.urandom(_SPAN_KEY_BYTES)
+    partial_path = partial_path_for(path)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd = os.open(partial_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(key)
+        try:
+            # Fails if another process created the key first; then theirs is the one to use
+            os.link(partial_path, path)
+        except FileExistsError:
+            with open(path, "rb") as f:
+                key = f.read()
+    except OSError as e:
+        print(f"WARNING: Could not save span key {path}: {e}; hashes and pseudonyms will differ between runs")
+    finally:
+        remove_quietly(partial_path)
+    return key
+
+
+def span_key():
+    """The secret key value hashes are made with."""
+    global _span_key
+    with _span_key_lock:
+        if _span_key is None:
+            _span_key = _load_span_key()
+        return _span_key
+
+
+def span_key_id():
+    """A fingerprint of span_key(), e.g. for cache keys: outputs made with another key have other pseudonyms."""
+    return hashlib.sha256(span_key()).hexdigest()[:16]
+
+
+def value_hash(value, key=None):
+    """Keyed 64-bit hash of a redacted value."""
+    digest = hashlib.blake2b(value.encode("utf-8", "surrogatepass"), digest_size=8, key=key or span_key()).digest()
+    return int.from_bytes(digest, "big")
+
+
+class ValueHasher:
+    """value_hash() of a value fed in pieces, for one too long to hold in memory at once."""
+
+    __slots__ = ("_hash",)
+
+    def __init__(self, key=None):
+        self._hash = hashlib.blake2b(digest_size=8, key=key or span_key())
+
+    def update(self, piece):
+        self._hash.update(piece.encode("utf-8", "surrogatepass"))
+
+    def value(self):
+        return int.from_bytes(self._hash.digest(), "big")
+
+
+def pseudonym(pattern_key, hashed_value):
+    """The token that replaces a value in pseudonymized output, e.g. [EMAIL_ADDRESS-3f9a2c1b]."""
+    label = pattern_key[len(_PATTERN_KEY_PREFIX):] if pattern_key.startswith(_PATTERN_KEY_PREFIX) else pattern_key
+    return f"[{label.upper()}-{hashed_value >> 32:08x}]"
+
+
+def span_report_path(output_path, report_format):
+    """Where the span report of an output goes: report_redacted.spans.json next to report_redacted.docx."""
+    return f"{os.path.splitext(output_path)[0]}.spans.{report_format}"
+
+
+class SpanIndex:
+    """The redactions of one document, as parallel arrays. Not thread-safe; one per document."""
+
+    __slots__ = ("segments", "starts", "ends", "key_ids", "hashes", "keys", "pseudonymize", "segment_count",
+                 "_key_ids", "_hash_key")
+
+    def __init__(self, pseudonymize=False, hash_key=None):
+        self.segments = array("L")
+        self.starts = array("Q")
+        self.ends = array("Q")
+        self.key_ids = array("H")
+        self.hashes = array("Q")
+        self.keys = []  # key id -> pattern key
+        self.pseudonymize = pseudonymize
+        self.segment_count = 0
+        self._key_ids = {}
+        self._hash_key = hash_key or span_key()
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        """Yields (segment, start, end, key, value_hash) per redaction, in the order they were made."""
+        keys = self.keys
+        return zip(self.segments, self.starts, self.ends, (keys[i] for i in self.key_ids), self.hashes)
+
+    def new_segment(self):
+        """Number of the next text block handed to the engine."""
+        segment = self.segment_count
+        self.segment_count += 1
+        return segment
+
+    def record(self, text, start, end, replacement, key, segment=0, offset=0):
+        """Adds text[start:end] (at offset + start in the segment) to the index and returns what replaces it."""
+        return self.record_hashed(value_hash(text[start:end], self._hash_key), offset + start, offset + end,
+                                  replacement, key, segment)
+
+    def hasher(self):
+        """A ValueHasher with this index's key, for record_hashed()."""
+        return ValueHasher(self._hash_key)
+
+    def record_hashed(self, hashed, start, end, replacement, key, segment=0):
+        """Like record(), for a value already hashed, at start:end in the segment."""
+        key_id = self._key_ids.get(key)
+        if key_id is None:
+            key_id = self._key_ids[key] = len(self.keys)
+            self.keys.append(key)
+        self.segments.append(segment)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.key_ids.append(key_id)
+        self.hashes.append(hashed)
+        if self.pseudonymize and key not in _UNPSEUDONYMIZED_KEYS:
+            return pseudonym(key, hashed)
+        return replacement
+
+    def counts(self):
+        """{pattern key: number of redactions}."""
+        counts = [0] * len(self.keys)
+        for key_id in self.key_ids:
+            counts[key_id] += 1
+        return dict(zip(self.keys, counts))
+
+    def to_dict(self):
+        return {
+            "version": SPAN_REPORT_VERSION,
+            "pseudonymized": self.pseudonymize,
+            "keys": self.keys,
+            "segments": self.segment_count,
+            # Rows rather than objects, and hashes as hex: JSON readers lose precision on 64-bit integers
+            "columns": list(_CSV_FIELDS[:3]) + ["key_id", "value_hash"],
+            "spans": [[segment, start, end, key_id, f"{hashed:016x}"] for segment, start, end, key_id, hashed
+                      in zip(self.segments, self.starts, self.ends, self.key_ids, self.hashes)],
+        }
+
+    def write(self, path, report_format="json"):
+        """Writes the index as a JSON or CSV report, atomically."""
+        if report_format not in SPAN_REPORT_FORMATS:
+            raise ValueError(f"Unknown span report format: {report_format}")
+        partial_path = partial_path_for(path)
+        try:
+            with open(partial_path, "w", encoding="utf-8", newline="") as f:
+                if report_format == "json":
+                    json.dump(self.to_dict(), f, separators=(",", ":"))
+                else:
+                    writer = csv.writer(f)
+                    writer.writerow(_CSV_FIELDS)
+                    writer.writerows((segment, start, end, key, f"{hashed:016x}")
+                                     for segment, start, end, key, hashed in self)
+            os.replace(partial_path, path)
+        finally:
+            remove_quietly(partial_path)
+
+
+def apply_spans(text, keyed_spans, match_counts=None, span_index=None, segment=None, offset=0):
+    """
+    Rewrites text from sorted, non-overlapping (start, end, replacement, key) spans in one pass.
+
+    Each span is counted in match_counts and recorded in span_index (which also
+    picks the replacement when pseudonymizing), in segment (by default a new
+    one) at offset.
+    """
+    if not keyed_spans:
+        if span_index is not None and segment is None:
+            span_index.new_segment()
+        return text
+    if span_index is not None and segment is None:
+        segment = span_index.new_segment()
+    pieces = []
+    last_end = 0
+    for start, end, replacement, key in keyed_spans:
+        pieces.append(text[last_end:start])
+        if span_index is not None:
+            replacement = span_index.record(text, start, end, replacement, key, segment, offset)
+        pieces.append(replacement)
+        last_end = end
+        if match_counts is not None:
+            match_counts[key] = match_counts.get(key, 0) + 1
+    pieces.append(text[last_end:])
+    return "".join(pieces)
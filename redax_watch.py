@@ -0,0 +1,416 @@
+"""
+Watch mode: redact documents as they arrive in (or change in) drop folders.
+
+    python -m redax --watch ./dropbox -o ./redacted
+
+Changes are picked up with inotify on Linux (through ctypes, no extra package)
+and by polling elsewhere, or when inotify is unavailable. A file is only
+queued once it has been quiet for the debounce interval, so a document that
+is still being copied is not redacted halfway.
+
+A manifest in the output directory records the mtime, size and content hash of
+every file redacted, and the options it was redacted with. A restart therefore
+only redacts what is new or changed: files whose mtime and size match are
+skipped outright, and files that were merely touched are caught by their hash.
+Changing the patterns, keywords or output format redacts everything again.
+
+Files are fed through a bounded queue to a fixed number of worker threads;
+when the workers fall behind, ready files wait in the pending set instead of
+piling up in memory as queued work.
+"""
+import ctypes
+import ctypes.util
+import errno
+import hashlib
+import json
+import os
+import queue
+import select
+import struct
+import sys
+import threading
+import time
+
+from redax_cache import file_content_hash, redaction_options
+from redax_logic import DEFAULT_MAX_WORKERS, SUPPORTED_EXTENSIONS, process_document_for_redaction
+from redax_pdf import resolve_pdf_engine_name
+from redax_workspace import partial_path_for, remove_quietly
+
+MANIFEST_FILE_NAME = ".redax-watch.json"
+MANIFEST_VERSION = 1
+DEFAULT_DEBOUNCE_SECONDS = 2.0
+DEFAULT_POLL_INTERVAL_SECONDS = 2.0
+# Ready files handed to the workers at once, per worker
+QUEUE_SLOTS_PER_WORKER = 2
+# The manifest is rewritten at most this often while files keep arriving (and always on exit)
+MANIFEST_SAVE_INTERVAL_SECONDS = 5.0
+# How long the watch loop waits for events before checking debounce timers and the stop flag
+_TICK_SECONDS = 0.25
+
+# <sys/inotify.h>
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = _IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+_READ_SIZE = 64 * 1024
+
+
+def _wanted(filename):
+    # Hidden files, Office lock files (~$report.docx) and partial outputs are never documents to redact
+    if filename.startswith((".", "~$")):
+        return False
+    return os.path.splitext(filename)[1].lower() in SUPPORTED_EXTENSIONS
+
+
+def _walk_wanted(directory):
+    for dirpath, dirnames, filenames in os.walk(directory):
+        dirnames[:] = sorted(name for name in dirnames if not name.startswith("."))
+        for filename in sorted(filenames):
+            if _wanted(filename):
+                yield os.path.join(dirpath, filename)
+
+
+class _InotifySource:
+    """Linux inotify through ctypes: one watch per directory, new subdirectories watched as they appear."""
+
+    name = "inotify"
+
+    def __init__(self, roots):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self._fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._roots = list(roots)
+        self._watches = {}  # watch descriptor -> directory
+        for root in self._roots:
+            self._watch_tree(root)
+
+    def _watch_tree(self, directory):
+        for dirpath, dirnames, _ in os.walk(directory):
+            dirnames[:] = [name for name in dirnames if not name.startswith(".")]
+            wd = self._add_watch(self._fd, os.fsencode(dirpath), _WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                if error == errno.ENOSPC:
+                    raise OSError(error, "inotify watch limit reached (see fs.inotify.max_user_watches)")
+                continue  # removed again before it could be watched
+            self._watches[wd] = dirpath
+
+    def wait(self, timeout):
+        """Paths that changed within timeout seconds; a directory means everything under it."""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self._fd, _READ_SIZE)
+        except BlockingIOError:
+            return []
+        changed = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, name_length = _EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + name_length].rstrip(b"\0")
+            offset += _EVENT_HEADER.size + name_length
+            if mask & _IN_Q_OVERFLOW:
+                # The kernel dropped events: look at everything again
+                changed.extend(self._roots)
+                continue
+            if mask & _IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            directory = self._watches.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, os.fsdecode(name))
+            if mask & _IN_ISDIR:
+                if mask & (_IN_CREATE | _IN_MOVED_TO) and not os.path.basename(path).startswith("."):
+                    # Files may have landed in it before the watch was added
+                    self._watch_tree(path)
+                    changed.append(path)
+            else:
+                changed.append(path)
+        return changed
+
+    def close(self):
+        os.close(self._fd)
+
+
+class _PollingSource:
+    """Rescans the watched directories every interval and reports files whose mtime or size changed."""
+
+    name = "polling"
+
+    def __init__(self, roots, interval):
+        self._roots = list(roots)
+        self._interval = interval
+        self._snapshot = self._scan()
+        self._next_scan = time.monotonic() + interval
+
+    def _scan(self):
+        snapshot = {}
+        for root in self._roots:
+            for path in _walk_wanted(root):
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def wait(self, timeout):
+        delay = self._next_scan - time.monotonic()
+        if delay > timeout:
+            time.sleep(timeout)
+            return []
+        time.sleep(max(0.0, delay))
+        snapshot = self._scan()
+        self._next_scan = time.monotonic() + self._interval
+        changed = [path for path, signature in snapshot.items() if self._snapshot.get(path) != signature]
+        self._snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+
+class WatchManifest:
+    """What has been redacted so far, per file: mtime, size, content hash and output path. Kept as JSON across restarts."""
+
+    def __init__(self, path, options_digest):
+        self.path = path
+        self.options_digest = options_digest
+        self._files = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._saved_at = 0.0
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"WARNING: Ignoring unreadable watch manifest {path}: {e}")
+            return
+        if data.get("version") != MANIFEST_VERSION or data.get("options") != options_digest:
+            print(f"INFO: Redaction options changed since {path} was written; every file will be redacted again")
+            return
+        self._files = data.get("files", {})
+
+    def __len__(self):
+        return len(self._files)
+
+    def unchanged(self, path, stat):
+        """True if path was redacted with this mtime and size and its output is still there."""
+        with self._lock:
+            entry = self._files.get(path)
+        return (entry is not None and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size
+                and os.path.exists(entry["output_path"]))
+
+    def same_content(self, path, content_hash):
+        with self._lock:
+            entry = self._files.get(path)
+        return entry is not None and entry["sha256"] == content_hash and os.path.exists(entry["output_path"])
+
+    def record(self, path, stat, content_hash, output_path):
+        with self._lock:
+            self._files[path] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha256": content_hash,
+                                 "output_path": output_path, "redacted_at": time.time()}
+            self._dirty = True
+
+    def touch(self, path, stat):
+        """The file's mtime changed but its content didn't."""
+        with self._lock:
+            entry = self._files.get(path)
+            if entry is not None:
+                entry["mtime_ns"], entry["size"] = stat.st_mtime_ns, stat.st_size
+                self._dirty = True
+
+    def forget(self, path):
+        with self._lock:
+            if self._files.pop(path, None) is not None:
+                self._dirty = True
+
+    def save(self, force=False):
+        """Writes the manifest atomically if anything changed (and, unless force, not too recently)."""
+        with self._lock:
+            if not self._dirty or (not force and time.monotonic() - self._saved_at < MANIFEST_SAVE_INTERVAL_SECONDS):
+                return
+            data = json.dumps({"version": MANIFEST_VERSION, "options": self.options_digest, "files": self._files})
+            self._dirty = False
+            self._saved_at = time.monotonic()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        partial_path = partial_path_for(self.path)
+        try:
+            with open(partial_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(partial_path, self.path)
+        except OSError as e:
+            print(f"WARNING: Could not save watch manifest {self.path}: {e}")
+            with self._lock:
+                self._dirty = True
+        finally:
+            remove_quietly(partial_path)
+
+
+def options_digest(active_patterns_compiled, custom_keywords, output_format, redact_credential_lines, credential_keywords,
+                   span_report=None, pseudonymize=False, pdf_engine=None):
+    """Identifies the redaction options; outputs made with other options don't count as up to date."""
+    options = redaction_options(active_patterns_compiled, custom_keywords, redact_credential_lines, output_format,
+                                credential_keywords, pseudonymize, pdf_engine, span_report)
+    return hashlib.sha256(json.dumps(options, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class Watcher:
+    """
+    Watches directories and redacts new or changed documents into output_dir, mirroring the directory layout.
+
+    on_result(path, result) is called from a worker thread after each file.
+    run() blocks until stop_event is set.
+    """
+
+    def __init__(self, directories, output_dir, active_patterns_compiled, custom_keywords=(), output_format="md",
+                 redact_credential_lines=False, credential_keywords=(), manifest_path=None,
+                 debounce_seconds=DEFAULT_DEBOUNCE_SECONDS, workers=None, queue_size=None, use_polling=False,
+                 poll_interval=DEFAULT_POLL_INTERVAL_SECONDS, on_result=None, span_report=None, pseudonymize=False,
+                 pdf_engine=None):
+        self.roots = [os.path.abspath(directory) for directory in directories]
+        for root in self.roots:
+            if not os.path.isdir(root):
+                raise ValueError(f"Not a directory: {root}")
+        self.output_dir = os.path.abspath(output_dir)
+        self._patterns = active_patterns_compiled
+        self._keywords = list(custom_keywords or ())
+        self._output_format = output_format
+        self._credential_lines = redact_credential_lines
+        self._credential_keywords = tuple(credential_keywords or ())
+        self._span_report = span_report
+        self._pseudonymize = pseudonymize
+        self._pdf_engine = resolve_pdf_engine_name(pdf_engine) if output_format == "pdf" else None
+        self._debounce = debounce_seconds
+        self._workers = max(1, workers or DEFAULT_MAX_WORKERS)
+        self._queue = queue.Queue(maxsize=queue_size or self._workers * QUEUE_SLOTS_PER_WORKER)
+        self._use_polling = use_polling
+        self._poll_interval = poll_interval
+        self._on_result = on_result
+        self.manifest = WatchManifest(
+            manifest_path or os.path.join(self.output_dir, MANIFEST_FILE_NAME),
+            options_digest(active_patterns_compiled, custom_keywords, output_format, redact_credential_lines, credential_keywords,
+                           span_report, pseudonymize, self._pdf_engine))
+        self._pending = {}  # path -> time of its last change
+        self._active = set()  # queued or being redacted
+        self._lock = threading.Lock()
+
+    def _make_source(self):
+        if not self._use_polling and sys.platform.startswith("linux"):
+            try:
+                return _InotifySource(self.roots)
+            except (OSError, AttributeError) as e:
+                print(f"WARNING: inotify unavailable ({e}); polling every {self._poll_interval}s instead")
+        return _PollingSource(self.roots, self._poll_interval)
+
+    def _output_dir_for(self, path):
+        for root in self.roots:
+            if path.startswith(root + os.sep):
+                relative_dir = os.path.relpath(os.path.dirname(path), root)
+                return self.output_dir if relative_dir == os.curdir else os.path.join(self.output_dir, relative_dir)
+        return self.output_dir
+
+    def _note_change(self, path, when):
+        path = os.path.abspath(path)
+        if path == self.output_dir or path.startswith(self.output_dir + os.sep):
+            return  # our own outputs, when the output directory is inside a watched one
+        if os.path.isdir(path):
+            for filepath in _walk_wanted(path):
+                self._note_change(filepath, when)
+        elif _wanted(os.path.basename(path)):
+            self._pending[path] = when
+
+    def _dispatch(self):
+        """Queues files that have been quiet for the debounce interval, as long as the queue has room."""
+        ready_before = time.monotonic() - self._debounce
+        for path, changed_at in sorted(self._pending.items(), key=lambda item: item[1]):
+            if changed_at > ready_before:
+                break
+            with self._lock:
+                if path in self._active:
+                    continue  # looked at again once the running redaction finishes
+                try:
+                    self._queue.put_nowait(path)
+                except queue.Full:
+                    return
+                self._active.add(path)
+            del self._pending[path]
+
+    def _work(self):
+        while True:
+            path = self._queue.get()
+            if path is None:
+                return
+            try:
+                self._process(path)
+            except Exception as e:
+                print(f"ERROR: Watch worker failed on {path}: {e}")
+            finally:
+                with self._lock:
+                    self._active.discard(path)
+
+    def _process(self, path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self.manifest.forget(path)
+            return
+        if self.manifest.unchanged(path, stat):
+            return
+        content_hash = file_content_hash(path)
+        if self.manifest.same_content(path, content_hash):
+            self.manifest.touch(path, stat)
+            return
+        started = time.perf_counter()
+        result = process_document_for_redaction(path, self._patterns, self._keywords, self._output_format,
+                                                self._credential_lines, self._output_dir_for(path), self._credential_keywords,
+                                                span_report=self._span_report, pseudonymize=self._pseudonymize,
+                                                pdf_engine=self._pdf_engine)
+        result["elapsed_seconds"] = round(time.perf_counter() - started, 4)
+        if "error" not in result:
+            # The stat from before redacting: a change made meanwhile makes the file look changed again
+            self.manifest.record(path, stat, content_hash, result["output_path"])
+        if self._on_result is not None:
+            self._on_result(path, result)
+
+    def run(self, stop_event=None):
+        stop_event = stop_event or threading.Event()
+        source = self._make_source()
+        print(f"INFO: Watching {', '.join(self.roots)} ({source.name}); "
+              f"{len(self.manifest)} file(s) already redacted")
+        workers = [threading.Thread(target=self._work, name=f"redax-watch-{i}", daemon=True) for i in range(self._workers)]
+        for worker in workers:
+            worker.start()
+        # The backlog: whatever is already there is checked against the manifest straight away
+        backlog_time = time.monotonic() - self._debounce
+        for root in self.roots:
+            self._note_change(root, backlog_time)
+        try:
+            while not stop_event.is_set():
+                now = time.monotonic()
+                for path in source.wait(_TICK_SECONDS):
+                    self._note_change(path, now)
+                self._dispatch()
+                self.manifest.save()
+        finally:
+            source.close()
+            for _ in workers:
+                self._queue.put(None)  # after the files already queued
+            for worker in workers:
+                worker.join()
+            self.manifest.save(force=True)
@@ -0,0 +1,208 @@
+"""
+Scratch space for redaction outputs that have no destination yet.
+
+Every batch gets its own Workspace: a uniquely named directory under the
+system temp dir, with one subdirectory per input file. Parallel batches, several
+app instances and two inputs called report.docx from different folders
+therefore never write to the same path.
+
+Outputs are written under a hidden partial name next to their final path and
+renamed into place once complete (partial_path_for), so a crash or a failed
+conversion never leaves a half-written file behind under the real name.
+
+WorkspaceManager keeps the workspaces of this process within a disk quota.
+Outputs that have been saved elsewhere are evicted first, oldest first;
+outputs nobody has saved yet are never removed behind the user's back.
+"""
+import itertools
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+WORKSPACE_DIR_NAME = "redax"
+WORKSPACE_MAX_BYTES_ENV_VAR = "REDAX_WORKSPACE_MAX_BYTES"
+DEFAULT_WORKSPACE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+# Workspaces left behind by a process that crashed are removed once this old
+STALE_WORKSPACE_SECONDS = 24 * 60 * 60
+_WORKSPACE_PREFIX = "batch-"
+_PARTIAL_MARKER = ".partial-"
+
+
+def workspace_root():
+    return os.path.join(tempfile.gettempdir(), WORKSPACE_DIR_NAME)
+
+
+def partial_path_for(path):
+    """A unique hidden name next to path to write to before renaming; keeps the extension, pandoc goes by it."""
+    directory, name = os.path.split(path)
+    base, ext = os.path.splitext(name)
+    return os.path.join(directory, f".{base}{_PARTIAL_MARKER}{uuid.uuid4().hex[:12]}{ext}")
+
+
+def remove_quietly(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _owner_running(workspace_name):
+    """Whether the process that created a workspace (batch-<pid>-...) is still alive. Windows only knows about itself."""
+    try:
+        pid = int(workspace_name[len(_WORKSPACE_PREFIX):].split("-", 1)[0])
+    except ValueError:
+        return False
+    if os.name == "nt":
+        return pid == os.getpid()
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+class Workspace:
+    """One batch's scratch directory; output_dir(index) is where file number index of the batch goes."""
+
+    def __init__(self, manager, path):
+        self.manager = manager
+        self.path = path
+        self._unnamed = itertools.count()
+
+    def output_dir(self, index=None):
+        """A directory for one file's output (created by whoever writes to it); a fresh one if index is None."""
+        name = f"{index:05d}" if index is not None else f"extra-{next(self._unnamed):05d}"
+        return os.path.join(self.path, name)
+
+    def remove(self):
+        self.manager.remove_workspace(self)
+
+
+class WorkspaceManager:
+    """Creates workspaces, tracks the outputs in them and keeps their total size within max_bytes."""
+
+    def __init__(self, root=None, max_bytes=None):
+        self.root = root or workspace_root()
+        if max_bytes is None:
+            max_bytes = int(os.environ.get(WORKSPACE_MAX_BYTES_ENV_VAR) or DEFAULT_WORKSPACE_MAX_BYTES)
+        self.max_bytes = max_bytes
+        self._workspaces = []
+        self._outputs = {}  # output path -> [size, saved_at or None]
+        self._shared = None
+        self._lock = threading.RLock()
+        self._stale_checked = False
+
+    def new_workspace(self):
+        os.makedirs(self.root, exist_ok=True)
+        self._remove_stale_workspaces()
+        workspace = Workspace(self, tempfile.mkdtemp(prefix=f"{_WORKSPACE_PREFIX}{os.getpid()}-", dir=self.root))
+        with self._lock:
+            self._workspaces.append(workspace)
+        return workspace
+
+    def scratch_dir(self):
+        """A fresh output directory for a single document processed outside any batch."""
+        with self._lock:
+            if self._shared is None:
+                self._shared = self.new_workspace()
+            return self._shared.output_dir()
+
+    def _remove_stale_workspaces(self):
+        if self._stale_checked:
+            return
+        self._stale_checked = True
+        cutoff = time.time() - STALE_WORKSPACE_SECONDS
+        try:
+            entries = list(os.scandir(self.root))
+        except OSError:
+            return
+        for entry in entries:
+            try:
+                if (entry.name.startswith(_WORKSPACE_PREFIX) and entry.is_dir() and entry.stat().st_mtime < cutoff
+                        and not _owner_running(entry.name)):
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                    print(f"INFO: Removed stale workspace {entry.path}")
+            except OSError:
+                continue
+
+    def track(self, output_path):
+        """Counts a finished output towards the quota, then evicts saved outputs if over it."""
+        try:
+            size = os.path.getsize(output_path)
+        except OSError:
+            return
+        with self._lock:
+            self._outputs[output_path] = [size, None]
+        self.enforce_quota()
+
+    def mark_saved(self, output_path):
+        """The output has been copied to where the user wanted it, so it may be evicted."""
+        with self._lock:
+            if output_path in self._outputs:
+                self._outputs[output_path][1] = time.time()
+        self.enforce_quota()
+
+    def release(self, output_path):
+        """The output has been moved out of the workspace; stop counting it."""
+        with self._lock:
+            self._outputs.pop(output_path, None)
+
+    def size(self):
+        with self._lock:
+            return sum(size for size, _ in self._outputs.values())
+
+    def enforce_quota(self):
+        """Evicts saved outputs, oldest save first, until within max_bytes. Returns the bytes freed."""
+        with self._lock:
+            total = sum(size for size, _ in self._outputs.values())
+            if total <= self.max_bytes:
+                return 0
+            saved = sorted((saved_at, path) for path, (_, saved_at) in self._outputs.items() if saved_at is not None)
+            freed = 0
+            for _, path in saved:
+                if total - freed <= self.max_bytes:
+                    break
+                remove_quietly(path)
+                freed += self._outputs.pop(path)[0]
+            over = total - freed - self.max_bytes
+        if over > 0:
+            print(f"WARNING: Redaction outputs not saved yet exceed the workspace quota by {over} bytes")
+        return freed
+
+    def remove_workspace(self, workspace):
+        prefix = workspace.path + os.sep
+        with self._lock:
+            if workspace in self._workspaces:
+                self._workspaces.remove(workspace)
+            if workspace is self._shared:
+                self._shared = None
+            for path in [path for path in self._outputs if path.startswith(prefix)]:
+                del self._outputs[path]
+        shutil.rmtree(workspace.path, ignore_errors=True)
+
+    def cleanup(self):
+        """Removes every workspace this manager created."""
+        with self._lock:
+            workspaces = list(self._workspaces)
+        for workspace in workspaces:
+            self.remove_workspace(workspace)
+        if workspaces:
+            print(f"INFO: Cleaned up {len(workspaces)} workspace(s) under {self.root}")
+
+
+_default_manager = None
+_default_manager_lock = threading.Lock()
+
+
+def default_workspaces():
+    """The process-wide WorkspaceManager."""
+    global _default_manager
+    with _default_manager_lock:
+        if _default_manager is None:
+            _default_manager = WorkspaceManager()
+        return _default_manager
@@ -0,0 +1,93 @@
+import os
+
+import redax_cache
+from redax_cache import ResultCache
+
+
+def _put(cache, tmp_path, name, size):
+    output = tmp_path / f"{name}.md"
+    output.write_bytes(b"x" * size)
+    assert cache.put(name * 8, str(output), {"matches": {}})
+
+
+def _count_scans(cache, monkeypatch):
+    scans = []
+    entries = ResultCache._entries
+
+    def counting_entries(self):
+        scans.append(1)
+        return entries(self)
+    monkeypatch.setattr(ResultCache, "_entries", counting_entries)
+    return scans
+
+
+def test_puts_within_budget_do_not_rescan_the_cache(tmp_path, monkeypatch):
+    cache = ResultCache(str(tmp_path / "cache"), max_bytes=1024 * 1024)
+    scans = _count_scans(cache, monkeypatch)
+    for i in range(10):
+        _put(cache, tmp_path, f"{i:02d}", 100)
+    # One scan to learn the size, then the running estimate
+    assert len(scans) == 1
+
+
+def test_eviction_still_keeps_the_cache_within_budget(tmp_path, monkeypatch):
+    cache = ResultCache(str(tmp_path / "cache"), max_bytes=1000)
+    for i in range(20):
+        _put(cache, tmp_path, f"{i:02d}", 200)
+    assert cache.size() <= 1000
+    # The most recent entries are the ones kept
+    assert os.path.exists(cache._entry_path("19" * 8))
+
+
+def test_other_writers_are_caught_up_with(tmp_path, monkeypatch):
+    monkeypatch.setattr(redax_cache, "EVICTION_RESCAN_PUTS", 4)
+    directory = str(tmp_path / "cache")
+    cache = ResultCache(directory, max_bytes=2000)
+    _put(cache, tmp_path, "aa", 100)
+    # Written by another process: not in this process's estimate
+    with monkeypatch.context() as m:
+        m.setattr(redax_cache, "_size_estimates", {})
+        for i in range(5):
+            _put(ResultCache(directory, max_bytes=10 ** 9), tmp_path, f"b{i}", 500)
+    for i in range(4):
+        _put(cache, tmp_path, f"c{i}", 10)
+    assert cache.size() <= 2000
+
+
+def test_key_changes_with_a_patterns_validator(tmp_path, monkeypatch):
+    from redax_patterns import PatternDefinition, PatternRegistry
+
+    source = tmp_path / "in.txt"
+    source.write_text("staff 123456782\n", encoding="utf-8")
+    cache = ResultCache(str(tmp_path / "cache"))
+
+    def key_with(definition):
+        registry = PatternRegistry([definition])
+        monkeypatch.setattr(redax_cache, "default_registry", lambda: registry)
+        return cache.key_for(str(source), registry.compile(["staff_id"]), [], False, "md")
+
+    plain = key_with(PatternDefinition("staff_id", r"\b\d{9}\b", examples=("123456782",)))
+    validated = key_with(PatternDefinition("staff_id", r"\b\d{9}\b", examples=("123456782",), validator="au_tfn"))
+    prefiltered = key_with(PatternDefinition("staff_id", r"\b\d{9}\b", examples=("123456782",), validator="au_tfn",
+                                             min_digits=9))
+    assert len({plain, validated, prefiltered}) == 3
+
+
+def test_watch_manifest_and_cache_key_share_their_options(tmp_path, monkeypatch):
+    import redax_watch
+
+    source = tmp_path / "in.txt"
+    source.write_text("x\n", encoding="utf-8")
+    cache = ResultCache(str(tmp_path / "cache"))
+    args = ({"redact_email_address": r"\S+@\S+"}, ["Falcon"], False, "md")
+
+    def key_and_digest():
+        return cache.key_for(str(source), *args), redax_watch.options_digest(*args, ())
+
+    before = key_and_digest()
+    options = redax_cache.redaction_options
+    # A new option added in one place reaches both
+    monkeypatch.setattr(redax_cache, "redaction_options", lambda *a, **k: {**options(*a, **k), "new_option": 1})
+    monkeypatch.setattr(redax_watch, "redaction_options", redax_cache.redaction_options)
+    after = key_and_digest()
+    assert before[0] != after[0] and before[1] != after[1]
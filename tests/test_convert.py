@@ -0,0 +1,42 @@
+"""PandocServerBackend falling back to a pandoc process."""
+from redax_convert import PandocServerBackend
+
+
+class _RecordingBackend:
+    name = "recording"
+
+    def __init__(self):
+        self.calls = []
+
+    def convert_text(self, source, to, from_format, outputfile=None, extra_args=()):
+        self.calls.append(("text", source, to, from_format))
+        return "converted"
+
+    def convert_file(self, source_path, to, from_format, outputfile=None, extra_args=()):
+        self.calls.append(("file", source_path, to, from_format))
+        return "converted"
+
+
+def _dropping_server(monkeypatch):
+    fallback = _RecordingBackend()
+    backend = PandocServerBackend(fallback=fallback)
+    monkeypatch.setattr(backend, "_usable_for", lambda to, extra_args: {})
+
+    def connection_dropped(path, payload):
+        raise ConnectionResetError("connection reset by peer")
+
+    monkeypatch.setattr(backend, "_post", connection_dropped)
+    return backend, fallback
+
+
+def test_fallback_gets_the_original_bytes(monkeypatch):
+    backend, fallback = _dropping_server(monkeypatch)
+    docx_bytes = b"PK\x03\x04 not really a docx"
+    assert backend.convert_text(docx_bytes, "markdown", "docx") == "converted"
+    assert fallback.calls == [("text", docx_bytes, "markdown", "docx")]
+
+
+def test_fallback_gets_the_original_text(monkeypatch):
+    backend, fallback = _dropping_server(monkeypatch)
+    assert backend.convert_text("# Title", "html5", "markdown") == "converted"
+    assert fallback.calls == [("text", "# Title", "html5", "markdown")]
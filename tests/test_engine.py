@@ -0,0 +1,137 @@
+"""RedactionEngine against the pipeline it replaced: every pattern, then every keyword, substituted in turn."""
+import os
+import re
+
+import pytest
+
+from redax_engine import CREDENTIAL_LINES_KEY, REDACTION_PLACEHOLDER, RedactionEngine
+from redax_patterns import default_registry
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "data", "engine_regression.txt")
+KEYWORDS = ("Falcon", "Project Falcon")
+
+
+def _corpus():
+    with open(CORPUS_PATH, "r", encoding="utf-8") as f:
+        return [line.rstrip("\n") for line in f if line.strip() and not line.startswith("#")]
+
+
+CORPUS = _corpus()
+
+
+@pytest.fixture(scope="module")
+def patterns():
+    registry = default_registry()
+    return registry.compile([key for key in registry.keys() if key != CREDENTIAL_LINES_KEY])
+
+
+@pytest.fixture(scope="module")
+def engine(patterns):
+    # No detectors: checksum validation is a change of its own, on top of this
+    return RedactionEngine(patterns, KEYWORDS)
+
+
+def _substitutions(patterns):
+    return [pattern.finditer for pattern in patterns.values()] + [re.compile(re.escape(k)).finditer for k in KEYWORDS]
+
+
+def _old_pipeline(text, patterns):
+    """The old pipeline's output, and the offsets of text it redacted."""
+    current = text
+    origins = list(range(len(text)))  # offset in text of each character of current; None inside a placeholder
+    for finditer in _substitutions(patterns):
+        pieces, new_origins, last = [], [], 0
+        for m in finditer(current):
+            pieces += [current[last:m.start()], REDACTION_PLACEHOLDER]
+            new_origins += origins[last:m.start()] + [None] * len(REDACTION_PLACEHOLDER)
+            last = m.end()
+        pieces.append(current[last:])
+        new_origins += origins[last:]
+        current, origins = "".join(pieces), new_origins
+    return current, set(range(len(text))) - set(origins)
+
+
+def _redact(text, engine):
+    pieces, last = [], 0
+    redacted = set()
+    for start, end, _key in engine.iter_spans(text):
+        pieces += [text[last:start], REDACTION_PLACEHOLDER]
+        redacted.update(range(start, end))
+        last = end
+    pieces.append(text[last:])
+    return "".join(pieces), redacted
+
+
+def _overlapping(text, patterns):
+    """True if any two matches in text overlap, from different patterns or the same one, or touch."""
+    searches = [pattern.search for pattern in patterns.values()] + [re.compile(re.escape(k)).search for k in KEYWORDS]
+    spans = []
+    for search in searches:
+        m = search(text)
+        while m is not None:
+            spans.append(m.span())
+            m = search(text, m.start() + 1)
+    spans.sort()
+    return any(start <= previous_end for (_, previous_end), (start, _) in zip(spans, spans[1:]))
+
+
+def test_corpus_is_loaded():
+    assert len(CORPUS) > 500
+
+
+@pytest.mark.parametrize("text", CORPUS)
+def test_redacts_everything_the_old_pipeline_did(text, patterns, engine):
+    _, old_redacted = _old_pipeline(text, patterns)
+    _, redacted = _redact(text, engine)
+    # The one documented exception: a "+" the old pipeline's (?<!\w) only let through after a "]"
+    assert {text[i] for i in old_redacted - redacted} <= {"+"}
+
+
+@pytest.mark.parametrize("text", CORPUS)
+def test_same_output_where_matches_do_not_overlap(text, patterns, engine):
+    if _overlapping(text, patterns):
+        pytest.skip("overlapping matches are merged on purpose")
+    old_output, old_redacted = _old_pipeline(text, patterns)
+    output, redacted = _redact(text, engine)
+    if old_redacted - redacted:
+        pytest.skip("a '+' only the old pipeline redacts (see the previous test)")
+    assert output == old_output
+
+
+@pytest.mark.parametrize("text, expected", [
+    # A date followed by an IP address
+    ("12/03/1999 192.168.1.1", "[REDACTED] [REDACTED]"),
+    # An ABN-shaped run reaching into the IP address: all of it goes, not just the part the first match covers
+    ("01 9161510903 x 30086914 192.168.1.1", "01 9161510903 x [REDACTED]"),
+    # A card-shaped run starting inside the date
+    ("12/03/1999 0412 345 678", "[REDACTED]"),
+])
+def test_overlapping_matches_are_redacted_whole(text, expected, engine):
+    assert _redact(text, engine)[0] == expected
+
+
+@pytest.fixture(scope="module")
+def validated_engine(patterns):
+    return RedactionEngine(patterns, KEYWORDS, detectors=default_registry().detectors(patterns))
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("TFN 123 456 782", "TFN [REDACTED]"),
+    # Fails the TFN check: not an account number or a BSB plus three digits either
+    ("TFN 123 456 789", "TFN 123 456 789"),
+    ("ref 123456789", "ref 123456789"),
+    # A labelled account number starts at its label, before any checksum comes into it
+    ("Acct 123456789", "[REDACTED]"),
+    # Fails Luhn as a card, but its first nine digits are a valid TFN
+    ("123 456 782 1234 5", "[REDACTED] 1234 5"),
+    ("4111 1111 1111 1112 and 4111 1111 1111 1111", "4111 1111 1111 1112 and [REDACTED]"),
+])
+def test_numbers_failing_their_checksum_are_left_alone(text, expected, validated_engine):
+    assert _redact(text, validated_engine)[0] == expected
+
+
+@pytest.mark.parametrize("text", CORPUS)
+def test_validation_only_removes_spans(text, engine, validated_engine):
+    _, redacted = _redact(text, engine)
+    _, validated = _redact(text, validated_engine)
+    assert validated <= redacted
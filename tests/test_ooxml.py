@@ -0,0 +1,73 @@
+import io
+import re
+import zipfile
+
+from redax_ooxml import redact_xlsx
+
+EMAIL_RE = re.compile(r"[\w.]+@[\w.]+\.\w+")
+SHEET = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData><row r="1">\
+<c r="A1" t="str"><f>CONCATENATE("x@y.org","")</f><v>x@y.org</v></c>\
+<c r="B1" t="b"><f>ISNUMBER(SEARCH("say ""hi"" to x@y.org",A1))</f><v>1</v></c>\
+<c r="C1"><f t="shared" ref="C1:C2" si="0">LEN(A1)</f><v>7</v></c>\
+</row></sheetData>\
+<dataValidations count="1"><dataValidation type="list" sqref="D1"><formula1>"a@b.com,none"</formula1></dataValidation></dataValidations>\
+</worksheet>"""
+
+
+def _redact_spans(text):
+    return [(m.start(), m.end(), "[REDACTED]") for m in EMAIL_RE.finditer(text)]
+
+
+def _redacted_sheet(sheet):
+    source = io.BytesIO()
+    with zipfile.ZipFile(source, "w") as package:
+        package.writestr("xl/worksheets/sheet1.xml", sheet)
+    destination = io.BytesIO()
+    redact_xlsx(io.BytesIO(source.getvalue()), destination, _redact_spans)
+    with zipfile.ZipFile(destination) as package:
+        return package.read("xl/worksheets/sheet1.xml").decode("utf-8")
+
+
+def test_string_literals_in_formulas_are_redacted():
+    sheet = _redacted_sheet(SHEET)
+    assert "@" not in sheet
+    assert '<f>CONCATENATE("[REDACTED]","")</f><v>[REDACTED]</v>' in sheet
+    assert '<f>ISNUMBER(SEARCH("say ""hi"" to [REDACTED]",A1))</f>' in sheet
+    assert '<formula1>"[REDACTED],none"</formula1>' in sheet
+
+
+def test_formulas_without_matches_are_unchanged():
+    sheet = _redacted_sheet(SHEET)
+    assert '<f t="shared" ref="C1:C2" si="0">LEN(A1)</f><v>7</v>' in sheet
+
+
+NUMBER_SHEET = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData><row r="1">\
+<c r="A1" s="1"><v>45122</v></c>\
+<c r="B1"><v>250000</v></c>\
+<c r="C1"><v>4111111111111111</v></c>\
+<c r="D1" t="str"><f>B1&amp;""</f><v>250000</v></c>\
+</row></sheetData></worksheet>"""
+
+
+def test_number_cells_only_lose_checksum_confirmed_values(tmp_path):
+    from redax_logic import compile_redaction_patterns, process_document_for_redaction
+    from redax_patterns import default_registry
+
+    source = tmp_path / "numbers.xlsx"
+    with zipfile.ZipFile(source, "w") as package:
+        package.writestr("xl/worksheets/sheet1.xml", NUMBER_SHEET)
+    patterns = compile_redaction_patterns(default_registry().keys())
+    result = process_document_for_redaction(str(source), patterns, [], "xlsx", output_dir=str(tmp_path / "out"))
+    assert "error" not in result, result
+    with zipfile.ZipFile(result["output_path"]) as package:
+        sheet = package.read("xl/worksheets/sheet1.xml").decode("utf-8")
+    # A date (a serial number with a date style) and a plain amount are kept as numbers
+    assert '<c r="A1" s="1"><v>45122</v></c>' in sheet
+    assert '<c r="B1"><v>250000</v></c>' in sheet
+    # Text cells still get every pattern
+    assert '<c r="D1" t="str"><f>B1&amp;""</f><v>[REDACTED]</v></c>' in sheet
+    # A card number passes Luhn, so it goes even as a number
+    assert '<c r="C1" t="inlineStr"><is><t>[REDACTED]</t></is></c>' in sheet
+    assert result["matches"] == {"redact_au_bsb": 1, "redact_credit_cards": 1}
@@ -0,0 +1,54 @@
+import json
+import multiprocessing
+import os
+
+import pytest
+
+import redax
+import redax_patterns
+from redax_patterns import PATTERN_PACKS_ENV_VAR
+
+
+PACK = {
+    "format_version": 1,
+    "name": "acme",
+    "patterns": [
+        {"key": "redact_staff_id", "regex": "\\bSTF-\\d{6}\\b", "examples": ["STF-123456"],
+         "counter_examples": ["STF-12"], "min_digits": 6},
+    ],
+}
+
+
+def _registry_keys():
+    return redax_patterns.default_registry().keys()
+
+
+@pytest.fixture
+def fresh_registry(monkeypatch):
+    monkeypatch.delenv(PATTERN_PACKS_ENV_VAR, raising=False)
+    monkeypatch.setattr(redax_patterns, "_default_registry", None)
+    yield
+    redax_patterns._default_registry = None
+
+
+def test_cli_pattern_packs_reach_spawned_workers(tmp_path, monkeypatch, fresh_registry):
+    pack = tmp_path / "acme.json"
+    pack.write_text(json.dumps(PACK), encoding="utf-8")
+    monkeypatch.chdir(tmp_path)
+
+    assert redax.main(["--pattern-pack", "acme.json", "--list-patterns"]) == 0
+    assert os.environ[PATTERN_PACKS_ENV_VAR] == str(pack)
+
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        assert "redact_staff_id" in pool.apply(_registry_keys)
+
+
+def test_a_bad_pack_is_not_passed_on(tmp_path, fresh_registry):
+    good = tmp_path / "acme.json"
+    good.write_text(json.dumps(PACK), encoding="utf-8")
+    bad = tmp_path / "bad.json"
+    bad.write_text("{}", encoding="utf-8")
+
+    with pytest.raises(redax_patterns.PatternError):
+        redax_patterns.load_packs_for_workers([str(good), str(bad)])
+    assert PATTERN_PACKS_ENV_VAR not in os.environ
@@ -0,0 +1,80 @@
+import os
+import re
+
+import pytest
+
+from redax_engine import CREDENTIAL_LINES_KEY, RedactionEngine
+from redax_logic import _keyed_redaction_spans
+from redax_patterns import default_registry
+from redax_server import Metrics, TextBatcher
+from redax_spans import apply_spans
+
+TEXTS = [
+    "CASE-1042 opened for jane.doe@example.com",
+    "CASE-2211 call 0412 345 678",
+    "no case here, CASE-77 is mid-line\nCASE-78 starts the second line",
+    "CASE-3001",
+    "password: hunter2\nBSB 062-000 Acct 12345678",
+    "",
+    "ends with a number 192.168.0.1",
+]
+
+
+def _builtin_engine():
+    registry = default_registry()
+    patterns = registry.compile([key for key in registry.keys() if key != CREDENTIAL_LINES_KEY])
+    return RedactionEngine(patterns, ["Falcon"], credential_keywords=["password"],
+                           detectors=registry.detectors(patterns))
+
+
+def _anchored_engine():
+    return RedactionEngine({"case_id": re.compile(r"^CASE-\d+"), "last_word": re.compile(r"\w+\Z")})
+
+
+def _single(text, engine):
+    match_counts = {}
+    return apply_spans(text, _keyed_redaction_spans(text, engine, True), match_counts), match_counts
+
+
+@pytest.mark.parametrize("make_engine", [_builtin_engine, _anchored_engine])
+def test_batched_results_match_single_requests(make_engine):
+    engine = make_engine()
+    # A long window so every request lands in the same batch
+    batcher = TextBatcher(Metrics(), window=0.5, max_requests=len(TEXTS))
+    try:
+        futures = [batcher.submit(text, engine, True) for text in TEXTS]
+        batched = [future.result(timeout=10) for future in futures]
+    finally:
+        batcher.close()
+    assert batched == [_single(text, engine) for text in TEXTS]
+
+
+def test_anchored_patterns_disable_joining():
+    assert _anchored_engine().edge_sensitive
+    assert not _builtin_engine().edge_sensitive
+
+
+def test_path_outputs_without_output_dir_stay_within_the_quota(tmp_path, monkeypatch):
+    import redax_server
+    from redax_workspace import WorkspaceManager
+
+    manager = WorkspaceManager(str(tmp_path / "workspaces"), max_bytes=25)
+    monkeypatch.setattr(redax_server, "default_workspaces", lambda: manager)
+    root = tmp_path / "in"
+    root.mkdir()
+    service = redax_server.RedactionService([str(root)], workers=1)
+    try:
+        outputs = []
+        for i in range(3):
+            source = root / f"note{i}.txt"
+            source.write_text(f"write to jane{i}@example.com\n", encoding="utf-8")
+            result = service.redact_file(str(source), None, service.options({"output_format": "md"}))
+            assert "error" not in result, result
+            outputs.append(result["output_path"])
+        # Room for one output: the older ones were evicted as the newer ones came in
+        assert [os.path.exists(path) for path in outputs] == [False, False, True]
+        assert all(path.startswith(str(tmp_path / "workspaces")) for path in outputs)
+        assert 0 < manager.size() <= 25
+    finally:
+        service.close()
+        manager.cleanup()
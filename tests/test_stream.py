@@ -0,0 +1,62 @@
+"""redact_text_stream gives the same result as redacting the whole text at once, whatever the chunk size."""
+import io
+
+import pytest
+
+from redax_logic import _apply_redaction, _get_engine, compile_redaction_patterns, redact_text_stream
+from redax_patterns import default_registry
+from redax_spans import SpanIndex
+
+CHUNK_SIZES = (64, 101, 256)
+OVERLAP_CHARS = 32
+SECRET = "hunter2-" * 40  # longer than every chunk size
+
+TEXTS = {
+    "credential line longer than a chunk": f"intro line\npassword={SECRET}\nmail bob@example.com\n",
+    "keyword late in a long line": f"{'lorem ipsum ' * 40}the password is {SECRET}\nnext line 10.0.0.1\n",
+    "keyword split across reads": f"{'x' * 95} api key {SECRET} end\nok\n",
+    "credential line at the end without a line break": f"first\ntoken {SECRET}",
+    "long line without keywords": f"{'call 0412 345 678 or bob@example.com ' * 20}\nlast line\n",
+    "short lines": "user name: jane\nnothing here\n12/03/1999 192.168.1.1\n" * 10,
+}
+
+
+class _Unseekable(io.StringIO):
+    def seekable(self):
+        return False
+
+
+@pytest.fixture(scope="module")
+def engine():
+    registry = default_registry()
+    return _get_engine(compile_redaction_patterns(registry.keys()), ["Falcon"])
+
+
+def _whole(text, engine):
+    match_counts, span_index = {}, SpanIndex()
+    return _apply_redaction(text, engine, True, match_counts, span_index), match_counts, list(span_index)
+
+
+def _streamed(source, engine, chunk_chars):
+    destination, match_counts, span_index = io.StringIO(), {}, SpanIndex()
+    redact_text_stream(source, destination, engine, True, match_counts, chunk_chars, OVERLAP_CHARS, span_index)
+    return destination.getvalue(), match_counts, list(span_index)
+
+
+@pytest.mark.parametrize("chunk_chars", CHUNK_SIZES)
+@pytest.mark.parametrize("name", TEXTS)
+def test_stream_matches_whole_text(name, chunk_chars, engine):
+    text = TEXTS[name]
+    assert _streamed(io.StringIO(text), engine, chunk_chars) == _whole(text, engine)
+
+
+@pytest.mark.parametrize("chunk_chars", CHUNK_SIZES)
+def test_unseekable_source(chunk_chars, engine):
+    text = TEXTS["keyword late in a long line"]
+    assert _streamed(_Unseekable(text), engine, chunk_chars) == _whole(text, engine)
+
+
+@pytest.mark.parametrize("chunk_chars", CHUNK_SIZES)
+def test_no_secret_in_output(chunk_chars, engine):
+    for text in TEXTS.values():
+        assert "hunter2" not in _streamed(io.StringIO(text), engine, chunk_chars)[0]